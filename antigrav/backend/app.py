@@ -1,269 +1,785 @@
-from flask import Flask, request, jsonify
+from flask import Flask, Response, g, request, jsonify
 from flask_cors import CORS
-import pandas as pd
-import joblib
+from collections import namedtuple
+from concurrent.futures import TimeoutError as FutureTimeout
+from registry import ModelRegistry
+from cache import PredictionCache
+from batcher import MicroBatcher, QueueFull
+from outcomes import OUTCOMES_DIR, OutcomeStore
+from labs import LabStore, lab_score, latest_fields
+from assessments import AssessmentStore
+from cohorts import demographics
+from models.risk_model import RULES_PATH, RuleScorer
+from explain import top_drivers
+from features import ValidationError
+from metrics import Metrics, Stopwatch
+from whatif import sweep
+import json
 import os
+import random
+import time
+
+import numpy as np
 
 app = Flask(__name__)
 CORS(app)  # Enable CORS for all routes
 
-# Define model paths
 # Define model paths
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 MODELS_DIR = os.path.join(BASE_DIR, 'models')
-DIABETES_MODEL_PATH = os.path.join(MODELS_DIR, 'diabetes_model.pkl')
-HEART_MODEL_PATH = os.path.join(MODELS_DIR, 'heart_model.pkl')
-LIVER_MODEL_PATH = os.path.join(MODELS_DIR, 'liver_model.pkl')
-MENTAL_MODEL_PATH = os.path.join(MODELS_DIR, 'mental_health_model.pkl')
-
-# Global variables
-diabetes_model = None
-diabetes_scaler = None
-heart_model = None
-heart_scaler = None
-heart_features = None
-liver_data = None 
-mental_data = None
+
+# Answer on-grid inputs (e.g. the 0-10 mental health sliders) from a precomputed table
+USE_LOOKUP_GRID = os.environ.get('EARLYGUARD_LOOKUP_GRID', '0') == '1'
+
+# Prediction cache (model outputs keyed by model version + encoded features)
+CACHE_SIZE = int(os.environ.get('EARLYGUARD_CACHE_SIZE', 10000)) # 0 disables
+CACHE_TTL = float(os.environ.get('EARLYGUARD_CACHE_TTL', 300)) # seconds
+
+# Initial model load: eager (one by one), parallel (thread pool) or lazy (on first request)
+LOAD_MODE = os.environ.get('EARLYGUARD_LOAD_MODE', 'eager')
+
+# Serve the pickle-free models/<name>_model/ bundles when present (0 = always use the .pkl files)
+USE_BUNDLES = os.environ.get('EARLYGUARD_USE_BUNDLES', '1') == '1'
+
+# Hot reload: poll the model artifacts every N seconds (0 = only via /admin/reload)
+WATCH_MODELS = float(os.environ.get('EARLYGUARD_WATCH_MODELS', 0))
+# Admin routes require this token in X-Admin-Token; without it they only answer localhost
+ADMIN_TOKEN = os.environ.get('EARLYGUARD_ADMIN_TOKEN')
+
+# Batch scoring limits
+MAX_BATCH_ROWS = 100000
+NDJSON_MIMETYPES = ('application/x-ndjson', 'application/jsonl', 'application/json-lines')
+
+# Micro-batching: single-patient requests wait up to N ms to be scored
+# together with concurrent ones (see batcher.py). Off by default.
+MICROBATCH = os.environ.get('EARLYGUARD_MICROBATCH', '0') == '1'
+MICROBATCH_ROWS = int(os.environ.get('EARLYGUARD_MICROBATCH_ROWS', 64))
+MICROBATCH_WAIT_MS = float(os.environ.get('EARLYGUARD_MICROBATCH_WAIT_MS', 1.0))
+MICROBATCH_WORKERS = int(os.environ.get('EARLYGUARD_MICROBATCH_WORKERS', 2))
+MICROBATCH_TIMEOUT = 30.0 # seconds a request waits for its batch
+
+# Top-k feature contributions ("drivers") added to every prediction (0 = off)
+EXPLAIN_TOP_K = int(os.environ.get('EARLYGUARD_EXPLAIN_TOP_K', 3))
+
+# Request bodies larger than this are rejected with 413 before being read
+MAX_BODY_BYTES = int(os.environ.get('EARLYGUARD_MAX_BODY_BYTES', 64 * 1024 * 1024))
+app.config['MAX_CONTENT_LENGTH'] = MAX_BODY_BYTES
+
+# Per-process metric snapshots are merged through this directory (set by
+# gunicorn.conf.py; unset = this process only)
+METRICS_DIR = os.environ.get('EARLYGUARD_METRICS_DIR')
+
+# Persist every /predict/assessment (inputs, results, model versions) to
+# EARLYGUARD_ASSESSMENTS_DB through a write-behind queue (see assessments.py)
+STORE_ASSESSMENTS = os.environ.get('EARLYGUARD_STORE_ASSESSMENTS', '1') == '1'
+
+# Development server (python app.py): debugger + reloader only when asked for
+DEBUG = os.environ.get('EARLYGUARD_DEBUG', '0') == '1'
+HOST = os.environ.get('EARLYGUARD_HOST', '127.0.0.1')
+PORT = int(os.environ.get('EARLYGUARD_PORT', 5000))
+# Fraction of single-prediction payloads printed (patient data; 0 in production)
+LOG_PAYLOAD_RATE = float(os.environ.get('EARLYGUARD_LOG_PAYLOADS', 1.0 if DEBUG else 0.0))
+
+prediction_cache = PredictionCache(CACHE_SIZE, CACHE_TTL)
+# Request/stage latency histograms and counters for GET /metrics
+metrics = Metrics(METRICS_DIR)
+# Labelled outcomes for incremental updates (see incremental.py)
+outcome_store = OutcomeStore(OUTCOMES_DIR)
+# Longitudinal lab results and their running trend features (see labs.py)
+lab_store = LabStore()
+# Assessment history, written off the request thread
+assessment_store = AssessmentStore() if STORE_ASSESSMENTS else None
+# Rule-based cohort triage scorer (weights/thresholds from models/risk_rules.json)
+rule_scorer = RuleScorer.from_file(RULES_PATH)
+batcher = MicroBatcher(MICROBATCH_ROWS, MICROBATCH_WAIT_MS, MICROBATCH_WORKERS) if MICROBATCH else None
+# Active model bundles (encoder + engine + version); swapped atomically on reload
+registry = ModelRegistry(MODELS_DIR, use_grid=USE_LOOKUP_GRID, on_swap=prediction_cache.invalidate, use_bundles=USE_BUNDLES)
 
 def load_models():
-    global diabetes_model, diabetes_scaler, heart_model, heart_scaler, heart_features, liver_data, mental_data
-    
-    try:
-        # Load Diabetes
-        if os.path.exists(DIABETES_MODEL_PATH):
-            diabetes_model, diabetes_scaler = joblib.load(DIABETES_MODEL_PATH)
-            print("Diabetes model loaded.")
-            
-        # Load Heart
-        if os.path.exists(HEART_MODEL_PATH):
-            heart_dict = joblib.load(HEART_MODEL_PATH)
-            heart_model = heart_dict['model']
-            heart_scaler = heart_dict['scaler']
-            heart_features = heart_dict['features']
-            print("Heart model loaded.")
-            
-        # Load Liver (New)
-        if os.path.exists(LIVER_MODEL_PATH):
-            liver_data = joblib.load(LIVER_MODEL_PATH)
-            print("Liver model loaded.")
-
-        # Load Mental Health (New)
-        if os.path.exists(MENTAL_MODEL_PATH):
-            mental_data = joblib.load(MENTAL_MODEL_PATH)
-            print("Mental Health model loaded.")
-            
-    except Exception as e:
-        print(f"Error loading models: {str(e)}")
+    return registry.start(LOAD_MODE)
+
+def start_background_tasks():
+    # Per-process threads. Under gunicorn (see gunicorn.conf.py) these start
+    # in each worker after fork instead of in the preloading master.
+    if WATCH_MODELS > 0:
+        registry.watch(WATCH_MODELS)
+    metrics.start_flusher(metrics_state)
+
+def metrics_state():
+    # Point-in-time values added to each metrics snapshot
+    stats = prediction_cache.stats()
+    return {
+        "cumulative": [["earlyguard_cache_events_total", [["event", e]], stats[e]]
+                       for e in ("hits", "misses", "evictions", "expirations")],
+        "gauges": [["earlyguard_cache_entries", [], stats["size"]]] + [
+            ["earlyguard_model_loaded", [["model", name], ["version", s["version"]]], 1]
+            for name, s in registry.status().items() if s["loaded"]
+        ],
+    }
 
 # Load on startup
 load_models()
+if os.environ.get('EARLYGUARD_SERVER') != 'gunicorn':
+    start_background_tasks()
+
+@app.before_request
+def limit_body_size():
+    # Checked up front so an oversized body is never read (or parsed) at all
+    if request.content_length is not None and request.content_length > MAX_BODY_BYTES:
+        return jsonify({"error": f"Request body too large (max {MAX_BODY_BYTES} bytes)"}), 413
+
+@app.before_request
+def start_timer():
+    g.started = time.perf_counter()
+
+@app.after_request
+def record_request(response):
+    started = g.get('started')
+    if started is not None:
+        route = request.url_rule.rule if request.url_rule else 'unmatched'
+        metrics.request(route, request.method, response.status_code, time.perf_counter() - started)
+    return response
+
+# Prometheus text format; counters and histograms cover every worker process
+@app.route('/metrics', methods=['GET'])
+def metrics_endpoint():
+    return Response(metrics.render(metrics_state()), mimetype='text/plain; version=0.0.4')
 
 @app.route('/health', methods=['GET'])
 def health_check():
+    status = registry.status()
     return jsonify({
         "status": "online",
-        "models": {
-            "diabetes": diabetes_model is not None,
-            "heart": heart_model is not None,
-            "liver": liver_data is not None,
-            "mental": mental_data is not None
-        }
+        "models": {name: s["loaded"] for name, s in status.items()},
+        "versions": {name: s["version"] for name, s in status.items() if s["loaded"]},
+        "registry": status,
+        "startup": registry.startup,
+        "cache": prediction_cache.stats(),
+        "microbatch": batcher.stats() if batcher else None,
+        "assessment_store": assessment_store.stats() if assessment_store else None
     })
 
-# ... (Existing Diabetes/Heart Routes) ...
+def risk_level(prob, high=0.6, moderate=0.3):
+    return "High" if prob > high else "Moderate" if prob > moderate else "Low"
+
+# Responders: probability (+ raw payload for rule-based extras) -> response payload.
+# thresholds = (high, moderate) cut-offs shipped with the model artifact.
+
+def diabetes_response(probability, data, thresholds):
+    return {
+        "risk_score": round(probability * 100, 2),
+        "risk_level": risk_level(probability, *thresholds),
+        "model_source": "Python ML (Scikit-Learn)"
+    }
+
+heart_response = diabetes_response
+
+def liver_response(prob, data, thresholds):
+    return {
+        "risk_score": round(prob * 100, 2),
+        "risk_level": risk_level(prob, *thresholds),
+        "explanation": "Enzyme levels significantly elevated." if prob > thresholds[0] else "Liver function appears stable."
+    }
+
+def mental_response(prob, data, thresholds):
+    stress_input = float(data.get('stress_level', 5))
+    workload_input = float(data.get('workload', 5))
+    sleep_input = float(data.get('sleep_quality', 5))
+
+    suggestions = []
+    if stress_input > 7: suggestions.append("Practice regular mindfulness or meditation")
+    if workload_input > 7: suggestions.append("Discuss workload distribution with supervisors")
+    if sleep_input < 4: suggestions.append("Prioritize 7-8 hours of sleep")
+
+    return {
+        "risk_score": round(prob * 100, 2),
+        "risk_level": risk_level(prob, *thresholds),
+        "explanation": "High stress markers detected." if prob > thresholds[0] else "Mental wellness indicators are balanced.",
+        "suggestions": suggestions
+    }
+
+# section_keys: input keys that identify the model's part of a combined payload.
+# Age/Gender/sex are shared across models, so they do not count on their own.
+Predictor = namedtuple('Predictor', ['respond', 'section_keys'])
+
+PREDICTORS = {
+    'diabetes': Predictor(
+        diabetes_response,
+        ('Pregnancies', 'Glucose', 'BloodPressure', 'SkinThickness', 'Insulin', 'BMI', 'DiabetesPedigreeFunction')
+    ),
+    'heart': Predictor(
+        heart_response,
+        ('trestbps', 'chol', 'fbs', 'thalach', 'exang', 'oldpeak', 'ca', 'cp', 'slope', 'thal', 'restecg')
+    ),
+    'liver': Predictor(
+        liver_response,
+        ('Total_Bilirubin', 'Direct_Bilirubin', 'Alkaline_Phosphotase', 'Alamine_Aminotransferase',
+         'Aspartate_Aminotransferase', 'Total_Protiens', 'Albumin', 'Albumin_and_Globulin_Ratio')
+    ),
+    'mental': Predictor(
+        mental_response,
+        ('stress_level', 'workload', 'sleep_quality')
+    ),
+}
+
+# URL segment -> predictor name
+ROUTE_NAMES = {'diabetes': 'diabetes', 'heart': 'heart', 'liver': 'liver', 'mental-health': 'mental'}
+
+class ModelUnavailable(Exception):
+    pass
+
+class PredictionTimeout(Exception):
+    pass
+
+# Errors that answer 503, and their reason in the error metrics
+UNAVAILABLE_REASONS = {ModelUnavailable: 'unavailable', QueueFull: 'queue_full', PredictionTimeout: 'timeout'}
+
+def active_bundle(name):
+    bundle = registry.get(name)
+    if bundle is None:
+        raise ModelUnavailable(f"{registry.label(name)} model not loaded")
+    return bundle
+
+def predict_one(name, data, watch=None):
+    # One bundle for the whole call: encoder, engine and version always match.
+    # watch (a metrics.Stopwatch) collects the time spent in each stage.
+    watch = watch or Stopwatch()
+    bundle = active_bundle(name)
+    X = bundle.encoder.fill(data)
+    watch.lap('encode')
+    bundle.encoder.validate(X, data)
+    watch.lap('validate')
+
+    # Only the model output and its drivers are cached (both depend on the
+    # encoded row alone); respond() still sees the raw payload
+    key = prediction_cache.key(name, bundle.version, X)
+    cached = prediction_cache.get(key)
+    watch.lap('cache')
+    if cached is None:
+        # The scaler is folded into the engine, so scaling is part of predict
+        if batcher is not None:
+            try:
+                prob = batcher.submit(name, bundle.engine, X).result(MICROBATCH_TIMEOUT)
+            except FutureTimeout:
+                raise PredictionTimeout(f"{registry.label(name)} prediction timed out, try again shortly") from None
+        else:
+            prob = float(bundle.engine.proba(X)[0])
+        watch.lap('predict')
+        drivers = top_drivers(bundle.engine, X, bundle.features, EXPLAIN_TOP_K)
+        if drivers is not None:
+            drivers = drivers[0]
+            watch.lap('explain')
+        prediction_cache.put(key, (prob, drivers))
+    else:
+        prob, drivers = cached
+
+    response = PREDICTORS[name].respond(prob, data, bundle.thresholds)
+    response["model_version"] = bundle.version
+    if drivers is not None:
+        response["drivers"] = drivers
+        response["drivers_unit"] = bundle.engine.contribution_unit
+    watch.lap('respond')
+    return response
+
+def predict_many(name, patients, watch=None):
+    """Score a list of patient dicts with one vectorized model call.
+
+    Returns (model version, results) with one result per patient, in input
+    order; rows that cannot be encoded get {"index": i, "error": ...}.
+    """
+    watch = watch or Stopwatch()
+    bundle = active_bundle(name)
+    respond = PREDICTORS[name].respond
+    X, ok, errors = bundle.encoder.encode_many(patients)
+    watch.lap('validate') # encoding and validation are one pass in batch mode
+
+    results = [None] * len(patients)
+    for i, e in errors.items():
+        results[i] = {"index": i, "error": str(e), "fields": e.fields}
+    if ok:
+        probs = bundle.engine.proba(X)
+        watch.lap('predict')
+        drivers = top_drivers(bundle.engine, X, bundle.features, EXPLAIN_TOP_K)
+        watch.lap('explain')
+        for n, (i, prob) in enumerate(zip(ok, probs)):
+            results[i] = respond(prob, patients[i], bundle.thresholds)
+            if drivers is not None:
+                results[i]["drivers"] = drivers[n]
+                results[i]["drivers_unit"] = bundle.engine.contribution_unit
+        watch.lap('respond')
+    return bundle.version, results
+
+def predict_route(name, debug_label=None):
+    watch = Stopwatch()
+    try:
+        active_bundle(name)
+    except ModelUnavailable as e:
+        metrics.error(name, 'unavailable')
+        return jsonify({"error": str(e)}), 503
+
+    data = request.get_json(silent=True)
+    if debug_label and LOG_PAYLOAD_RATE > 0 and random.random() < LOG_PAYLOAD_RATE:
+        print(f"DEBUG_{debug_label}_INPUT: {data}")
+    watch.lap('parse')
+    try:
+        result = predict_one(name, data, watch)
+    except ValidationError as e:
+        metrics.error(name, 'validation')
+        return jsonify({"error": str(e), "fields": e.fields}), 400
+    except (ModelUnavailable, QueueFull, PredictionTimeout) as e:
+        metrics.error(name, UNAVAILABLE_REASONS[type(e)])
+        return jsonify({"error": str(e)}), 503
+    response = jsonify(result)
+    watch.lap('serialize')
+    metrics.stages(name, 'single', watch.laps)
+    return response
+
+def read_batch_payload():
+    # Either a JSON array of patients or NDJSON (one patient object per line).
+    # Unparseable NDJSON lines are kept as error entries so indexes line up.
+    if request.mimetype in NDJSON_MIMETYPES:
+        patients = []
+        for line in request.get_data(as_text=True).splitlines():
+            if not line.strip():
+                continue
+            try:
+                patients.append(json.loads(line))
+            except ValueError as e:
+                patients.append(ValueError(f"Invalid JSON line: {e}"))
+    else:
+        patients = request.get_json(silent=True)
+        if not isinstance(patients, list):
+            raise ValueError("Expected a JSON array of patients or an NDJSON body")
+
+    if len(patients) > MAX_BATCH_ROWS:
+        raise ValueError(f"Batch too large: {len(patients)} rows (max {MAX_BATCH_ROWS})")
+    return patients
 
 @app.route('/predict/diabetes', methods=['POST'])
 def predict_diabetes():
-    if not diabetes_model or not diabetes_scaler:
-        return jsonify({"error": "Diabetes model not initialized"}), 503
-    
+    return predict_route('diabetes', 'DIABETES')
+
+@app.route('/predict/heart', methods=['POST'])
+def predict_heart():
+    return predict_route('heart', 'HEART')
+
+# NEW ROUTE: Liver
+@app.route('/predict/liver', methods=['POST'])
+def predict_liver():
+    return predict_route('liver')
+
+# NEW ROUTE: Mental Health
+@app.route('/predict/mental-health', methods=['POST'])
+def predict_mental():
+    return predict_route('mental')
+
+# Input schema per model: types, defaults, plausible ranges/units and allowed
+# categories, as enforced on every prediction (see features.py)
+@app.route('/schema/<model>', methods=['GET'])
+def model_schema(model):
+    name = ROUTE_NAMES.get(model)
+    if name is None:
+        return jsonify({"error": f"Unknown model: {model}"}), 404
     try:
-        data = request.json
-        print(f"DEBUG_DIABETES_INPUT: {data}")
-        # Expected keys matching training: Pregnancies, Glucose, BloodPressure, SkinThickness, Insulin, BMI, DiabetesPedigreeFunction, Age
-        
-        # Create DataFrame for single row
-        input_data = {
-            'Pregnancies': [float(data.get('Pregnancies', 0))],
-            'Glucose': [float(data.get('Glucose', 0))],
-            'BloodPressure': [float(data.get('BloodPressure', 0))],
-            'SkinThickness': [float(data.get('SkinThickness', 0))],
-            'Insulin': [float(data.get('Insulin', 0))],
-            'BMI': [float(data.get('BMI', 0))],
-            'DiabetesPedigreeFunction': [float(data.get('DiabetesPedigreeFunction', 0.5))], # Default average
-            'Age': [float(data.get('Age', 0))]
-        }
-        
-        df = pd.DataFrame(input_data)
-        
-        # Scale features
-        scaled_features = diabetes_scaler.transform(df)
-        
-        # Predict probability
-        probability = diabetes_model.predict_proba(scaled_features)[0][1]
-        
-        return jsonify({
-            "risk_score": round(probability * 100, 2),
-            "risk_level": "High" if probability > 0.6 else "Moderate" if probability > 0.3 else "Low",
-            "model_source": "Python ML (Scikit-Learn)"
-        })
+        bundle = active_bundle(name)
+    except ModelUnavailable as e:
+        return jsonify({"error": str(e)}), 503
+    return jsonify({"model": name, "model_version": bundle.version, "fields": bundle.encoder.describe()})
+
+# Batch Routes: /predict/<model>/batch takes many patients, scores them with
+# one vectorized call and returns results in input order.
+@app.route('/predict/<model>/batch', methods=['POST'])
+def predict_batch(model):
+    name = ROUTE_NAMES.get(model)
+    if name is None:
+        return jsonify({"error": f"Unknown model: {model}"}), 404
+    if registry.get(name) is None:
+        metrics.error(name, 'unavailable')
+        return jsonify({"error": f"{registry.label(name)} model not loaded"}), 503
 
-    except Exception as e:
+    watch = Stopwatch()
+    try:
+        patients = read_batch_payload()
+    except ValueError as e:
+        metrics.error(name, 'bad_request')
         return jsonify({"error": str(e)}), 400
+    watch.lap('parse')
 
-@app.route('/predict/heart', methods=['POST'])
-def predict_heart():
-    if not heart_model or not heart_scaler:
-        return jsonify({"error": "Heart model not initialized"}), 503
+    try:
+        version, results = predict_many(name, patients, watch)
+    except ModelUnavailable as e:
+        metrics.error(name, 'unavailable')
+        return jsonify({"error": str(e)}), 503
+    failed = sum(1 for r in results if "error" in r)
+    response = jsonify({
+        "model_version": version,
+        "count": len(results),
+        "failed": failed,
+        "results": results
+    })
+    watch.lap('serialize')
+    metrics.stages(name, 'batch', watch.laps, rows=len(results) - failed)
+    if failed:
+        metrics.error(name, 'validation', failed)
+    return response
+
+# Rule-based triage: {"lab_score", "lifestyle_score", "stress_score", "family_history"}
+# per patient, scored as whole columns by models/risk_model.py. Rows (JSON
+# array / NDJSON) get per-row results like the batch routes; a JSON object of
+# columns ({"lab_score": [...], ...}) gets columns back, which is much
+# cheaper for large cohorts.
+def rule_columns(rows):
+    cols = {k: [float('nan')] * len(rows) for k in rule_scorer.inputs}
+    errors = {}
+    for i, row in enumerate(rows):
+        if not isinstance(row, dict):
+            errors[i] = str(row) if isinstance(row, Exception) else "Expected a JSON object"
+            continue
+        for k in rule_scorer.inputs:
+            v = row.get(k)
+            if isinstance(v, bool) or not isinstance(v, (int, float)):
+                errors[i] = f"Missing or non-numeric {k}"
+                break
+            cols[k][i] = v
+    return cols, errors
 
+@app.route('/score/rules', methods=['POST'])
+def score_rules():
+    columnar = request.mimetype not in NDJSON_MIMETYPES and isinstance(request.get_json(silent=True), dict)
     try:
-        data = request.json
-        print(f"DEBUG_HEART_INPUT: {data}")
-        # Core inputs from UI
-        # age, sex, chest_pain_type, resting_bp, cholesterol, fasting_bs, resting_ecg, max_hr, exercise_angina, oldpeak, st_slope
-        
-        # We need to reconstruct the dataframe to match training features exactly (One-Hot Encoded)
-        # 1. Create a base dict with numeric values
-        input_base = {
-            'age': float(data.get('age', 0)),
-            'sex': int(data.get('sex', 0)), # 1=Male, 0=Female
-            'trestbps': float(data.get('trestbps', 120)),
-            'chol': float(data.get('chol', 200)),
-            'fbs': int(data.get('fbs', 0)), # 1 if > 120
-            'thalach': float(data.get('thalach', 150)),
-            'exang': int(data.get('exang', 0)),
-            'oldpeak': float(data.get('oldpeak', 0)),
-            'ca': float(data.get('ca', 0))
-        }
+        if columnar:
+            scores = rule_scorer.score(request.get_json())
+        else:
+            rows = read_batch_payload()
+            cols, errors = rule_columns(rows)
+            scores = rule_scorer.score(cols)
+    except ValidationError as e:
+        return jsonify({"error": str(e), "fields": e.fields}), 400
+    except ValueError as e: # read_batch_payload's own messages
+        return jsonify({"error": str(e)}), 400
 
-        # 2. Handle Categoricals via manual One-Hot Mapping matches Training Columns
-        # Categories: cp (0-3), restecg (0-2), slope (0-2), thal (0-3)
-        # Training likely did: cp_1, cp_2, cp_3 (dropping first?) or just cp_1.. etc.
-        # We'll use a safer approach: Create a DF with 0s for all expected features, then fill.
-
-        # Create DataFrame with all 0s
-        df = pd.DataFrame(0, index=[0], columns=heart_features)
-        
-        # Fill numeric
-        for col, val in input_base.items():
-            if col in df.columns:
-                df[col] = val
-        
-        # Set categorical dummies manually based on input strings/values
-        # Chest Pain: cp
-        # Assumption: Training used pd.get_dummies(drop_first=True)
-        cp_val = str(data.get('cp', '0')) # expected values like '1', '2', '3' (Typical, Atypical, Non-anginal) or descriptors
-        # Map back to dummy column names like 'cp_1', 'cp_2', etc. if they exist
-        if f"cp_{cp_val}" in df.columns:
-            df[f"cp_{cp_val}"] = 1
-            
-        # Slope
-        slope_val = str(data.get('slope', '1'))
-        if f"slope_{slope_val}" in df.columns:
-            df[f"slope_{slope_val}"] = 1
-            
-        # Thal
-        thal_val = str(data.get('thal', '2'))
-        if f"thal_{thal_val}" in df.columns:
-            df[f"thal_{thal_val}"] = 1
-
-        # RestECG
-        restecg_val = str(data.get('restecg', '0'))
-        if f"restecg_{restecg_val}" in df.columns:
-            df[f"restecg_{restecg_val}"] = 1
-
-        # Scale
-        scaled_features = heart_scaler.transform(df)
-        
-        # Predict
-        probability = heart_model.predict_proba(scaled_features)[0][1]
-        
+    percent = np.round(scores.percent, 2)
+    codes = rule_scorer.code_lists(scores.reasons)
+    if columnar:
         return jsonify({
-            "risk_score": round(probability * 100, 2),
-            "risk_level": "High" if probability > 0.6 else "Moderate" if probability > 0.3 else "Low",
-            "model_source": "Python ML (Scikit-Learn)"
+            "count": len(percent),
+            "failed": int((~scores.valid).sum()),
+            "risk_score": [None if p != p else p for p in percent.tolist()],
+            "risk_level": [l or None for l in scores.level.tolist()],
+            "reasons": [c if ok else None for c, ok in zip(codes, scores.valid.tolist())],
+            "reason_text": rule_scorer.texts
         })
 
-    except Exception as e:
-        print(e)
+    results = []
+    for i, (p, level, c) in enumerate(zip(percent.tolist(), scores.level.tolist(), codes)):
+        if i in errors or p != p:
+            results.append({"index": i, "error": errors.get(i, "Non-finite input")})
+        else:
+            results.append({"risk_score": p, "risk_level": level, "reasons": c})
+    return jsonify({
+        "count": len(results),
+        "failed": sum(1 for r in results if "error" in r),
+        "results": results,
+        "reason_text": rule_scorer.texts
+    })
+
+def model_sections(data):
+    # ([(model, its fields)], skipped models) for a combined payload
+    sections, skipped = [], []
+    for name, p in PREDICTORS.items():
+        section = data.get(name)
+        if isinstance(section, dict):
+            sections.append((name, {**data, **section}))
+        elif any(k in data for k in p.section_keys):
+            sections.append((name, data))
+        else:
+            skipped.append(name)
+    return sections, skipped
+
+# Combined Route: one patient payload -> every model that has inputs for it.
+# The payload is flat (union of the per-model fields); a nested section such as
+# {"heart": {...}} overrides the flat fields for that model and forces it to run.
+# With a "patient_id", the patient's latest stored lab results fill any lab
+# fields the payload leaves out, and their trend features are returned too.
+# The payload alone picks the models; stored labs never add one.
+@app.route('/predict/assessment', methods=['POST'])
+def predict_assessment():
+    data = request.get_json(silent=True)
+    if not isinstance(data, dict):
+        return jsonify({"error": "Expected a JSON object"}), 400
+
+    trends, filled = None, {}
+    if data.get('patient_id') is not None:
+        denied = admin_denied()
+        if denied: return denied
+        trends = lab_store.trends(data['patient_id'])
+        filled = latest_fields(trends)
+
+    sections, skipped = model_sections(data)
+    results, errors, field_errors = {}, {}, {}
+    for name, fields in sections:
+        if filled:
+            fields = {**filled, **fields}
+        watch = Stopwatch()
+        try:
+            results[name] = predict_one(name, fields, watch)
+        except ValidationError as e:
+            metrics.error(name, 'validation')
+            errors[name] = str(e)
+            field_errors[name] = e.fields
+        except (ModelUnavailable, QueueFull, PredictionTimeout) as e:
+            metrics.error(name, UNAVAILABLE_REASONS[type(e)])
+            errors[name] = str(e)
+        else:
+            metrics.stages(name, 'assessment', watch.laps)
+
+    scores = [r["risk_score"] for r in results.values()]
+    overall = round(sum(scores) / len(scores), 2) if scores else None
+    labs = lab_score(trends) if trends is not None else None
+    store = assessment_store is not None and (results or errors)
+    assessment_id = assessment_store.new_id() if store else None
+    response = jsonify({
+        "assessment_id": assessment_id,
+        "results": results,
+        "overall_risk": overall,
+        "skipped": skipped,
+        "errors": errors,
+        "field_errors": field_errors,
+        **({"lab_trends": trends, "lab_score": labs} if trends is not None else {})
+    })
+    if store:
+        # Both bodies are stored as they went over the wire
+        assessment_store.record(assessment_id, request.get_data(as_text=True), response.get_data(as_text=True),
+                                results, data.get('patient_id'), overall, labs, demographics(data))
+    return response
+
+# What-if Route: one patient payload (flat or sectioned, as for
+# /predict/assessment) plus "vary", the inputs to change: a list of keys or
+# {key: [values] | {"values" or "min"/"max"/"steps", "direction"} | null}.
+# Without "vary" each model sweeps its modifiable inputs (whatif.MODIFIABLE). Every model with inputs
+# in the payload and at least one varied input is swept with one vectorized
+# call; "grid": false scores the per-input curves only.
+@app.route('/predict/whatif', methods=['POST'])
+def predict_whatif():
+    data = request.get_json(silent=True)
+    if not isinstance(data, dict):
+        return jsonify({"error": "Expected a JSON object"}), 400
+    vary = data.get('vary')
+    if isinstance(vary, list) and all(isinstance(k, str) for k in vary):
+        vary = dict.fromkeys(vary)
+    elif vary is not None and not isinstance(vary, dict):
+        return jsonify({"error": "vary must be a list of input names or an object"}), 400
+    grid = data.get('grid', True) is not False
+
+    sections, skipped = model_sections(data)
+    results, errors, field_errors, swept = {}, {}, {}, set()
+    for name, fields in sections:
+        watch = Stopwatch()
+        try:
+            bundle = active_bundle(name)
+            out = sweep(bundle, fields, vary, grid)
+        except ValidationError as e:
+            metrics.error(name, 'validation')
+            errors[name] = str(e)
+            field_errors[name] = e.fields
+            continue
+        except ModelUnavailable as e:
+            metrics.error(name, 'unavailable')
+            errors[name] = str(e)
+            continue
+        if out is None:
+            skipped.append(name)
+            continue
+        watch.lap('predict')
+
+        def scored(changes, prob):
+            return {"changes": changes, "risk_score": round(prob * 100, 2),
+                    "risk_level": risk_level(prob, *bundle.thresholds),
+                    "reduction": round((out["baseline"] - prob) * 100, 2)}
+
+        swept.update(out["curves"])
+        results[name] = {
+            "model_version": bundle.version,
+            "baseline": {"risk_score": round(out["baseline"] * 100, 2),
+                         "risk_level": risk_level(out["baseline"], *bundle.thresholds)},
+            "curves": {key: {"values": values.tolist(), "risk_score": np.round(probs * 100, 2).tolist()}
+                       for key, (values, probs) in out["curves"].items()},
+            "best": scored(*out["best"]),
+            "best_single": scored(*out["best_single"]),
+            "variants": out["variants"],
+        }
+        watch.lap('respond')
+        metrics.stages(name, 'whatif', watch.laps, rows=out["variants"])
+
+    if errors and not results:
+        # Nothing was swept: a bad payload or vary spec is the caller's to fix
+        status = 400 if field_errors else 503
+        return jsonify({"error": "; ".join(f"{name}: {e}" for name, e in errors.items()),
+                        "errors": errors, "field_errors": field_errors}), status
+    unknown = sorted(set(vary or ()) - swept)
+    if unknown and not errors:
+        return jsonify({"error": f"Not a numeric input of any model in the payload: {', '.join(unknown)}"}), 400
+    return jsonify({
+        "results": results,
+        "variants": sum(r["variants"] for r in results.values()),
+        "skipped": skipped,
+        "errors": errors,
+        "field_errors": field_errors
+    })
+
+# Stored assessments, newest first: ?patient_id=...&since=2026-01-01&until=...&model=heart&limit=100
+# (all optional). Patient data, so these answer the same callers as the admin routes.
+@app.route('/assessments', methods=['GET'])
+def list_assessments():
+    return assessment_history(request.args.get('patient_id'))
+
+@app.route('/assessments/<patient_id>', methods=['GET'])
+def patient_assessments(patient_id):
+    return assessment_history(patient_id)
+
+# Cohort aggregates from incrementally maintained rollups (see cohorts.py):
+# ?view=assessments|patients&group_by=age_band,sex&clinic=c1&age_band=50-59&sex=female&since=...&until=...
+# (all optional; group_by also takes month and day for the assessments view)
+@app.route('/cohorts/<model>', methods=['GET'])
+def cohort_stats(model):
+    denied = admin_denied()
+    if denied: return denied
+    if assessment_store is None:
+        return jsonify({"error": "Assessment storage is off (EARLYGUARD_STORE_ASSESSMENTS=0)"}), 404
+    name = ROUTE_NAMES.get(model, model)
+    if name not in PREDICTORS:
+        return jsonify({"error": f"Unknown model: {model}"}), 404
+    args = request.args
+    group_by = [d for d in args.get('group_by', '').split(',') if d]
+    filters = {d: args[d] for d in ('clinic', 'age_band', 'sex') if d in args}
+    try:
+        result = assessment_store.cohort(name, args.get('view', 'assessments'), group_by, filters,
+                                         args.get('since'), args.get('until'))
+    except ValueError as e:
         return jsonify({"error": str(e)}), 400
+    return jsonify(result)
 
-# NEW ROUTE: Liver
-@app.route('/predict/liver', methods=['POST'])
-def predict_liver():
-    if not liver_data: return jsonify({"error": "Liver model not loaded"}), 503
+def assessment_history(patient_id):
+    denied = admin_denied()
+    if denied: return denied
+    if assessment_store is None:
+        return jsonify({"error": "Assessment storage is off (EARLYGUARD_STORE_ASSESSMENTS=0)"}), 404
     try:
-        data = request.json
-        # Inputs: Age, Gender, Total_Bilirubin, Direct_Bilirubin, Alkaline_Phosphotase, Alamine_Aminotransferase, Aspartate_Aminotransferase, Total_Protiens, Albumin, Albumin_and_Globulin_Ratio
-        
-        gender_code = 1 if data.get('Gender', 'Male') == 'Male' else 0
-        
-        features = [
-            float(data.get('Age', 0)),
-            gender_code,
-            float(data.get('Total_Bilirubin', 0)),
-            float(data.get('Direct_Bilirubin', 0)),
-            float(data.get('Alkaline_Phosphotase', 0)),
-            float(data.get('Alamine_Aminotransferase', 0)),
-            float(data.get('Aspartate_Aminotransferase', 0)),
-            float(data.get('Total_Protiens', 0)),
-            float(data.get('Albumin', 0)),
-            float(data.get('Albumin_and_Globulin_Ratio', 0))
-        ]
-        
-        scaled = liver_data['scaler'].transform([features])
-        prob = liver_data['model'].predict_proba(scaled)[0][1]
-        
-        level = "High" if prob > 0.7 else "Moderate" if prob > 0.4 else "Low"
-        explanation = "Enzyme levels significantly elevated." if prob > 0.7 else "Liver function appears stable."
-        
-        return jsonify({
-            "risk_score": round(prob * 100, 2),
-            "risk_level": level,
-            "explanation": explanation
-        })
-    except Exception as e:
+        limit = min(int(request.args.get('limit', 100)), 1000) # below 1: the store raises ValueError
+        rows = assessment_store.query(patient_id, request.args.get('since'), request.args.get('until'),
+                                      request.args.get('model'), limit)
+    except ValueError as e:
         return jsonify({"error": str(e)}), 400
+    return jsonify({"patient_id": patient_id, "count": len(rows), "assessments": rows})
 
-# NEW ROUTE: Mental Health
-@app.route('/predict/mental-health', methods=['POST'])
-def predict_mental():
-    if not mental_data: return jsonify({"error": "Mental Health model not loaded"}), 503
+# Admin Routes: model versions and hot reload.
+# Reloads run in the background; the active models keep serving until each swap.
+
+def admin_denied():
+    if ADMIN_TOKEN:
+        if request.headers.get('X-Admin-Token') != ADMIN_TOKEN:
+            return jsonify({"error": "Invalid admin token"}), 403
+    elif request.remote_addr not in ('127.0.0.1', '::1'):
+        return jsonify({"error": "Admin routes are local-only unless EARLYGUARD_ADMIN_TOKEN is set"}), 403
+    return None
+
+@app.route('/admin/models', methods=['GET'])
+def admin_models():
+    denied = admin_denied()
+    if denied: return denied
+    status = registry.status()
+    for name in status:
+        status[name]["available_versions"] = registry.available_versions(name)
+    return jsonify(status)
+
+@app.route('/admin/reload', methods=['POST'])
+def admin_reload():
+    denied = admin_denied()
+    if denied: return denied
+    data = request.get_json(silent=True) or {}
+    names = data.get('models')
+    unknown = [n for n in names or [] if n not in PREDICTORS]
+    if unknown:
+        return jsonify({"error": f"Unknown models: {unknown}"}), 400
+    registry.reload_async(names, force=bool(data.get('force')))
+    return jsonify({"status": "reloading", "models": names or list(PREDICTORS)}), 202
+
+# Labelled outcomes: patients (same fields as /predict/<model>) plus "label",
+# 1 = condition confirmed, 0 = ruled out. Appended to the outcome store;
+# `python incremental.py update` folds them into the model.
+@app.route('/outcomes/<model>', methods=['POST'])
+def record_outcomes(model):
+    denied = admin_denied()
+    if denied: return denied
+    name = ROUTE_NAMES.get(model)
+    if name is None:
+        return jsonify({"error": f"Unknown model: {model}"}), 404
     try:
-        data = request.json
-        # Inputs (0-10 Scale from UI): Stress, Workload, Sleep_Quality
-        
-        stress_input = float(data.get('stress_level', 5))
-        workload_input = float(data.get('workload', 5))
-        sleep_input = float(data.get('sleep_quality', 5))
-        
-        # Normalize to 0-1 (Model Expectation)
-        # Anxiety_Indicator, Workload_Indicator, Sleep_Indicator
-        features = [
-            stress_input / 10.0,
-            workload_input / 10.0,
-            sleep_input / 10.0
-        ]
-        
-        scaled = mental_data['scaler'].transform([features])
-        prob = mental_data['model'].predict_proba(scaled)[0][1]
-        
-        level = "High" if prob > 0.6 else "Moderate" if prob > 0.3 else "Low"
-        
-        suggestions = []
-        if stress_input > 7: suggestions.append("Practice regular mindfulness or meditation")
-        if workload_input > 7: suggestions.append("Discuss workload distribution with supervisors")
-        if sleep_input < 4: suggestions.append("Prioritize 7-8 hours of sleep")
-        
-        return jsonify({
-            "risk_score": round(prob * 100, 2),
-            "risk_level": level,
-            "explanation": "High stress markers detected." if prob > 0.6 else "Mental wellness indicators are balanced.",
-            "suggestions": suggestions
-        })
-    except Exception as e:
+        rows = read_batch_payload()
+        if any(isinstance(r, Exception) for r in rows):
+            raise next(r for r in rows if isinstance(r, Exception))
+        count = outcome_store.append(name, rows)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    return jsonify({"model": name, "recorded": count}), 201
+
+# Lab results: {"results": [{"analyte": "glucose", "value": 131, "taken_at": "2026-01-05"}, ...]}
+# (or the bare array). Each insert updates the series' trend features in place.
+# Patient data, so these answer the same callers as the admin routes.
+@app.route('/labs/<patient_id>', methods=['POST'])
+def record_labs(patient_id):
+    denied = admin_denied()
+    if denied: return denied
+    data = request.get_json(silent=True)
+    results = data.get('results') if isinstance(data, dict) else data
+    if not isinstance(results, list):
+        return jsonify({"error": "Expected a JSON array of lab results or {\"results\": [...]}"}), 400
+    try:
+        trends = lab_store.add_results(patient_id, results)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    return jsonify({"patient_id": patient_id, "recorded": len(results), "trends": trends}), 201
+
+# ?analyte=glucose&since=2025-01-01&until=2026-01-01 (all optional)
+@app.route('/labs/<patient_id>', methods=['GET'])
+def lab_results(patient_id):
+    denied = admin_denied()
+    if denied: return denied
+    analyte = request.args.get('analyte')
+    try:
+        results = lab_store.results(patient_id, analyte and analyte.lower(),
+                                    request.args.get('since'), request.args.get('until'))
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    return jsonify({"patient_id": patient_id, "count": len(results), "results": results})
+
+@app.route('/labs/<patient_id>/trends', methods=['GET'])
+def lab_trends(patient_id):
+    denied = admin_denied()
+    if denied: return denied
+    trends = lab_store.trends(patient_id)
+    return jsonify({"patient_id": patient_id, "trends": trends, "lab_score": lab_score(trends)})
+
+@app.route('/admin/models/<name>/activate', methods=['POST'])
+def admin_activate(name):
+    denied = admin_denied()
+    if denied: return denied
+    if name not in PREDICTORS:
+        return jsonify({"error": f"Unknown model: {name}"}), 404
+    version = (request.get_json(silent=True) or {}).get('version')
+    if not isinstance(version, str):
+        return jsonify({"error": "Expected {\"version\": \"...\"}"}), 400
+    try:
+        registry.set_active(name, version)
+    except ValueError as e:
         return jsonify({"error": str(e)}), 400
+    except KeyError as e:
+        return jsonify({"error": str(e.args[0])}), 404
+    registry.reload_async([name])
+    return jsonify({"status": "reloading", "model": name, "version": version}), 202
 
 if __name__ == '__main__':
-    print("Starting Flask Server on port 5000...")
-    app.run(port=5000, debug=True)
+    # Development server. In production run gunicorn instead:
+    #   gunicorn -c gunicorn.conf.py app:app
+    print(f"Starting Flask Server on port {PORT}...")
+    app.run(host=HOST, port=PORT, debug=DEBUG, threaded=True)
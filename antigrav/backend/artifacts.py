@@ -0,0 +1,256 @@
+# backend/artifacts.py
+#
+# Artifact files: atomic writes and the pickle-free model format.
+#
+# A model bundle is a directory of raw .npy arrays plus manifest.json:
+#
+#   <name>_model/
+#       manifest.json   format, model name, kind, feature names, risk thresholds, version
+#       coef.npy ...    one file per array listed in manifest["arrays"]
+#
+# Raw .npy (not .npz) so load_bundle() can np.load(..., mmap_mode='r'): every
+# worker maps the same file pages, and loading runs no pickle code at all.
+#
+#   python artifacts.py                 # export every models/*.pkl next to itself
+
+import hashlib
+import json
+import os
+import shutil
+import sys
+import tempfile
+from datetime import datetime, timezone
+
+import numpy as np
+
+from inference import ForestEngine, GridEngine, LinearEngine, build_engine, scaler_params
+
+FORMAT = 'earlyguard-npy/1'
+MANIFEST = 'manifest.json'
+
+# Risk level cut-offs on the predicted probability: (high, moderate)
+RISK_THRESHOLDS = {
+    'diabetes': (0.6, 0.3),
+    'heart': (0.6, 0.3),
+    'liver': (0.7, 0.4),
+    'mental': (0.6, 0.3),
+}
+
+
+def file_digest(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            digest.update(chunk)
+    return digest.hexdigest()[:12]
+
+
+def write_atomic(path, data):
+    """Write bytes to path via a temp file in the same directory + os.replace."""
+    directory = os.path.dirname(path) or '.'
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=directory, prefix='.tmp-')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, path)
+    except BaseException:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+        raise
+
+
+def dump_atomic(obj, path):
+    """joblib.dump to a temp file, then os.replace, so readers never see half a pickle."""
+    import joblib
+
+    directory = os.path.dirname(path) or '.'
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=directory, prefix='.tmp-', suffix='.pkl')
+    os.close(fd)
+    try:
+        joblib.dump(obj, tmp)
+        os.replace(tmp, path)
+    except BaseException:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+        raise
+
+
+def replace_dir(tmp_dir, path):
+    # Directories cannot be os.replace'd over a non-empty target, so move the
+    # old one aside first. Readers see either bundle, or briefly none.
+    old = None
+    if os.path.exists(path):
+        old = tempfile.mkdtemp(dir=os.path.dirname(path) or '.', prefix='.old-')
+        os.rmdir(old)
+        os.rename(path, old)
+    os.rename(tmp_dir, path)
+    if old:
+        shutil.rmtree(old, ignore_errors=True)
+
+
+def copy_atomic(src, dst):
+    """Copy a pickle file or bundle directory into place atomically."""
+    directory = os.path.dirname(dst) or '.'
+    os.makedirs(directory, exist_ok=True)
+    if os.path.isdir(src):
+        tmp = tempfile.mkdtemp(dir=directory, prefix='.tmp-')
+        os.rmdir(tmp)
+        shutil.copytree(src, tmp)
+        replace_dir(tmp, dst)
+        return
+    fd, tmp = tempfile.mkstemp(dir=directory, prefix='.tmp-')
+    os.close(fd)
+    try:
+        shutil.copyfile(src, tmp)
+        os.replace(tmp, dst)
+    except BaseException:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+        raise
+
+
+def is_bundle(path):
+    return os.path.isfile(os.path.join(path, MANIFEST))
+
+
+def read_manifest(path):
+    with open(os.path.join(path, MANIFEST)) as f:
+        manifest = json.load(f)
+    if manifest.get('format') != FORMAT:
+        raise ValueError(f"{path}: unsupported artifact format {manifest.get('format')!r}")
+    return manifest
+
+
+def forest_arrays(engine):
+    arrays = {
+        'feature': engine.feature, 'threshold': engine.threshold,
+        'left': engine.left, 'right': engine.right,
+        'value': engine.value, 'roots': engine.roots,
+    }
+    if engine.mean is not None:
+        arrays['mean'] = engine.mean
+    if engine.scale is not None:
+        arrays['scale'] = engine.scale
+    if engine.table is not None:
+        # Ship the compiled cell table so loading skips compile()
+        arrays['table'] = engine.table
+        for j, c in enumerate(engine.cuts):
+            arrays[f'cuts_{j}'] = c
+    return arrays
+
+
+def export_model(path, name, model, scaler, features, metadata=None):
+    """Write a fitted (scaler, model) pair as a pickle-free bundle directory.
+
+    Binary LogisticRegression and RandomForest/ExtraTrees models (on an
+    optional StandardScaler) are supported; anything else raises TypeError
+    and should stay a pickle. Returns the manifest.
+    """
+    engine = build_engine(scaler, model)
+    if isinstance(engine, LinearEngine):
+        kind = 'linear'
+        mean, scale = scaler_params(scaler)
+        arrays = {'coef': model.coef_[0], 'intercept': np.asarray(model.intercept_[:1])}
+        if mean is not None:
+            arrays['mean'] = mean
+        if scale is not None:
+            arrays['scale'] = scale
+    elif isinstance(engine, ForestEngine):
+        kind, arrays = 'forest', forest_arrays(engine)
+    else:
+        raise TypeError(f"{type(model).__name__} cannot be exported to {FORMAT}; keep it as a pickle")
+    arrays = {k: np.ascontiguousarray(v, dtype=np.int64 if v.dtype.kind in 'iu' else np.float64)
+              for k, v in arrays.items()}
+
+    # Version = hash of everything that affects predictions
+    digest = hashlib.sha256(json.dumps([name, kind, list(features)]).encode())
+    for key in sorted(arrays):
+        digest.update(key.encode())
+        digest.update(arrays[key].tobytes())
+
+    high, moderate = RISK_THRESHOLDS.get(name, (0.6, 0.3))
+    manifest = {
+        'format': FORMAT,
+        'name': name,
+        'kind': kind,
+        'features': list(features),
+        'n_features': len(features),
+        'thresholds': {'high': high, 'moderate': moderate},
+        'version': digest.hexdigest()[:12],
+        'created_at': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+        'arrays': {k: f"{k}.npy" for k in sorted(arrays)},
+        'metadata': metadata or {},
+    }
+
+    directory = os.path.dirname(os.path.abspath(path))
+    os.makedirs(directory, exist_ok=True)
+    tmp = tempfile.mkdtemp(dir=directory, prefix='.tmp-')
+    try:
+        for key, arr in arrays.items():
+            np.save(os.path.join(tmp, f"{key}.npy"), arr, allow_pickle=False)
+        with open(os.path.join(tmp, MANIFEST), 'w') as f:
+            json.dump(manifest, f, indent=2)
+        replace_dir(tmp, path)
+    except BaseException:
+        shutil.rmtree(tmp, ignore_errors=True)
+        raise
+    return manifest
+
+
+def load_bundle(path, mmap=True, grid=None):
+    """Bundle directory -> (manifest, engine). Arrays are memory-mapped read-only."""
+    manifest = read_manifest(path)
+    mode = 'r' if mmap else None
+    a = {k: np.load(os.path.join(path, f), mmap_mode=mode, allow_pickle=False)
+         for k, f in manifest['arrays'].items()}
+
+    if manifest['kind'] == 'linear':
+        engine = LinearEngine.from_params(a['coef'], a['intercept'][0], a.get('mean'), a.get('scale'))
+    elif manifest['kind'] == 'forest':
+        n_features = manifest['n_features']
+        cuts = [a[f'cuts_{j}'] for j in range(n_features)] if 'table' in a else None
+        engine = ForestEngine(
+            a['feature'], a['threshold'], a['left'], a['right'], a['value'], a['roots'], n_features,
+            a.get('mean'), a.get('scale'), cuts=cuts, table=a.get('table')
+        )
+    else:
+        raise ValueError(f"{path}: unknown model kind {manifest['kind']!r}")
+
+    if grid is not None:
+        engine = GridEngine(engine, grid)
+    return manifest, engine
+
+
+def bundle_path(pkl_path):
+    # models/heart_model.pkl -> models/heart_model/
+    return os.path.splitext(pkl_path)[0]
+
+
+def export_pickled(pkl_path, name, model, scaler, features, metadata=None):
+    """Export the bundle that sits next to a just-written .pkl (see registry.resolve)."""
+    return export_model(bundle_path(pkl_path), name, model, scaler, features, metadata={
+        **(metadata or {}),
+        'source': os.path.basename(pkl_path),
+        'source_digest': file_digest(pkl_path),
+    })
+
+
+if __name__ == '__main__':
+    # Convert the served pickles into bundles next to them
+    import warnings
+    import joblib
+    from registry import MODEL_FILES, unpack
+
+    warnings.filterwarnings('ignore')
+    models_dir = sys.argv[1] if len(sys.argv) > 1 else os.path.join(os.path.dirname(os.path.abspath(__file__)), 'models')
+    for name, (label, filename) in MODEL_FILES.items():
+        pkl = os.path.join(models_dir, filename)
+        if not os.path.exists(pkl):
+            continue
+        model, scaler, features = unpack(name, joblib.load(pkl))
+        manifest = export_pickled(pkl, name, model, scaler, features)
+        print(f"{label}: {filename} -> {os.path.basename(bundle_path(pkl))}/ (version {manifest['version']})")
@@ -0,0 +1,235 @@
+# backend/assessments.py
+#
+# Persistent history of assessments: the request and response bodies, plus
+# one row per model with its score, level and model version, in SQLite (WAL
+# mode). The bodies are stored as the JSON text that went over the wire, so
+# nothing is serialized a second time.
+#
+# Writes are write-behind. record() only stamps the row and puts it on a
+# queue; one writer thread per process inserts the rows in one transaction
+# per group. After the first row of a group it lingers
+# EARLYGUARD_ASSESSMENT_FLUSH_MS for more, so many assessments share one
+# commit and the request thread never waits on the disk. When the queue is
+# full record() blocks until the writer catches up rather than dropping
+# patient data. Rows still queued at exit are written by flush() (atexit and
+# gunicorn's worker_exit).
+#
+# assessments has indexes on (patient_id, created_at) and created_at, so a
+# patient's history or a date range is an index range scan;
+# assessment_scores has one row per model for queries over scores. The
+# cohort rollups (cohorts.py) are updated in the same transactions.
+
+import atexit
+import json
+import os
+import queue
+import sqlite3
+import threading
+import time
+import uuid
+
+import cohorts
+from labs import iso, parse_time
+
+ASSESSMENTS_DB = os.environ.get(
+    'EARLYGUARD_ASSESSMENTS_DB',
+    os.path.abspath(os.path.join(os.path.dirname(os.path.abspath(__file__)), '../data/assessments.db'))
+)
+# Most rows written in one transaction / most rows waiting for the writer
+BATCH_ROWS = int(os.environ.get('EARLYGUARD_ASSESSMENT_BATCH_ROWS', 500))
+# After the first row of a transaction, wait this long for more to join it
+FLUSH_MS = float(os.environ.get('EARLYGUARD_ASSESSMENT_FLUSH_MS', 50))
+MAX_PENDING = int(os.environ.get('EARLYGUARD_ASSESSMENT_MAX_PENDING', 10000))
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS assessments (
+    id TEXT PRIMARY KEY,
+    patient_id TEXT,
+    created_at REAL NOT NULL,         -- unix seconds
+    overall_risk REAL,
+    lab_score REAL,
+    request TEXT NOT NULL,            -- JSON body as received
+    response TEXT NOT NULL            -- JSON body as returned (results, errors, lab trends)
+);
+CREATE INDEX IF NOT EXISTS assessments_patient ON assessments (patient_id, created_at);
+CREATE INDEX IF NOT EXISTS assessments_created ON assessments (created_at);
+
+CREATE TABLE IF NOT EXISTS assessment_scores (
+    assessment_id TEXT NOT NULL,
+    model TEXT NOT NULL,
+    model_version TEXT,
+    risk_score REAL,
+    risk_level TEXT,
+    PRIMARY KEY (assessment_id, model)
+) WITHOUT ROWID;
+"""
+
+
+class AssessmentStore:
+    def __init__(self, path=ASSESSMENTS_DB, batch_rows=BATCH_ROWS, flush_ms=FLUSH_MS, max_pending=MAX_PENDING):
+        self.path = path
+        self.batch_rows = int(batch_rows)
+        self.linger = float(flush_ms) / 1000.0
+        self.max_pending = int(max_pending)
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._reset()
+        atexit.register(self.flush)
+
+    def _reset(self):
+        # Threads do not survive fork: the queue and writer are per process
+        self._pid = os.getpid()
+        self._queue = queue.Queue(maxsize=self.max_pending)
+        self._writer = None
+        self.written = 0
+        self.transactions = 0
+        self.largest = 0
+        self.failed = 0
+
+    def connect(self):
+        # One connection per thread (and per process after a fork)
+        conn = getattr(self._local, 'conn', None)
+        if conn is None or self._local.pid != os.getpid():
+            if self.path != ':memory:':
+                os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=30.0, isolation_level=None)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            conn.executescript(SCHEMA + cohorts.SCHEMA)
+            self._local.conn, self._local.pid = conn, os.getpid()
+        return conn
+
+    def _pending(self):
+        if self._pid != os.getpid() or self._writer is None:
+            with self._lock:
+                if self._pid != os.getpid():
+                    self._reset()
+                if self._writer is None:
+                    self._writer = threading.Thread(target=self._write_loop, name='assessment-writer', daemon=True)
+                    self._writer.start()
+        return self._queue
+
+    # -- writing -------------------------------------------------------------
+
+    def new_id(self):
+        return uuid.uuid4().hex
+
+    def record(self, assessment_id, request, response, results, patient_id=None, overall_risk=None, lab_score=None,
+               cohort=('', 'unknown', 'unknown')):
+        """Queue one assessment for writing.
+
+        request/response are the JSON bodies (text); results is {model:
+        result} with each result's model_version, risk_score and risk_level;
+        cohort is (clinic, age_band, sex) from cohorts.demographics().
+        Nothing here touches the database.
+        """
+        scores = [(assessment_id, model, r.get('model_version'), r.get('risk_score'), r.get('risk_level'))
+                  for model, r in results.items()]
+        row = (assessment_id, None if patient_id is None else str(patient_id), time.time(),
+               overall_risk, lab_score, request, response)
+        self._pending().put((row, scores, cohort)) # blocks only when max_pending rows are already waiting
+
+    def _write_loop(self):
+        q = self._queue
+        while True:
+            rows = [q.get()]
+            # Rows arriving within the linger share the transaction (one
+            # commit instead of one each)
+            deadline = time.monotonic() + self.linger
+            while len(rows) < self.batch_rows:
+                remaining = deadline - time.monotonic()
+                try:
+                    rows.append(q.get(timeout=remaining) if remaining > 0 else q.get_nowait())
+                except queue.Empty:
+                    break
+            try:
+                self._write(rows)
+            except Exception as e:
+                self.failed += len(rows)
+                print(f"Assessment write failed ({len(rows)} rows lost): {e}")
+            finally:
+                for _ in rows:
+                    q.task_done()
+
+    def _write(self, rows):
+        conn = self.connect()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            conn.executemany("INSERT INTO assessments VALUES (?, ?, ?, ?, ?, ?, ?)", [row for row, _, _ in rows])
+            conn.executemany("INSERT INTO assessment_scores VALUES (?, ?, ?, ?, ?)",
+                             [score for _, scores, _ in rows for score in scores])
+            cohorts.apply(conn, [
+                (row[1], row[2], cohort, [(model, score, level) for _, model, _, score, level in scores])
+                for row, scores, cohort in rows
+            ])
+            conn.execute('COMMIT')
+        except BaseException:
+            conn.execute('ROLLBACK')
+            raise
+        self.written += len(rows)
+        self.transactions += 1
+        self.largest = max(self.largest, len(rows))
+
+    def flush(self):
+        """Wait until every queued assessment of this process is written."""
+        if self._pid == os.getpid() and self._writer is not None:
+            self._queue.join()
+
+    # -- reading -------------------------------------------------------------
+
+    def cohort(self, model, view='assessments', group_by=(), filters=None, since=None, until=None):
+        """Cohort aggregates from the rollups (see cohorts.query), including this process's pending rows."""
+        self.flush()
+        return cohorts.query(self.connect(), model, view, group_by, filters, since, until)
+
+    def query(self, patient_id=None, since=None, until=None, model=None, limit=100):
+        """Assessments newest first, for one patient and/or a created_at range.
+
+        Reads this process's pending rows too (it flushes first), so a caller
+        sees its own assessments straight away.
+        """
+        # SQLite reads a negative LIMIT as no limit at all
+        if int(limit) < 1:
+            raise ValueError(f"limit must be at least 1, got {limit}")
+        self.flush()
+        sql = "SELECT * FROM assessments"
+        where, args = [], []
+        if patient_id is not None:
+            where.append("patient_id = ?")
+            args.append(str(patient_id))
+        if since is not None:
+            where.append("created_at >= ?")
+            args.append(parse_time(since))
+        if until is not None:
+            where.append("created_at <= ?")
+            args.append(parse_time(until))
+        if model is not None:
+            where.append("id IN (SELECT assessment_id FROM assessment_scores WHERE model = ?)")
+            args.append(model)
+        if where:
+            sql += " WHERE " + " AND ".join(where)
+        sql += " ORDER BY created_at DESC LIMIT ?"
+        args.append(int(limit))
+        return [
+            {
+                "assessment_id": assessment_id,
+                "patient_id": patient,
+                "created_at": iso(created_at),
+                "overall_risk": overall,
+                "lab_score": labs,
+                "request": json.loads(body),
+                "response": json.loads(response),
+            }
+            for assessment_id, patient, created_at, overall, labs, body, response
+            in self.connect().execute(sql, args)
+        ]
+
+    def stats(self):
+        return {
+            "pending": self._queue.qsize() if self._pid == os.getpid() else 0,
+            "written": self.written,
+            "transactions": self.transactions,
+            "mean_transaction_rows": round(self.written / self.transactions, 2) if self.transactions else None,
+            "largest_transaction_rows": self.largest,
+            "failed": self.failed,
+        }
@@ -0,0 +1,122 @@
+# backend/batcher.py
+#
+# Micro-batching for single-patient predictions.
+#
+# Request threads hand their encoded row to submit() and wait on a Future.
+# One collector thread per model takes rows off that model's queue until it
+# has max_rows of them or max_wait_ms has passed since the first, then runs
+# the whole batch as one engine.proba() call on a small bounded pool and
+# fans the probabilities back out. Under bursty load many one-row calls
+# become a few vectorized ones; when the pool is busy rows keep queueing, so
+# batches grow instead of requests piling up on the CPU.
+
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+
+import numpy as np
+
+
+class QueueFull(Exception):
+    """Raised by submit() when a model's queue is at max_pending."""
+
+
+class MicroBatcher:
+    def __init__(self, max_rows=64, max_wait_ms=1.0, workers=2, max_pending=10000):
+        self.max_rows = int(max_rows)
+        self.max_wait = float(max_wait_ms) / 1000.0
+        self.workers = int(workers)
+        self.max_pending = int(max_pending)
+        self._lock = threading.Lock()
+        self._reset()
+
+    def _reset(self):
+        # Threads do not survive fork: everything is (re)created per process
+        self._pid = os.getpid()
+        self._pool = None
+        self._queues = {} # name -> queue.Queue of (engine, row, future)
+        # At most one batch running and one waiting per pool thread; the
+        # collectors block on this, which is what lets batches grow under load
+        self._slots = threading.BoundedSemaphore(2 * self.workers)
+        self.batches = 0
+        self.rows = 0
+        self.largest = 0
+        self.rejected = 0
+
+    def _queue(self, name):
+        q = self._queues.get(name)
+        if q is not None and self._pid == os.getpid():
+            return q
+        with self._lock:
+            if self._pid != os.getpid():
+                self._reset()
+            q = self._queues.get(name)
+            if q is None:
+                if self._pool is None:
+                    self._pool = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='microbatch')
+                q = queue.Queue(maxsize=self.max_pending)
+                threading.Thread(target=self._collect, args=(q,), name=f'microbatch-{name}', daemon=True).start()
+                self._queues[name] = q
+            return q
+
+    def submit(self, name, engine, row):
+        """Queue one encoded row (1-D or 1 x n) for engine; returns a Future of its probability."""
+        future = Future()
+        try:
+            self._queue(name).put_nowait((engine, np.asarray(row, dtype=np.float64).reshape(-1), future))
+        except queue.Full:
+            self.rejected += 1
+            raise QueueFull(f"Too many pending {name} predictions, try again shortly")
+        return future
+
+    def _collect(self, q):
+        while True:
+            items = [q.get()]
+            # Slot first, then the wait: rows that arrive while the pool is
+            # busy join this batch
+            self._slots.acquire()
+            deadline = time.monotonic() + self.max_wait
+            while len(items) < self.max_rows:
+                remaining = deadline - time.monotonic()
+                try:
+                    items.append(q.get(timeout=remaining) if remaining > 0 else q.get_nowait())
+                except queue.Empty:
+                    break
+            self._pool.submit(self._score, items)
+
+    def _score(self, items):
+        try:
+            # A reload can swap the engine while rows are queued: score each
+            # engine's rows separately so versions never mix
+            groups = {}
+            for engine, row, future in items:
+                groups.setdefault(id(engine), (engine, []))[1].append((row, future))
+            for engine, entries in groups.values():
+                try:
+                    probs = engine.proba(np.vstack([row for row, _ in entries]))
+                except Exception as e:
+                    for _, future in entries:
+                        future.set_exception(e)
+                    continue
+                for (_, future), prob in zip(entries, probs):
+                    future.set_result(float(prob))
+            self.batches += 1
+            self.rows += len(items)
+            self.largest = max(self.largest, len(items))
+        finally:
+            self._slots.release()
+
+    def stats(self):
+        return {
+            "max_rows": self.max_rows,
+            "max_wait_ms": self.max_wait * 1000.0,
+            "workers": self.workers,
+            "pending": sum(q.qsize() for q in self._queues.values()),
+            "batches": self.batches,
+            "rows": self.rows,
+            "mean_batch_rows": round(self.rows / self.batches, 2) if self.batches else None,
+            "largest_batch_rows": self.largest,
+            "rejected": self.rejected
+        }
@@ -0,0 +1,104 @@
+# Equivalence check + benchmark: NumPy engines (inference.py) vs
+# scaler.transform + predict_proba.
+#
+# Run from backend/:  python bench_inference.py
+
+import timeit
+import warnings
+
+import numpy as np
+
+warnings.filterwarnings("ignore")
+
+import os
+
+import joblib
+
+from inference import ForestEngine, GridEngine, SklearnEngine
+from registry import ModelRegistry, pickle_for, unpack
+
+# The models alone, as app.py serves them, without its stores and threads
+MODELS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'models')
+registry = ModelRegistry(MODELS_DIR, use_grid=True)
+
+
+def sklearn_pair(name):
+    # The served engine may come from a pickle-free bundle; the reference is
+    # always the original sklearn pickle
+    bundle = registry.get(name)
+    if bundle.model is not None:
+        return bundle.scaler, bundle.model
+    model, scaler, _ = unpack(name, joblib.load(pickle_for(bundle.path)))
+    return scaler, model
+
+
+TOLERANCE = 1e-9
+
+
+def random_rows(scaler, n, seed=0):
+    # Spread inputs well past the training range to exercise both sigmoid tails
+    rng = np.random.default_rng(seed)
+    return scaler.mean_ + rng.normal(scale=3.0, size=(n, scaler.mean_.shape[0])) * scaler.scale_
+
+
+def bench(label, fn, number):
+    best = min(timeit.repeat(fn, number=number, repeat=5)) / number
+    print(f"  {label:<26} {best * 1e6:10.1f} us")
+    return best
+
+
+if __name__ == "__main__":
+    registry.load_all()
+    for name in ('diabetes', 'heart', 'liver'):
+        engine = registry.get(name).engine
+        scaler, model = sklearn_pair(name)
+        reference = SklearnEngine(scaler, model)
+
+        X = random_rows(scaler, 10000)
+        # tests/test_engines.py holds this to TOLERANCE; here it is only reported
+        diff = np.max(np.abs(engine.proba(X) - reference.proba(X)))
+        print(f"{name}: {engine.kind} engine, max abs diff vs predict_proba {diff:.2e}"
+              f"{'' if diff < TOLERANCE else ' (OVER TOLERANCE)'}")
+
+        one = X[:1]
+        t_ref = bench("sklearn (1 row)", lambda: reference.proba(one), 2000)
+        t_new = bench("fused (1 row)", lambda: engine.proba(one), 2000)
+        print(f"  speedup: {t_ref / t_new:.0f}x")
+        t_ref = bench("sklearn (10k rows)", lambda: reference.proba(X), 20)
+        t_new = bench("fused (10k rows)", lambda: engine.proba(X), 20)
+        print(f"  speedup: {t_ref / t_new:.1f}x")
+
+    # Mental health forest: leaf-mask traversal, the level-by-level walk it
+    # replaces, compiled threshold-cell table and the 0-10 slider lookup grid
+    mental = registry.get('mental')
+    scaler, model = sklearn_pair('mental')
+    reference = SklearnEngine(scaler, model)
+    forest = ForestEngine.from_sklearn(scaler, model)
+    walked = ForestEngine.from_sklearn(scaler, model)
+    walked.masks = None
+    compiled = ForestEngine.from_sklearn(scaler, model).compile()
+    grid = GridEngine(compiled, mental.encoder.grid_axes())
+
+    rng = np.random.default_rng(0)
+    X = rng.uniform(-0.2, 1.2, size=(10000, 3))
+    on_grid = rng.integers(0, 11, size=(10000, 3)) / 10.0
+    # Inputs sitting exactly on split thresholds are where float32/float64 handling matters
+    on_cuts = np.column_stack([
+        compiled.mean[j] + compiled.scale[j] * rng.choice(compiled.cuts[j], size=10000) for j in range(3)
+    ])
+    engines = (("leaf masks", forest), ("level walk", walked), ("compiled", compiled), ("grid", grid), (f"served ({mental.format})", mental.engine))
+    for rows_label, rows in (("random", X), ("on grid", on_grid), ("on thresholds", on_cuts)):
+        diffs = [np.max(np.abs(engine.proba(rows) - reference.proba(rows))) for _, engine in engines]
+        print(f"mental: {rows_label} rows, max abs diff vs predict_proba "
+              + ', '.join(f"{label} {diff:.2e}" for (label, _), diff in zip(engines, diffs))
+              + ('' if max(diffs) < TOLERANCE else ' (OVER TOLERANCE)'))
+
+    one = on_grid[:1]
+    t_ref = bench("sklearn (1 row)", lambda: reference.proba(one), 200)
+    for label, engine in engines:
+        t = bench(f"{label} (1 row)", lambda: engine.proba(one), 2000)
+        print(f"  speedup: {t_ref / t:.0f}x")
+    t_ref = bench("sklearn (10k rows)", lambda: reference.proba(X), 5)
+    for label, engine in engines:
+        t = bench(f"{label} (10k rows)", lambda: engine.proba(X), 5)
+        print(f"  speedup: {t_ref / t:.1f}x")
@@ -0,0 +1,268 @@
+# Benchmark suite for the serving and training hot paths; writes one JSON
+# report so runs can be diffed and regressions caught before deploy.
+#
+#   routes      every /predict/* route through the Flask test client at
+#               concurrency 1, 8 and 64: client-side p50/p95/p99 plus the
+#               same percentiles for each stage (parse, encode, ...)
+#   throughput  rows/s per model, one row per request vs /batch requests
+#   startup     load_models() time, from bundles and from the .pkl files
+#   training    training.train_model() per model (what the train_* entry
+#               points call), into a scratch directory
+#
+# The prediction cache is off so the models are measured, not the cache.
+# Run from backend/:
+#   python bench_suite.py --out bench.json
+#   python bench_suite.py --out new.json --baseline bench.json    # exit 1 on regression
+
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import warnings
+from datetime import datetime, timezone
+
+os.environ.setdefault('EARLYGUARD_CACHE_SIZE', '0')
+os.environ.setdefault('EARLYGUARD_LOAD_MODE', 'eager')
+warnings.filterwarnings('ignore')
+
+import numpy as np
+
+import app
+import training
+from loadtest import PAYLOADS
+from metrics import Metrics
+from registry import ModelRegistry
+
+PERCENTILES = (50, 95, 99)
+
+
+class StageRecorder(Metrics):
+    """Metrics that also keeps every request's raw stage laps."""
+
+    def __init__(self):
+        super().__init__()
+        self.laps = []
+
+    def stages(self, model, mode, laps, rows=1):
+        self.laps.append(laps) # list.append is atomic under the GIL
+        super().stages(model, mode, laps, rows)
+
+
+def percentiles(seconds):
+    if not len(seconds):
+        return None
+    values = np.percentile(np.asarray(seconds) * 1000.0, PERCENTILES)
+    return {f"p{p}_ms": round(float(v), 4) for p, v in zip(PERCENTILES, values)}
+
+
+def bench_route(path, payload, concurrency, requests):
+    """Closed-loop test-client threads; client latency and per-stage percentiles."""
+    recorder = app.metrics = StageRecorder()
+    body = json.dumps(payload)
+    per_thread = max(1, requests // concurrency)
+    latencies, errors = [], []
+    start_line = threading.Barrier(concurrency + 1)
+
+    def worker():
+        client = app.app.test_client()
+        local = []
+        start_line.wait()
+        for _ in range(per_thread):
+            t = time.perf_counter()
+            response = client.post(path, data=body, content_type='application/json')
+            local.append(time.perf_counter() - t)
+            if response.status_code != 200:
+                errors.append(response.status_code)
+        latencies.extend(local)
+
+    threads = [threading.Thread(target=worker) for _ in range(concurrency)]
+    for t in threads:
+        t.start()
+    start_line.wait()
+    began = time.perf_counter()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - began
+
+    stages = {}
+    for laps in recorder.laps:
+        for stage, seconds in laps:
+            stages.setdefault(stage, []).append(seconds)
+    return {
+        "requests": len(latencies),
+        "errors": len(errors),
+        "throughput_rps": round(len(latencies) / elapsed, 1),
+        "latency": percentiles(latencies),
+        "stages": {stage: percentiles(v) for stage, v in stages.items()},
+    }
+
+
+def bench_throughput(path, payload, requests, batch_rows, batches):
+    """Rows/s for one row per request vs batches of batch_rows through /batch."""
+    client = app.app.test_client()
+    body = json.dumps(payload)
+    t = time.perf_counter()
+    for _ in range(requests):
+        client.post(path, data=body, content_type='application/json')
+    single = requests / (time.perf_counter() - t)
+
+    batch_body = json.dumps([payload] * batch_rows)
+    t = time.perf_counter()
+    for _ in range(batches):
+        response = client.post(path + '/batch', data=batch_body, content_type='application/json')
+        assert response.status_code == 200, response.get_json()
+    batch = batch_rows * batches / (time.perf_counter() - t)
+    return {"single_rows_per_s": round(single, 1), "batch_rows_per_s": round(batch, 1),
+            "batch_rows": batch_rows, "batch_speedup": round(batch / single, 1)}
+
+
+def bench_startup(repeat):
+    out = {}
+    for label, use_bundles in (("bundles", True), ("pickles", False)):
+        runs = []
+        for _ in range(repeat):
+            registry = ModelRegistry(app.MODELS_DIR, use_bundles=use_bundles)
+            with contextlib.redirect_stdout(io.StringIO()): # "... model loaded" lines
+                runs.append(registry.start('eager')["seconds"])
+        out[label] = {"seconds_min": round(min(runs), 4), "seconds_median": round(float(np.median(runs)), 4),
+                      "per_model": {name: s["timings"] for name, s in registry.status().items()}}
+    return out
+
+
+def bench_training(names):
+    out = {}
+    scratch = tempfile.mkdtemp(prefix='earlyguard-bench-')
+    try:
+        for name in names:
+            models_dir = os.path.join(scratch, name, 'models')
+            cache_dir = os.path.join(scratch, name, 'cache')
+            os.makedirs(models_dir)
+            # Same configuration as the served model
+            config = training.saved_config(name, training.MODELS_DIR)
+            cold = training.train_model(name, models_dir=models_dir, cache_dir=cache_dir, config=config)
+            warm = training.train_model(name, models_dir=models_dir, cache_dir=cache_dir, config=config)
+            out[name] = {
+                "rows": cold["rows"],
+                "config": config,
+                "prepare_seconds": cold["prepare_seconds"],
+                "prepare_cached_seconds": warm["prepare_seconds"],
+                "fit_seconds": min(cold["fit_seconds"], warm["fit_seconds"]),
+                "save_seconds": min(cold["save_seconds"], warm["save_seconds"]),
+                "total_seconds": cold["total_seconds"],
+            }
+    finally:
+        shutil.rmtree(scratch, ignore_errors=True)
+    return out
+
+
+def environment():
+    import sklearn
+
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                                cwd=app.BASE_DIR, timeout=10).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        commit = None
+    return {
+        "created_at": datetime.now(timezone.utc).isoformat(timespec='seconds'),
+        "commit": commit,
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "sklearn": sklearn.__version__,
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+        "versions": {name: s["version"] for name, s in app.registry.status().items()},
+    }
+
+
+# Headline numbers compared against a baseline: key -> (value, which way is better)
+def headline(report):
+    out = {}
+    for path, levels in report.get("routes", {}).items():
+        for level, r in levels.items():
+            out[f"routes {path} c={level} p95_ms"] = (r["latency"]["p95_ms"], 'lower')
+            out[f"routes {path} c={level} throughput_rps"] = (r["throughput_rps"], 'higher')
+    for path, r in report.get("throughput", {}).items():
+        out[f"throughput {path} single_rows_per_s"] = (r["single_rows_per_s"], 'higher')
+        out[f"throughput {path} batch_rows_per_s"] = (r["batch_rows_per_s"], 'higher')
+    for label, r in report.get("startup", {}).items():
+        out[f"startup {label} seconds_min"] = (r["seconds_min"], 'lower')
+    for name, r in report.get("training", {}).items():
+        out[f"training {name} fit_seconds"] = (r["fit_seconds"], 'lower')
+    return out
+
+
+def regressions(report, baseline, tolerance):
+    """Headline numbers worse than the baseline by more than `tolerance` (a fraction)."""
+    new, old = headline(report), headline(baseline)
+    found = []
+    for key, (value, better) in new.items():
+        if key not in old or not old[key][0]:
+            continue
+        ratio = value / old[key][0]
+        if (better == 'lower' and ratio > 1 + tolerance) or (better == 'higher' and ratio < 1 / (1 + tolerance)):
+            found.append({"metric": key, "baseline": old[key][0], "current": value, "ratio": round(ratio, 3)})
+    return found
+
+
+def main():
+    parser = argparse.ArgumentParser(description="EarlyGuard serving/training benchmark suite")
+    parser.add_argument('--out', default='bench.json', help="JSON report to write")
+    parser.add_argument('--concurrency', type=int, nargs='+', default=[1, 8, 64])
+    parser.add_argument('--requests', type=int, default=2000, help="Requests per route and concurrency level")
+    parser.add_argument('--batch-rows', type=int, default=1000)
+    parser.add_argument('--startup-repeat', type=int, default=3)
+    parser.add_argument('--skip', nargs='+', default=[], choices=['routes', 'throughput', 'startup', 'training'])
+    parser.add_argument('--baseline', help="Earlier report; exit 1 if a headline number regressed")
+    parser.add_argument('--tolerance', type=float, default=0.2, help="Allowed slowdown vs the baseline (0.2 = 20%%)")
+    args = parser.parse_args()
+
+    report = {"environment": environment(), "settings": vars(args)}
+    original_metrics = app.metrics
+    if 'routes' not in args.skip:
+        report["routes"] = {}
+        for path, payload in PAYLOADS.items():
+            bench_route(path, payload, 1, 200) # warm-up
+            report["routes"][path] = {
+                str(c): bench_route(path, payload, c, args.requests) for c in args.concurrency
+            }
+            print(f"routes {path}: " + ", ".join(
+                f"c={c} p95 {r['latency']['p95_ms']:.2f} ms" for c, r in report["routes"][path].items()))
+        app.metrics = original_metrics
+    if 'throughput' not in args.skip:
+        report["throughput"] = {}
+        for path, payload in PAYLOADS.items():
+            report["throughput"][path] = r = bench_throughput(path, payload, args.requests // 4, args.batch_rows,
+                                                              max(1, args.requests // args.batch_rows))
+            print(f"throughput {path}: {r['single_rows_per_s']:,.0f} rows/s single, "
+                  f"{r['batch_rows_per_s']:,.0f} rows/s batch")
+    if 'startup' not in args.skip:
+        report["startup"] = r = bench_startup(args.startup_repeat)
+        print("startup: " + ", ".join(f"{k} {v['seconds_min']:.3f}s" for k, v in r.items()))
+    if 'training' not in args.skip:
+        report["training"] = r = bench_training(list(training.TRAINERS))
+        print("training: " + ", ".join(f"{k} fit {v['fit_seconds']:.2f}s" for k, v in r.items()))
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            report["regressions"] = regressions(report, json.load(f), args.tolerance)
+    with open(args.out, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f"Wrote {args.out}")
+
+    for r in report.get("regressions", []):
+        print(f"REGRESSION {r['metric']}: {r['baseline']} -> {r['current']} (x{r['ratio']})")
+    if report.get("regressions"):
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,349 @@
+# backend/cohorts.py
+#
+# Population rollups over stored assessments, kept up to date as they are
+# written, so cohort questions ("how many of this clinic's patients are
+# high-risk for liver disease", "mean diabetes score by age band") are
+# answered from a few hundred pre-aggregated rows instead of a scan of every
+# assessment.
+#
+# Two views, both in the assessment database and both updated in the same
+# transaction as the assessments themselves (see assessments.py):
+#
+#   cohort_daily    every scored assessment, by model, UTC day, clinic, age
+#                   band and sex; cohort_monthly holds the same per UTC month,
+#                   so a date range reads whole months from it and only the
+#                   partial months at either end from cohort_daily
+#   cohort_current  every identified patient once, at their latest score,
+#                   by model, clinic, age band and sex. cohort_patients keeps
+#                   each patient's latest entry so a new score moves them
+#                   between cells (subtract the old, add the new).
+#
+# Each cell holds the same additive measures: count, count per risk level,
+# sum and sum of squares of the score (mean and spread) and a 20-bin score
+# histogram. Any grouping or filter is then a SUM over cells.
+#
+#   python cohorts.py rebuild          # recompute both views from stored assessments
+
+import argparse
+import json
+import math
+from datetime import date, datetime, timedelta, timezone
+from itertools import chain
+
+from labs import parse_time
+
+LEVELS = ('Low', 'Moderate', 'High')
+HIST_BINS = 20 # over risk_score 0-100, 5 points each
+AGE_BANDS = ((18, '<18'), (30, '18-29'), (40, '30-39'), (50, '40-49'), (60, '50-59'),
+             (70, '60-69'), (80, '70-79'), (float('inf'), '80+'))
+
+KEYS = ('clinic', 'age_band', 'sex')
+MEASURES = ('n', 'n_low', 'n_moderate', 'n_high', 'score_sum', 'score_sq') + tuple(f'h{i}' for i in range(HIST_BINS))
+# Columns a query may group or filter by, per view
+DIMENSIONS = {'assessments': ('month', 'day') + KEYS, 'patients': KEYS}
+
+
+def cell_table(name, keys):
+    measures = ',\n    '.join(f"{m} {'REAL' if m.startswith('score') else 'INTEGER'} NOT NULL" for m in MEASURES)
+    return (f"CREATE TABLE IF NOT EXISTS {name} (\n    {', '.join(f'{k} TEXT NOT NULL' for k in keys)},\n"
+            f"    {measures},\n    PRIMARY KEY ({', '.join(keys)})\n) WITHOUT ROWID;\n")
+
+
+SCHEMA = (
+    cell_table('cohort_daily', ('model', 'day') + KEYS)
+    + cell_table('cohort_monthly', ('model', 'month') + KEYS)
+    + cell_table('cohort_current', ('model',) + KEYS)
+    + """
+CREATE TABLE IF NOT EXISTS cohort_patients (
+    model TEXT NOT NULL,
+    patient_id TEXT NOT NULL,
+    created_at REAL NOT NULL,
+    clinic TEXT NOT NULL,
+    age_band TEXT NOT NULL,
+    sex TEXT NOT NULL,
+    risk_score REAL NOT NULL,
+    risk_level TEXT,
+    PRIMARY KEY (model, patient_id)
+) WITHOUT ROWID;
+"""
+)
+
+
+def upsert_sql(table, keys):
+    columns = keys + MEASURES
+    return (f"INSERT INTO {table} ({', '.join(columns)}) VALUES ({', '.join('?' * len(columns))}) "
+            f"ON CONFLICT ({', '.join(keys)}) DO UPDATE SET "
+            + ', '.join(f"{m} = {m} + excluded.{m}" for m in MEASURES))
+
+
+UPSERT_DAILY = upsert_sql('cohort_daily', ('model', 'day') + KEYS)
+UPSERT_MONTHLY = upsert_sql('cohort_monthly', ('model', 'month') + KEYS)
+UPSERT_CURRENT = upsert_sql('cohort_current', ('model',) + KEYS)
+
+
+# --- demographics: request payload -> cell keys ---------------------------
+
+def age_band(age):
+    try:
+        age = float(age)
+    except (TypeError, ValueError):
+        return 'unknown'
+    if not math.isfinite(age) or age < 0:
+        return 'unknown'
+    return next(label for limit, label in AGE_BANDS if age < limit)
+
+
+def sex_of(value):
+    # Liver sends Gender "Male"/"Female", heart sends sex 1/0
+    value = str(value).strip().lower()
+    if value in ('male', 'm', '1', '1.0'):
+        return 'male'
+    if value in ('female', 'f', '0', '0.0'):
+        return 'female'
+    return 'unknown'
+
+
+def demographics(data):
+    """(clinic, age_band, sex) of an assessment payload; '' / 'unknown' when absent."""
+    clinic = data.get('clinic_id')
+    age = data.get('Age', data.get('age'))
+    sex = data.get('Gender', data.get('sex', data.get('Sex')))
+    return ('' if clinic is None else str(clinic), age_band(age), 'unknown' if sex is None else sex_of(sex))
+
+
+# --- incremental maintenance ----------------------------------------------
+
+def measures(score, level, sign=1):
+    m = [0] * len(MEASURES)
+    m[0] = sign
+    if level in LEVELS:
+        m[1 + LEVELS.index(level)] = sign
+    m[4] = sign * score
+    m[5] = sign * score * score
+    m[6 + min(max(int(score // (100 / HIST_BINS)), 0), HIST_BINS - 1)] = sign
+    return m
+
+
+def accumulate(cells, key, m):
+    total = cells.get(key)
+    if total is None:
+        cells[key] = list(m)
+    else:
+        for i, v in enumerate(m):
+            total[i] += v
+
+
+def apply(conn, entries):
+    """Fold newly written scores into both views; call inside the write transaction.
+
+    entries: (patient_id or None, created_at, (clinic, age_band, sex),
+    [(model, risk_score, risk_level), ...]) per assessment.
+    """
+    daily, monthly, current, latest = {}, {}, {}, {}
+    for patient_id, created_at, cohort, scores in entries:
+        day = datetime.fromtimestamp(created_at, timezone.utc).strftime('%Y-%m-%d')
+        for model, score, level in scores:
+            if score is None:
+                continue
+            m = measures(score, level)
+            accumulate(daily, (model, day) + cohort, m)
+            accumulate(monthly, (model, day[:7]) + cohort, m)
+            if patient_id is not None:
+                seen = latest.get((model, patient_id))
+                if seen is None or created_at >= seen[0]:
+                    latest[(model, patient_id)] = (created_at, cohort, score, level)
+
+    # Each patient's previous latest entry, a primary-key lookup per model
+    patients, previous = {}, {}
+    for model, patient_id in latest:
+        patients.setdefault(model, []).append(patient_id)
+    for model, ids in patients.items():
+        for i in range(0, len(ids), 500):
+            chunk = ids[i:i + 500]
+            previous.update(((model, row[0]), row[1:]) for row in conn.execute(
+                "SELECT patient_id, created_at, clinic, age_band, sex, risk_score, risk_level FROM cohort_patients "
+                f"WHERE model = ? AND patient_id IN ({', '.join('?' * len(chunk))})", [model, *chunk]
+            ))
+
+    moved = []
+    for (model, patient_id), (created_at, cohort, score, level) in latest.items():
+        old = previous.get((model, patient_id))
+        if old is not None:
+            if old[0] > created_at:
+                continue # an older score arriving late does not replace the latest
+            accumulate(current, (model,) + tuple(old[1:4]), measures(old[4], old[5], -1))
+        accumulate(current, (model,) + cohort, measures(score, level))
+        moved.append((model, patient_id, created_at, *cohort, score, level))
+
+    conn.executemany(UPSERT_DAILY, [key + tuple(m) for key, m in daily.items()])
+    conn.executemany(UPSERT_MONTHLY, [key + tuple(m) for key, m in monthly.items()])
+    conn.executemany(UPSERT_CURRENT, [key + tuple(m) for key, m in current.items()])
+    conn.executemany("INSERT OR REPLACE INTO cohort_patients VALUES (?, ?, ?, ?, ?, ?, ?, ?)", moved)
+
+
+def rebuild(conn, chunk=5000):
+    """Recompute both views from the stored assessments (one transaction); returns assessments read."""
+    conn.execute('BEGIN IMMEDIATE')
+    try:
+        for table in ('cohort_daily', 'cohort_monthly', 'cohort_current', 'cohort_patients'):
+            conn.execute(f"DELETE FROM {table}")
+        cursor = conn.execute(
+            "SELECT a.id, a.patient_id, a.created_at, a.request, s.model, s.risk_score, s.risk_level "
+            "FROM assessments a JOIN assessment_scores s ON s.assessment_id = a.id "
+            "ORDER BY a.created_at, a.id"
+        )
+        # Read `chunk` rows at a time rather than the whole history; apply()
+        # only writes the cohort tables, so the open read is unaffected
+        entries, current_id, count = [], None, 0
+        for assessment_id, patient_id, created_at, body, model, score, level in chain.from_iterable(
+                iter(lambda: cursor.fetchmany(chunk), [])):
+            if assessment_id != current_id:
+                try:
+                    data = json.loads(body)
+                except ValueError:
+                    data = {}
+                cohort = demographics(data if isinstance(data, dict) else {})
+                entries.append((patient_id, created_at, cohort, []))
+                current_id = assessment_id
+                count += 1
+            entries[-1][3].append((model, score, level))
+            if len(entries) > chunk:
+                apply(conn, entries[:-1])
+                entries = entries[-1:]
+        apply(conn, entries)
+        conn.execute('COMMIT')
+    except BaseException:
+        conn.execute('ROLLBACK')
+        raise
+    return count
+
+
+# --- queries ----------------------------------------------------------------
+
+def summarize(m):
+    n = m[0]
+    mean = m[4] / n if n else None
+    var = max(m[5] / n - mean * mean, 0.0) if n else None
+    return {
+        "count": int(n),
+        "levels": {level: int(m[1 + i]) for i, level in enumerate(LEVELS)},
+        "high_percent": round(100.0 * m[3] / n, 2) if n else None,
+        "mean_score": None if mean is None else round(mean, 2),
+        "std_score": None if var is None else round(math.sqrt(var), 2),
+        "histogram": [int(h) for h in m[6:]],
+    }
+
+
+def utc_day(value):
+    return datetime.fromtimestamp(parse_time(value), timezone.utc).date()
+
+
+def month_after(d):
+    return date(d.year + d.month // 12, d.month % 12 + 1, 1)
+
+
+def ranges(since, until):
+    """Split [since, until] into ((first, last) month, [(first, last) day, ...]) for the two tables.
+
+    Months wholly inside the range come from cohort_monthly; the partial
+    months at either end from cohort_daily. Either bound may be None.
+    """
+    if since is not None and until is not None and since > until:
+        return None, []
+    # First day of the first full month / of the month after the last full one
+    first = since if since is None or since.day == 1 else month_after(since)
+    if until is None:
+        stop = None
+    elif month_after(until) - timedelta(days=1) == until: # last day of its month
+        stop = month_after(until)
+    else:
+        stop = date(until.year, until.month, 1)
+    if first is not None and stop is not None and first >= stop:
+        return None, [(since, until)]
+    months = (None if first is None else first.strftime('%Y-%m'),
+              None if stop is None else (stop - timedelta(days=1)).strftime('%Y-%m'))
+    days = []
+    if since is not None and first != since:
+        days.append((since, first - timedelta(days=1)))
+    if until is not None and stop is not None and stop <= until:
+        days.append((stop, until))
+    return months, days
+
+
+def bounded(column, low, high, where, args):
+    where, args = list(where), list(args)
+    if low is not None:
+        where.append(f"{column} >= ?")
+        args.append(str(low))
+    if high is not None:
+        where.append(f"{column} <= ?")
+        args.append(str(high))
+    return where, args
+
+
+def query(conn, model, view='assessments', group_by=(), filters=None, since=None, until=None):
+    """Aggregate one model's cells: {"groups": [...], "total": {...}}.
+
+    view: 'assessments' (every scored assessment) or 'patients' (each
+    patient at their latest score). group_by takes the view's dimensions,
+    filters {clinic, age_band, sex: value}; since/until (dates or
+    timestamps, inclusive UTC days) apply to 'assessments'.
+    """
+    if view not in DIMENSIONS:
+        raise ValueError(f"Unknown view {view!r}, expected one of {', '.join(DIMENSIONS)}")
+    group = list(group_by)
+    filters = filters or {}
+    unknown = [d for d in group if d not in DIMENSIONS[view]] + [d for d in filters if d not in KEYS]
+    if unknown:
+        raise ValueError(f"Unknown dimensions {unknown} for view {view!r} "
+                         f"(group by {', '.join(DIMENSIONS[view])}; filter by {', '.join(KEYS)})")
+    if (since is not None or until is not None) and view != 'assessments':
+        raise ValueError("since/until apply to the 'assessments' view")
+
+    where, args = ["model = ?"], [model]
+    for dim, value in filters.items():
+        where.append(f"{dim} = ?")
+        args.append(str(value))
+
+    if view == 'patients':
+        parts = [("cohort_current", group, where, args)]
+    else:
+        since = None if since is None else utc_day(since)
+        until = None if until is None else utc_day(until)
+        months, days = (None, [(since, until)]) if 'day' in group else ranges(since, until)
+        parts = []
+        # Daily rows stand in for months by their prefix
+        daily_group = ['substr(day, 1, 7) AS month' if d == 'month' else d for d in group]
+        for low, high in days:
+            parts.append(("cohort_daily", daily_group, *bounded('day', low, high, where, args)))
+        if months is not None:
+            parts.append(("cohort_monthly", group, *bounded('month', *months, where, args)))
+
+    groups, total = [], [0] * len(MEASURES)
+    if parts:
+        union = ' UNION ALL '.join(
+            f"SELECT {', '.join(list(columns) + list(MEASURES))} FROM {table} WHERE {' AND '.join(clause)}"
+            for table, columns, clause, _ in parts
+        )
+        sql = f"SELECT {', '.join(group + [f'SUM({m})' for m in MEASURES])} FROM ({union})"
+        if group:
+            sql += f" GROUP BY {', '.join(group)} HAVING SUM(n) > 0 ORDER BY {', '.join(group)}"
+        for row in conn.execute(sql, [a for *_, part_args in parts for a in part_args]):
+            m = [v or 0 for v in row[len(group):]]
+            for i, v in enumerate(m):
+                total[i] += v
+            if group:
+                groups.append({**dict(zip(group, row[:len(group)])), **summarize(m)})
+    return {"model": model, "view": view, "group_by": group, "filters": filters,
+            "histogram_bin_width": 100 // HIST_BINS, "groups": groups, "total": summarize(total)}
+
+
+if __name__ == '__main__':
+    from assessments import ASSESSMENTS_DB, AssessmentStore
+
+    parser = argparse.ArgumentParser(description="Cohort rollups over stored assessments")
+    parser.add_argument('command', choices=['rebuild'])
+    parser.add_argument('--db', default=ASSESSMENTS_DB)
+    args = parser.parse_args()
+    count = rebuild(AssessmentStore(args.db).connect())
+    print(f"Rebuilt cohort rollups from {count} assessments in {args.db}")
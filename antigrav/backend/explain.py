@@ -0,0 +1,40 @@
+# backend/explain.py
+#
+# Per-prediction explanations: the top-k features behind each score, from
+# the engine's additive contributions (see inference.py). Engines without
+# contributions (the scikit-learn fallback) are not explained.
+
+import numpy as np
+
+
+def explainable(engine):
+    return hasattr(engine, 'contributions')
+
+
+def top_drivers(engine, X, features, k=3):
+    """Per row, the k features with the largest |contribution|, largest first.
+
+    Returns a list (one per row of X) of [{"feature", "value",
+    "contribution"}], or None when the engine cannot explain itself.
+    A positive contribution pushes the risk up.
+    """
+    if k <= 0 or not explainable(engine):
+        return None
+    X = np.asarray(X, dtype=np.float64)
+    C = engine.contributions(X)
+    k = min(k, C.shape[1])
+    if k < C.shape[1]:
+        top = np.argpartition(-np.abs(C), k - 1, axis=1)[:, :k]
+    else:
+        top = np.broadcast_to(np.arange(k), C.shape)
+    rows = np.arange(len(C))[:, None]
+    # Order the k picks by |contribution|
+    order = np.argsort(-np.abs(C[rows, top]), axis=1, kind='stable')
+    top = top[rows, order]
+
+    values = X[rows, top].tolist()
+    contribs = np.round(C[rows, top], 4).tolist()
+    return [
+        [{"feature": features[j], "value": v, "contribution": c} for j, v, c in zip(idx, vs, cs)]
+        for idx, vs, cs in zip(top.tolist(), values, contribs)
+    ]
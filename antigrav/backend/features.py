@@ -0,0 +1,343 @@
+# backend/features.py
+#
+# Request dict -> float64 NumPy row encoders.
+# Each model's encoder is compiled once from its persisted feature list, so
+# encoding a patient is a handful of dict lookups and array stores instead of
+# building a pandas DataFrame per request.
+#
+# The field declarations below are also each model's input schema: type,
+# default, plausible range and unit, allowed categories. Ranges are compiled
+# into per-column bounds checked with one vectorized comparison per call;
+# only rows that fail are re-examined field by field for the error report.
+
+import math
+
+import numpy as np
+
+
+def integer(value):
+    """int() for counts and 0/1 flags: refuses bools and fractional values
+    instead of truncating them."""
+    if isinstance(value, bool):
+        raise TypeError(value)
+    number = float(value)
+    if not number.is_integer():
+        raise ValueError(value)
+    return int(number)
+
+
+class ValidationError(ValueError):
+    """Invalid input; `fields` lists one {"field", "error", ...} dict per problem."""
+
+    def __init__(self, fields):
+        self.fields = fields
+        super().__init__('; '.join(f"{f['field']}: {f['error']}" if f.get('field') else f['error'] for f in fields))
+
+
+class Numeric:
+    """Numeric input copied into one feature slot (optionally divided by `scale`).
+
+    min/max: physiologically plausible range (inclusive), in `unit`.
+    grid: the input's allowed values when it is a small fixed set (e.g. a
+    0-10 slider), which lets the model be precomputed as a lookup table.
+    """
+
+    def __init__(self, key, default=0, cast=float, feature=None, scale=1.0, grid=None, min=None, max=None, unit=None):
+        self.key = key
+        self.default = default
+        self.cast = cast
+        self.feature = feature or key
+        self.scale = scale
+        self.grid = grid
+        self.min = min
+        self.max = max
+        self.unit = unit
+
+    def describe(self):
+        return {"type": "integer" if self.cast is integer else "number", "default": self.default,
+                "min": self.min, "max": self.max, "unit": self.unit}
+
+    def check(self, value):
+        """Error dict for a bad raw value, or None."""
+        try:
+            number = self.cast(value)
+        except (TypeError, ValueError):
+            kind = "an integer" if self.cast is integer else "a number"
+            return {"field": self.key, "error": f"expected {kind}, got {value!r}", "value": value}
+        if not math.isfinite(number):
+            return {"field": self.key, "error": "must be finite", "value": value}
+        low = self.min is not None and number < self.min
+        if low or (self.max is not None and number > self.max):
+            unit = f" {self.unit}" if self.unit else ""
+            bound = f"below {self.min:g}" if low else f"above {self.max:g}"
+            return {"field": self.key, "error": f"{number:g}{unit} is {bound}{unit}",
+                    "value": value, "min": self.min, "max": self.max, "unit": self.unit}
+        return None
+
+
+class Categorical:
+    # Shared by Mapped and OneHot: `allowed` is the accepted values (None = any)
+
+    def describe(self):
+        return {"type": "category", "default": self.default,
+                "allowed": None if self.allowed is None else sorted(self.allowed)}
+
+    def check(self, value):
+        if self.allowed is not None and str(value) not in self.allowed:
+            return {"field": self.key, "error": f"{value!r} is not one of {sorted(self.allowed)}",
+                    "value": value, "allowed": sorted(self.allowed)}
+        return None
+
+
+class Mapped(Categorical):
+    """Categorical input mapped to a code in one feature slot, e.g. Gender -> 1/0."""
+
+    def __init__(self, key, mapping, default, otherwise=0, feature=None, allowed=None):
+        self.key = key
+        self.mapping = mapping
+        self.default = default
+        self.otherwise = otherwise
+        self.feature = feature or key
+        self.allowed = None if allowed is None else frozenset(map(str, allowed))
+
+
+class OneHot(Categorical):
+    """Categorical input that sets the `<prefix>_<value>` dummy slot to 1.
+
+    Training used pd.get_dummies(drop_first=True), so the one allowed value
+    without a slot (the dropped baseline) leaves every dummy at 0. aliases
+    maps other accepted spellings (e.g. the UI's numeric codes) to a value.
+    """
+
+    def __init__(self, key, default, prefix=None, allowed=None, aliases=None):
+        self.key = key
+        self.default = default
+        self.prefix = prefix or key
+        self.aliases = {str(k): v for k, v in (aliases or {}).items()}
+        self.allowed = None if allowed is None else frozenset(map(str, allowed)) | frozenset(self.aliases)
+
+    def describe(self):
+        out = super().describe()
+        if self.aliases:
+            out["aliases"] = self.aliases
+        return out
+
+
+class FeatureEncoder:
+    def __init__(self, features, fields):
+        self.features = list(features)
+        self.width = len(self.features)
+        index = {name: i for i, name in enumerate(self.features)}
+
+        # Every declared field must land in a persisted feature column; one
+        # that matches none would be accepted and advertised, then ignored.
+        self._numeric = []
+        self._mapped = []
+        self._onehot = []
+        self._grid = {}
+        self._columns = {} # numeric key -> (field, column), for what-if sweeps
+        self.fields = [] # the fields in use, for error reports and describe()
+        # Per-column bounds in encoded units (raw range / scale); finite even
+        # when unbounded, so the same comparison rejects inf and NaN
+        self._lo = np.full(self.width, -np.finfo(np.float64).max)
+        self._hi = np.full(self.width, np.finfo(np.float64).max)
+        for f in fields:
+            if isinstance(f, Numeric):
+                if f.feature in index:
+                    i = index[f.feature]
+                    self._numeric.append((f.key, f.default, f.cast, f.scale, i))
+                    if f.grid is not None:
+                        self._grid[i] = np.asarray(f.grid, dtype=np.float64) / f.scale
+                    if f.min is not None:
+                        self._lo[i] = f.min / f.scale
+                    if f.max is not None:
+                        self._hi[i] = f.max / f.scale
+                    self._columns[f.key] = (f, i)
+                    self.fields.append(f)
+            elif isinstance(f, Mapped):
+                if f.feature in index:
+                    self._mapped.append((f.key, f.default, f.mapping, f.otherwise, f.allowed, index[f.feature]))
+                    self.fields.append(f)
+            elif isinstance(f, OneHot):
+                start = f.prefix + '_'
+                slots = {name[len(start):]: i for name, i in index.items() if name.startswith(start)}
+                if slots:
+                    if f.allowed is not None:
+                        # Every accepted spelling -> its slot (None = baseline)
+                        labels = f.allowed - set(f.aliases)
+                        baseline = sorted(labels - set(slots))
+                        if len(baseline) != 1 or not set(slots) <= labels:
+                            raise ValueError(f"{f.key}: allowed values {sorted(labels)} do not match the "
+                                             f"model's columns {sorted(slots)} plus one baseline")
+                        slots = {value: slots.get(f.aliases.get(value, value)) for value in f.allowed}
+                    self._onehot.append((f.key, f.default, slots, f.allowed))
+                    self.fields.append(f)
+            else:
+                raise TypeError(f"Unknown field type: {f!r}")
+        unused = [f.key for f in fields if f not in self.fields]
+        if unused:
+            raise ValueError(f"Fields {unused} match no feature in {self.features}")
+
+    def describe(self):
+        """The input schema: {key: {"type", "default", "min"/"max"/"unit" or "allowed"}}."""
+        return {f.key: f.describe() for f in self.fields}
+
+    def diagnose(self, data):
+        """ValidationError listing every problem with one payload (the slow path)."""
+        if isinstance(data, Exception):
+            return ValidationError([{"field": None, "error": str(data)}])
+        if not isinstance(data, dict):
+            return ValidationError([{"field": None, "error": "Expected a JSON object"}])
+        problems = [p for p in (f.check(data.get(f.key, f.default)) for f in self.fields) if p is not None]
+        return ValidationError(problems or [{"field": None, "error": "Invalid input"}])
+
+    def valid_rows(self, X):
+        return ((X >= self._lo) & (X <= self._hi)).all(axis=1)
+
+    def column(self, key):
+        """(Numeric field, column index) of a numeric input in use, or None."""
+        return self._columns.get(key)
+
+    def grid_axes(self):
+        """Encoded values per feature column, or None unless every column is on a grid."""
+        if len(self._grid) != self.width:
+            return None
+        return [self._grid[i] for i in range(self.width)]
+
+    def encode_into(self, data, out):
+        """Write one patient's features into `out` (a zeroed float64 row)."""
+        get = data.get
+        for key, default, cast, scale, i in self._numeric:
+            out[i] = cast(get(key, default)) / scale
+        for key, default, mapping, otherwise, allowed, i in self._mapped:
+            value = get(key, default)
+            if allowed is not None and str(value) not in allowed:
+                raise ValueError(key)
+            out[i] = mapping.get(value, otherwise)
+        for key, default, slots, allowed in self._onehot:
+            value = str(get(key, default))
+            if allowed is not None and value not in allowed:
+                raise ValueError(key)
+            i = slots.get(value)
+            if i is not None:
+                out[i] = 1.0
+        return out
+
+    def encode(self, data):
+        """Encode one patient dict into a (1, width) matrix; raises ValidationError."""
+        return self.validate(self.fill(data), data)
+
+    def fill(self, data):
+        # encode() without the range check, so the two steps can be timed apart
+        X = np.zeros((1, self.width))
+        try:
+            self.encode_into(data, X[0])
+        except Exception:
+            raise self.diagnose(data) from None
+        return X
+
+    def validate(self, X, data):
+        if not self.valid_rows(X)[0]:
+            raise self.diagnose(data)
+        return X
+
+    def encode_many(self, patients):
+        """Encode a list of patient dicts into one matrix.
+
+        Returns (X, ok, errors): X holds only the rows that passed validation,
+        ok lists their input indexes in order and errors maps every other
+        index to a ValidationError.
+        """
+        X = np.zeros((len(patients), self.width))
+        ok, errors = [], {}
+        for i, data in enumerate(patients):
+            try:
+                if not isinstance(data, dict):
+                    raise TypeError
+                self.encode_into(data, X[len(ok)])
+            except Exception:
+                X[len(ok)] = 0.0
+                errors[i] = self.diagnose(data)
+                continue
+            ok.append(i)
+
+        X = X[:len(ok)]
+        valid = self.valid_rows(X)
+        if not valid.all():
+            for j in np.flatnonzero(~valid):
+                errors[ok[j]] = self.diagnose(patients[ok[j]])
+            X = X[valid]
+            ok = [i for i, keep in zip(ok, valid) if keep]
+        return X, ok, errors
+
+
+# Request fields per model. Keys and defaults match what the UI sends
+# (see frontend AssessmentContext); feature names match the training columns.
+# Ranges are deliberately wide (they include every training value, where 0
+# often stands for "not measured") and only reject impossible inputs.
+
+DIABETES_FIELDS = [
+    Numeric('Pregnancies', min=0, max=25),
+    Numeric('Glucose', min=0, max=800, unit='mg/dL'),
+    Numeric('BloodPressure', min=0, max=250, unit='mmHg'), # diastolic
+    Numeric('SkinThickness', min=0, max=110, unit='mm'),
+    Numeric('Insulin', min=0, max=1500, unit='uU/mL'),
+    Numeric('BMI', min=0, max=100, unit='kg/m2'),
+    Numeric('DiabetesPedigreeFunction', 0.5, min=0, max=3), # Default average
+    Numeric('Age', min=0, max=120, unit='years'),
+]
+
+# cp/slope/thal/restecg take the training labels or the UI's numeric codes
+HEART_FIELDS = [
+    Numeric('age', min=0, max=120, unit='years'),
+    # The model's columns are one-hot dummies and the UCI spellings
+    Numeric('sex', 0, integer, feature='sex_Male', min=0, max=1), # 1=Male, 0=Female
+    Numeric('trestbps', 120, min=0, max=300, unit='mmHg'),
+    Numeric('chol', 200, min=0, max=1000, unit='mg/dL'),
+    Numeric('fbs', 0, integer, feature='fbs_True', min=0, max=1), # 1 if > 120
+    Numeric('thalach', 150, feature='thalch', min=20, max=250, unit='bpm'),
+    Numeric('exang', 0, integer, feature='exang_True', min=0, max=1),
+    Numeric('oldpeak', min=-10, max=10, unit='mm'),
+    Numeric('ca', min=0, max=4),
+    OneHot('cp', 'typical angina', allowed=('typical angina', 'atypical angina', 'non-anginal', 'asymptomatic'),
+           aliases={0: 'typical angina', 1: 'atypical angina', 2: 'non-anginal', 3: 'asymptomatic'}),
+    OneHot('slope', 'flat', allowed=('upsloping', 'flat', 'downsloping'),
+           aliases={0: 'upsloping', 1: 'flat', 2: 'downsloping'}),
+    OneHot('thal', 'fixed defect', allowed=('normal', 'fixed defect', 'reversable defect'),
+           aliases={1: 'normal', 2: 'fixed defect', 3: 'reversable defect'}),
+    OneHot('restecg', 'normal', allowed=('normal', 'st-t abnormality', 'lv hypertrophy'),
+           aliases={0: 'normal', 1: 'st-t abnormality', 2: 'lv hypertrophy'}),
+]
+
+LIVER_FIELDS = [
+    Numeric('Age', min=0, max=120, unit='years'),
+    Mapped('Gender', {'Male': 1}, 'Male', allowed=('Male', 'Female')),
+    Numeric('Total_Bilirubin', min=0, max=100, unit='mg/dL'),
+    Numeric('Direct_Bilirubin', min=0, max=60, unit='mg/dL'),
+    Numeric('Alkaline_Phosphotase', min=0, max=6000, unit='U/L'),
+    Numeric('Alamine_Aminotransferase', min=0, max=10000, unit='U/L'),
+    Numeric('Aspartate_Aminotransferase', min=0, max=10000, unit='U/L'),
+    Numeric('Total_Protiens', min=0, max=15, unit='g/dL'),
+    Numeric('Albumin', min=0, max=10, unit='g/dL'),
+    Numeric('Albumin_and_Globulin_Ratio', min=0, max=5),
+]
+
+# UI sends 0-10 sliders; the model was trained on 0-1 indicators
+MENTAL_FIELDS = [
+    Numeric('stress_level', 5, feature='Anxiety_Indicator', scale=10.0, grid=range(11), min=0, max=10),
+    Numeric('workload', 5, feature='Workload_Indicator', scale=10.0, grid=range(11), min=0, max=10),
+    Numeric('sleep_quality', 5, feature='Sleep_Indicator', scale=10.0, grid=range(11), min=0, max=10),
+]
+
+DIABETES_FEATURES = ['Pregnancies', 'Glucose', 'BloodPressure', 'SkinThickness', 'Insulin', 'BMI', 'DiabetesPedigreeFunction', 'Age']
+
+FIELDS = {
+    'diabetes': DIABETES_FIELDS,
+    'heart': HEART_FIELDS,
+    'liver': LIVER_FIELDS,
+    'mental': MENTAL_FIELDS,
+}
+
+
+def build_encoder(name, features):
+    return FeatureEncoder(features, FIELDS[name])
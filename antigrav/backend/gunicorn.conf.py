@@ -0,0 +1,93 @@
+# gunicorn configuration for the EarlyGuard API
+#
+#   cd backend && gunicorn -c gunicorn.conf.py app:app
+#
+# With preload (default) the master imports app.py and loads every model once
+# before forking, so workers share those pages copy-on-write instead of each
+# unpickling their own copy.
+#
+# Every setting below can be overridden with an EARLYGUARD_* variable (or on
+# the gunicorn command line, which wins over this file).
+
+import gc
+import glob
+import multiprocessing
+import os
+import tempfile
+
+os.environ.setdefault('EARLYGUARD_SERVER', 'gunicorn')
+
+# Workers write metric snapshots here and /metrics merges them (see
+# metrics.py). A fresh directory per server start unless one is given; a
+# given one is emptied so totals restart with the server.
+if os.environ.get('EARLYGUARD_METRICS_DIR'):
+    os.makedirs(os.environ['EARLYGUARD_METRICS_DIR'], exist_ok=True)
+    for stale in glob.glob(os.path.join(os.environ['EARLYGUARD_METRICS_DIR'], '*.json')):
+        os.remove(stale)
+else:
+    os.environ['EARLYGUARD_METRICS_DIR'] = tempfile.mkdtemp(prefix='earlyguard-metrics-')
+
+
+def env_int(name, default):
+    return int(os.environ.get(name, default))
+
+
+bind = os.environ.get('EARLYGUARD_BIND', '0.0.0.0:5000')
+
+# Processes x threads. Scoring is short NumPy work that releases the GIL only
+# briefly, so throughput comes from processes; threads cover slow clients and
+# the I/O around each request.
+workers = env_int('EARLYGUARD_WORKERS', min(multiprocessing.cpu_count(), 8))
+threads = env_int('EARLYGUARD_THREADS', 4)
+worker_class = 'gthread' if threads > 1 else 'sync'
+backlog = env_int('EARLYGUARD_BACKLOG', 2048)
+
+# Keep-alive lets the frontend and batch clients reuse connections
+keepalive = env_int('EARLYGUARD_KEEPALIVE', 5)
+# A worker silent for this long is killed and replaced (large batches included)
+timeout = env_int('EARLYGUARD_TIMEOUT', 60)
+# On SIGTERM/HUP workers stop accepting and get this long to finish in-flight requests
+graceful_timeout = env_int('EARLYGUARD_GRACEFUL_TIMEOUT', 30)
+
+# Recycle workers now and then so slow leaks cannot build up (0 = never)
+max_requests = env_int('EARLYGUARD_MAX_REQUESTS', 0)
+max_requests_jitter = max_requests // 10
+
+# Request header limits; body size is enforced by the app (EARLYGUARD_MAX_BODY_BYTES)
+limit_request_line = 4094
+limit_request_fields = 100
+limit_request_field_size = 8190
+
+# Access log off by default: one line per request costs more than a prediction
+accesslog = os.environ.get('EARLYGUARD_ACCESS_LOG') or None
+errorlog = '-'
+loglevel = os.environ.get('EARLYGUARD_LOG_LEVEL', 'info')
+
+preload_app = os.environ.get('EARLYGUARD_PRELOAD', '1') == '1'
+
+if preload_app and os.environ.get('EARLYGUARD_LOAD_MODE', 'eager') == 'lazy':
+    # Lazy loading would happen per worker after fork and share nothing
+    os.environ['EARLYGUARD_LOAD_MODE'] = 'parallel'
+
+
+def when_ready(server):
+    if preload_app:
+        # Models are loaded; move them out of the collector's reach so
+        # garbage collection in the workers does not write to (and so copy)
+        # the shared pages.
+        gc.collect()
+        gc.freeze()
+
+
+def post_fork(server, worker):
+    import app
+    app.start_background_tasks()
+
+
+def worker_exit(server, worker):
+    # Final snapshot, so requests since the last periodic flush still count,
+    # and write out assessments still waiting in the queue
+    import app
+    app.metrics.flush(app.metrics_state())
+    if app.assessment_store is not None:
+        app.assessment_store.flush()
@@ -0,0 +1,228 @@
+# backend/incremental.py
+#
+# Incremental model updates from newly labelled outcomes.
+#
+# Labelled patients are appended to an append-only NDJSON store (one file per
+# model, API field names + "label"). An update folds the rows the active
+# model has not seen yet into it instead of refitting from the raw CSVs:
+#
+#   logistic  the scaler statistics are updated in a streaming way
+#             (StandardScaler.partial_fit on the new rows only), the old
+#             coefficients are re-expressed in the new scaled space and
+#             lbfgs is warm-started from them on the cached training matrix
+#             plus the store, which converges in a few iterations
+#   forest    a few new trees are grown on the combined data (warm_start)
+#             and the oldest are retired past a cap, so recent outcomes
+#             steadily replace old trees
+#
+# The result is published as a new registry version (bundle + .pkl) and made
+# ACTIVE; a running server picks it up through its watcher
+# (EARLYGUARD_WATCH_MODELS) or right away with --reload-url.
+#
+#   python incremental.py append diabetes labelled.ndjson
+#   python incremental.py update --models diabetes --reload-url http://127.0.0.1:5000
+
+import argparse
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+import urllib.request
+
+import numpy as np
+
+from artifacts import bundle_path, dump_atomic, export_pickled, is_bundle, read_manifest
+from features import build_encoder
+from outcomes import OUTCOMES_DIR, OutcomeStore
+from registry import MODEL_FILES, ModelRegistry, drop_feature_names, pickle_for, unpack
+import training
+
+OUTCOMES_CACHE_DIR = os.path.join(training.BASE_DIR, '.cache', 'outcomes')
+
+# Forest updates: trees grown per update, and the most trees kept
+FOREST_GROWTH = 10
+MAX_TREES = 200
+
+
+def encoded_outcomes(name, store, features, cache_dir=OUTCOMES_CACHE_DIR):
+    """(X, y) for every usable row in the model's store, in store order.
+
+    Encoded rows are cached with the byte offset they cover, so each call
+    only reads and encodes what was appended since. Rows that fail to encode
+    are skipped, identically every time, so row counts stay stable.
+    """
+    cache = os.path.join(cache_dir, f"{name}.npz")
+    source = os.path.abspath(store.path(name))
+    size = os.path.getsize(source) if os.path.exists(source) else 0
+    X, y, offset = np.zeros((0, len(features))), np.zeros(0, dtype=np.int64), 0
+    if os.path.exists(cache):
+        with np.load(cache, allow_pickle=False) as f:
+            # Reuse only for the same store file and features, and only if the
+            # file has not been truncated or replaced since (append-only)
+            if f['features'].tolist() == list(features) and str(f['source']) == source and int(f['offset']) <= size:
+                X, y, offset = f['X'], f['y'], int(f['offset'])
+
+    rows, end = store.read(name, offset)
+    if rows:
+        rows = [r for r in rows if isinstance(r, dict) and r.get('label') in (0, 1)]
+        X_new, ok, _ = build_encoder(name, features).encode_many(rows)
+        X = np.vstack([X, X_new])
+        y = np.concatenate([y, np.array([rows[i]['label'] for i in ok], dtype=np.int64)])
+    if end != offset:
+        os.makedirs(cache_dir, exist_ok=True)
+        tmp = f"{cache}.{os.getpid()}.tmp.npz"
+        np.savez(tmp, X=X, y=y, offset=end, source=source, features=np.array(features, dtype=str))
+        os.replace(tmp, cache)
+    return X, y
+
+
+def warm_start_logistic(model, scaler, X_new, X_all, y_all):
+    """Fold new rows into a StandardScaler + LogisticRegression pair in place."""
+    # Raw-space weights of the current model: z = w . x + b
+    w = model.coef_[0] / scaler.scale_
+    b = model.intercept_[0] - w @ scaler.mean_
+
+    scaler.partial_fit(X_new)
+
+    # Same decision function, expressed in the updated scaled space
+    model.coef_ = (w * scaler.scale_)[None, :]
+    model.intercept_ = np.array([b + w @ scaler.mean_])
+    model.set_params(warm_start=True)
+    model.fit(scaler.transform(X_all), y_all)
+    return {"iterations": int(np.max(model.n_iter_))}
+
+
+def grow_forest(model, scaler, X_all, y_all, growth=FOREST_GROWTH, max_trees=MAX_TREES):
+    """Add trees fitted on the combined data; retire the oldest beyond max_trees."""
+    # The scaler stays fixed: the existing trees' thresholds live in its space
+    model.set_params(warm_start=True, n_estimators=len(model.estimators_) + growth)
+    model.fit(scaler.transform(X_all), y_all)
+    retired = max(0, len(model.estimators_) - max_trees)
+    if retired:
+        model.estimators_ = model.estimators_[retired:]
+        model.set_params(n_estimators=len(model.estimators_))
+    return {"trees": len(model.estimators_), "grown": growth, "retired": retired}
+
+
+def notify(reload_url, names, token=None):
+    """Ask a running server to reload now instead of waiting for its watcher."""
+    request = urllib.request.Request(
+        reload_url.rstrip('/') + '/admin/reload',
+        data=json.dumps({"models": list(names)}).encode(),
+        headers={'Content-Type': 'application/json', **({'X-Admin-Token': token} if token else {})},
+        method='POST'
+    )
+    with urllib.request.urlopen(request, timeout=10) as response:
+        return response.status
+
+
+def update_model(name, registry, store, min_rows=1, data_dir=training.DATA_DIR, cache_dir=training.CACHE_DIR):
+    """Fold unseen store rows into the active model and publish it; returns a report."""
+    from sklearn.ensemble import RandomForestClassifier
+    from sklearn.linear_model import LogisticRegression
+    import joblib
+
+    start = time.perf_counter()
+    path, version = registry.resolve(name)
+    if path is None:
+        raise FileNotFoundError(f"No {name} model to update")
+    model, scaler, features = unpack(name, joblib.load(pickle_for(path)))
+    drop_feature_names(scaler, features)
+    # Store rows already folded into this model; a full retrain publishes a
+    # bundle without outcome_rows, so every stored row counts as new again
+    seen = int(read_manifest(path).get('metadata', {}).get('outcome_rows', 0)) if is_bundle(path) else 0
+
+    X_store, y_store = encoded_outcomes(name, store, features)
+    new = len(y_store) - seen
+    if new < max(min_rows, 1):
+        return {"model": name, "status": "up to date", "version": version, "new_rows": max(new, 0)}
+
+    # Base training rows come from the prepared-dataset cache, not the CSVs
+    dataset, _ = training.load_dataset(name, data_dir, cache_dir)
+    if list(dataset.features) != list(features):
+        raise ValueError(f"{name}: active model features differ from the training data; run a full retrain")
+    X_base, y_base, _, _ = training.split(dataset, training.TRAINERS[name].holdout)
+    X_all = np.vstack([X_base, X_store])
+    y_all = np.concatenate([y_base, y_store])
+    loaded = time.perf_counter()
+
+    if isinstance(model, LogisticRegression):
+        details = warm_start_logistic(model, scaler, X_store[seen:], X_all, y_all)
+    elif isinstance(model, RandomForestClassifier):
+        details = grow_forest(model, scaler, X_all, y_all)
+    else:
+        raise TypeError(f"{type(model).__name__} has no incremental update; run a full retrain")
+    fitted = time.perf_counter()
+
+    # Stage the .pkl + bundle pair, then publish it as a new immutable version
+    staging = tempfile.mkdtemp(dir=registry.models_dir, prefix='.incremental-')
+    try:
+        pkl = os.path.join(staging, MODEL_FILES[name][1])
+        dump_atomic({'model': model, 'scaler': scaler, 'features': list(features)}, pkl)
+        export_pickled(pkl, name, model, scaler, features, metadata={
+            'outcome_rows': int(len(y_store)),
+            'base_version': version,
+            'incremental': True,
+        })
+        new_version = registry.publish(name, bundle_path(pkl))
+    finally:
+        shutil.rmtree(staging, ignore_errors=True)
+    done = time.perf_counter()
+
+    return {
+        "model": name,
+        "status": "updated",
+        "base_version": version,
+        "version": new_version,
+        "new_rows": int(new),
+        "store_rows": int(len(y_store)),
+        "training_rows": int(len(y_all)),
+        **details,
+        "load_seconds": round(loaded - start, 3),
+        "fit_seconds": round(fitted - loaded, 3),
+        "publish_seconds": round(done - fitted, 3),
+    }
+
+
+if __name__ == '__main__':
+    import warnings
+
+    warnings.filterwarnings('ignore')
+    parser = argparse.ArgumentParser(description="Incremental model updates from labelled outcomes")
+    sub = parser.add_subparsers(dest='command', required=True)
+    append = sub.add_parser('append', help="Append labelled rows (JSON array or NDJSON file) to the store")
+    append.add_argument('model', choices=sorted(MODEL_FILES))
+    append.add_argument('file')
+    update = sub.add_parser('update', help="Fold new rows into the active models and publish them")
+    update.add_argument('--models', nargs='+', choices=sorted(MODEL_FILES))
+    update.add_argument('--min-rows', type=int, default=1, help="Skip models with fewer new rows")
+    update.add_argument('--reload-url', help="Running server to reload afterwards, e.g. http://127.0.0.1:5000")
+    update.add_argument('--admin-token', default=os.environ.get('EARLYGUARD_ADMIN_TOKEN'))
+    parser.add_argument('--models-dir', default=training.MODELS_DIR)
+    parser.add_argument('--outcomes-dir', default=OUTCOMES_DIR)
+    args = parser.parse_args()
+
+    store = OutcomeStore(args.outcomes_dir)
+    if args.command == 'append':
+        with open(args.file) as f:
+            text = f.read()
+        rows = json.loads(text) if text.lstrip().startswith('[') else [json.loads(l) for l in text.splitlines() if l.strip()]
+        try:
+            print(f"Appended {store.append(args.model, rows)} {args.model} rows")
+        except ValueError as e:
+            sys.exit(str(e))
+    else:
+        registry = ModelRegistry(args.models_dir)
+        updated = []
+        for name in args.models or MODEL_FILES:
+            try:
+                report = update_model(name, registry, store, args.min_rows)
+            except Exception as e:
+                report = {"model": name, "status": "failed", "error": f"{type(e).__name__}: {e}"}
+            print(json.dumps(report))
+            if report["status"] == "updated":
+                updated.append(name)
+        if updated and args.reload_url:
+            print(f"Reload requested: HTTP {notify(args.reload_url, updated, args.admin_token)}")
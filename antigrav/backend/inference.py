@@ -0,0 +1,418 @@
+# backend/inference.py
+#
+# Inference engines: encoded feature matrix -> positive-class probability.
+#
+# StandardScaler + binary LogisticRegression is an affine map followed by a
+# sigmoid, so LinearEngine folds the scaler into the coefficients once at load
+# time and scores with a single dot product. Random forests are flattened into
+# node arrays (ForestEngine) and scored for every row and tree at once.
+# Anything else goes through SklearnEngine, which keeps the usual
+# transform + predict_proba calls. GridEngine can sit in front of any engine
+# when every input lives on a small fixed grid.
+#
+# Linear and forest engines also explain each row: contributions(X) splits a
+# prediction into one additive term per feature on top of a fixed `expected`
+# value (log-odds for LinearEngine, probability for ForestEngine).
+
+import numpy as np
+
+# Most memory ForestEngine spends on its leaf-mask tables (see leaves())
+MAX_MASK_BYTES = 64 << 20
+# Without mask tables, batches this large go to predict_proba when the
+# sklearn model is at hand: the level-by-level walk is slower per row
+FALLBACK_ROWS = 256
+# LOW_BITS[k] has the k lowest bits set
+LOW_BITS = np.array([(1 << k) - 1 for k in range(65)], dtype=np.uint64)
+
+
+def sigmoid(z):
+    # 1 / (1 + exp(-z)) without overflow for large |z|
+    return np.exp(-np.logaddexp(0.0, -z))
+
+
+class LinearEngine:
+    kind = "linear"
+    contribution_unit = "log-odds"
+
+    def __init__(self, weights, bias, mean=None):
+        self.weights = np.ascontiguousarray(weights, dtype=np.float64)
+        self.bias = float(bias)
+        # Scaler mean, kept for contributions (coef x scaled value)
+        self.mean = None if mean is None else np.asarray(mean, dtype=np.float64)
+        self.expected = self.bias + (0.0 if self.mean is None else float(self.weights @ self.mean))
+
+    @classmethod
+    def from_params(cls, coef, intercept, mean=None, scale=None):
+        # z = coef . (x - mean) / scale + intercept
+        #   = (coef / scale) . x + (intercept - coef . mean / scale)
+        coef = np.asarray(coef, dtype=np.float64)
+        intercept = float(intercept)
+        if scale is not None:
+            coef = coef / scale
+        if mean is not None:
+            intercept = intercept - float(np.sum(coef * mean))
+        return cls(coef, intercept, mean)
+
+    @classmethod
+    def from_sklearn(cls, scaler, model):
+        return cls.from_params(model.coef_[0], model.intercept_[0], *scaler_params(scaler))
+
+    def decision(self, X):
+        return X @ self.weights + self.bias
+
+    def proba(self, X):
+        return sigmoid(self.decision(X))
+
+    def contributions(self, X):
+        # coef . (x - mean) / scale, term by term; sums to decision() - expected
+        X = np.asarray(X, dtype=np.float64)
+        if self.mean is not None:
+            X = X - self.mean
+        return X * self.weights
+
+
+class SklearnEngine:
+    kind = "sklearn"
+
+    def __init__(self, scaler, model):
+        self.scaler = scaler
+        self.model = model
+
+    def proba(self, X):
+        if self.scaler is not None:
+            X = self.scaler.transform(X)
+        return self.model.predict_proba(X)[:, 1]
+
+
+class ForestEngine:
+    """Binary random forest flattened into one set of node arrays.
+
+    All trees share the arrays; roots holds each tree's first node (a tree's
+    nodes are contiguous) and leaves point back at themselves.
+
+    Finding each row's leaf in every tree uses leaf bit masks (QuickScorer):
+    number each tree's leaves left to right. A split a row passes to the
+    right rules out the leaves of its left subtree, a contiguous run of
+    bits, and the row's leaf is the leftmost one not ruled out. Which splits
+    on feature j go right depends only on where the row's value falls among
+    that feature's thresholds, so the AND of their masks is tabulated per
+    threshold cell and tree. A batch is then one searchsorted and one
+    gather-AND per feature plus a lowest-set-bit per (row, tree), instead
+    of a dozen gathers per tree level. Forests whose tables would exceed
+    MAX_MASK_BYTES are walked level by level instead.
+
+    compile() additionally tabulates the forest over every cell of the split
+    thresholds: inside a cell each tree takes the same path, so a row is
+    scored with one searchsorted per feature and one table lookup.
+
+    Contributions are path-based (Saabas): each split on a row's path adds
+    the change in P(positive) from parent to child to the split feature.
+    node_contrib holds those sums from the root down to every node, so a
+    row's attribution is one traversal and a mean over its leaves.
+    """
+
+    kind = "forest"
+    contribution_unit = "probability"
+
+    def __init__(self, feature, threshold, left, right, value, roots, n_features, mean=None, scale=None,
+                 cuts=None, table=None, max_mask_bytes=MAX_MASK_BYTES):
+        self.feature = np.asarray(feature, dtype=np.intp)
+        self.threshold = np.asarray(threshold, dtype=np.float64)
+        self.left = np.asarray(left, dtype=np.intp)
+        self.right = np.asarray(right, dtype=np.intp)
+        self.value = np.asarray(value, dtype=np.float64)
+        self.roots = np.asarray(roots, dtype=np.intp)
+        self.n_features = int(n_features)
+        self.mean = None if mean is None else np.asarray(mean, dtype=np.float64)
+        self.scale = None if scale is None else np.asarray(scale, dtype=np.float64)
+
+        self.is_leaf = self.left == np.arange(len(self.left))
+        # children[2 * node + went_right]
+        self.children = np.column_stack([self.left, self.right]).ravel()
+        # Set by compile() (or restored from an exported artifact)
+        self.cuts = None if cuts is None else [np.asarray(c, dtype=np.float64) for c in cuts]
+        self.table = None if table is None else np.asarray(table, dtype=np.float64)
+        self.expected = float(self.value[self.roots].mean())
+        # Column-major: contributions() gathers one feature at a time
+        self.node_contrib = np.asfortranarray(self.path_contributions())
+        self.masks = None
+        self.build_masks(max_mask_bytes)
+        self.fallback = None # SklearnEngine for large batches, set by build_engine
+
+    @classmethod
+    def from_sklearn(cls, scaler, model):
+        positive = 1 # predict_proba(...)[:, 1]
+        feature, threshold, left, right, value, roots = [], [], [], [], [], []
+        offset = 0
+        for est in model.estimators_:
+            tree = est.tree_
+            n = tree.node_count
+            is_leaf = tree.children_left == -1
+            ids = np.arange(offset, offset + n)
+
+            feature.append(np.where(is_leaf, 0, tree.feature))
+            threshold.append(np.where(is_leaf, 0.0, tree.threshold))
+            left.append(np.where(is_leaf, ids, tree.children_left + offset))
+            right.append(np.where(is_leaf, ids, tree.children_right + offset))
+            # Per-node class distribution -> P(positive), as tree.predict_proba does
+            dist = tree.value[:, 0, :]
+            value.append(dist[:, positive] / dist.sum(axis=1))
+            roots.append(offset)
+            offset += n
+
+        return cls(
+            np.concatenate(feature), np.concatenate(threshold),
+            np.concatenate(left), np.concatenate(right), np.concatenate(value),
+            roots, model.n_features_in_, *scaler_params(scaler)
+        )
+
+    def path_contributions(self):
+        """(n_nodes, n_features) contribution sums along the path from each tree's root."""
+        contrib = np.zeros((len(self.value), self.n_features))
+        frontier = self.roots[~self.is_leaf[self.roots]]
+        while frontier.size:
+            for child in (self.left[frontier], self.right[frontier]):
+                contrib[child] = contrib[frontier]
+                contrib[child, self.feature[frontier]] += self.value[child] - self.value[frontier]
+            nxt = np.concatenate([self.left[frontier], self.right[frontier]])
+            frontier = nxt[~self.is_leaf[nxt]]
+        return contrib
+
+    def levels(self):
+        """Internal nodes, one array per depth, roots first."""
+        out = []
+        frontier = self.roots[~self.is_leaf[self.roots]]
+        while frontier.size:
+            out.append(frontier)
+            nxt = np.concatenate([self.left[frontier], self.right[frontier]])
+            frontier = nxt[~self.is_leaf[nxt]]
+        return out
+
+    def build_masks(self, max_bytes=MAX_MASK_BYTES):
+        """Tabulate the leaf masks (see the class docstring); skipped above max_bytes."""
+        n_trees = len(self.roots)
+        leaf_counts = np.add.reduceat(self.is_leaf.astype(np.intp), self.roots)
+        words = int(-(-leaf_counts.max() // 64))
+        split = ~self.is_leaf
+        cuts = [np.unique(self.threshold[split & (self.feature == j)]) for j in range(self.n_features)]
+        used = [j for j, c in enumerate(cuts) if len(c)]
+        if sum(len(cuts[j]) + 1 for j in used) * words * n_trees * 8 > max_bytes:
+            return
+
+        # Leaves below each node, bottom-up; then each node's first leaf
+        # number, top-down (left child: same, right child: + left's leaves)
+        levels = self.levels()
+        below = self.is_leaf.astype(np.intp)
+        for nodes in reversed(levels):
+            below[nodes] = below[self.left[nodes]] + below[self.right[nodes]]
+        first = np.zeros(len(self.value), dtype=np.intp)
+        for nodes in levels:
+            first[self.left[nodes]] = first[nodes]
+            first[self.right[nodes]] = first[nodes] + below[self.left[nodes]]
+
+        # (tree, leaf number) -> node, flattened
+        width = int(leaf_counts.max())
+        tree = np.searchsorted(self.roots, np.arange(len(self.value)), side='right') - 1
+        leaves = np.flatnonzero(self.is_leaf)
+        leaf_node = np.zeros(n_trees * width, dtype=np.intp)
+        leaf_node[tree[leaves] * width + first[leaves]] = leaves
+
+        # Per feature: (cells, words, trees) masks, where cell k means the
+        # value is above the k lowest thresholds; start from all ones, clear
+        # each split's left leaves in the cells above its threshold, then
+        # AND-accumulate over the cells
+        nodes = np.flatnonzero(split)
+        lo, hi = first[nodes], first[nodes] + below[self.left[nodes]]
+        tables = []
+        for j in used:
+            on_j = self.feature[nodes] == j
+            rank = np.searchsorted(cuts[j], self.threshold[nodes[on_j]])
+            table = np.full((len(cuts[j]) + 1, words, n_trees), ~np.uint64(0))
+            for w in range(words):
+                a = np.clip(lo[on_j] - 64 * w, 0, 64)
+                b = np.clip(hi[on_j] - 64 * w, 0, 64)
+                np.bitwise_and.at(table, (rank + 1, w, tree[nodes[on_j]]), ~(LOW_BITS[b] & ~LOW_BITS[a]))
+            tables.append(np.bitwise_and.accumulate(table, axis=0))
+        self.masks = ([(j, cuts[j], t) for j, t in zip(used, tables)], words, width, leaf_node)
+
+    def prepare(self, X):
+        # Same arithmetic as StandardScaler.transform, then the float32 cast
+        # sklearn trees apply before comparing against float64 thresholds
+        X = np.asarray(X, dtype=np.float64)
+        if self.mean is not None:
+            X = X - self.mean
+        if self.scale is not None:
+            X = X / self.scale
+        return X.astype(np.float32)
+
+    def traverse(self, S):
+        """(n_rows, n_trees) leaf index for prepared (scaled float32) rows."""
+        if self.masks is None:
+            return self.walk(S)
+        tables, words, width, leaf_node = self.masks
+        n, n_trees = S.shape[0], len(self.roots)
+        # A value goes right at a split when it is above the threshold, so
+        # its cell is the number of thresholds strictly below it
+        acc = None
+        for j, cuts, table in tables:
+            part = np.take(table, np.searchsorted(cuts, S[:, j], side='left'), axis=0)
+            acc = part if acc is None else np.bitwise_and(acc, part, out=acc)
+
+        # Leftmost leaf still set: lowest set bit of the first non-zero word
+        word = acc[:, words - 1]
+        offset = 64 * (words - 1)
+        for w in range(words - 2, -1, -1):
+            nonzero = acc[:, w] != 0
+            word = np.where(nonzero, acc[:, w], word)
+            offset = np.where(nonzero, 64 * w, offset)
+        lowest = word & (~word + np.uint64(1))
+        # Exponent of the (exact) float64 power of two = the bit's position
+        bit = (lowest.astype(np.float64).view(np.uint64) >> np.uint64(52)).astype(np.intp) - 1023
+        return leaf_node[offset + bit + np.arange(n_trees) * width]
+
+    def walk(self, S):
+        # traverse() without mask tables: every (row, tree) pair moves down
+        # one level per step and drops out at its leaf
+        n, n_trees = S.shape[0], len(self.roots)
+        node = np.tile(self.roots, n)
+        base = np.repeat(np.arange(n) * S.shape[1], n_trees)
+        flat = S.ravel()
+
+        active = np.flatnonzero(~self.is_leaf[node])
+        while active.size:
+            current = node[active]
+            went_right = flat[base[active] + self.feature[current]] > self.threshold[current]
+            node[active] = nxt = self.children[2 * current + went_right]
+            active = active[~self.is_leaf[nxt]]
+        return node.reshape(n, n_trees)
+
+    def compile(self, max_cells=1 << 20):
+        """Tabulate the forest over its threshold cells; skipped if the table would be too big."""
+        split = ~self.is_leaf
+        cuts = [np.unique(self.threshold[split & (self.feature == j)]) for j in range(self.n_features)]
+        if np.prod([len(c) + 1 for c in cuts], dtype=np.float64) > max_cells:
+            return self
+
+        # One float32 point per cell: the largest float32 <= each cut, plus
+        # one past the last cut. A cell with no float32 inside it can never
+        # be reached, so whatever its point scores is never looked up.
+        points = []
+        for c in cuts:
+            p = c.astype(np.float32)
+            p = np.where(p.astype(np.float64) > c, np.nextafter(p, np.float32(-np.inf)), p)
+            top = np.float32(c[-1]) if len(c) else np.float32(0.0)
+            if len(c) and top <= c[-1]:
+                top = np.nextafter(top, np.float32(np.inf))
+            points.append(np.append(p, top).astype(np.float32))
+
+        mesh = np.meshgrid(*points, indexing='ij')
+        S = np.column_stack([m.ravel() for m in mesh])
+        self.table = self.value[self.traverse(S)].mean(axis=1).reshape(mesh[0].shape)
+        self.cuts = cuts
+        return self
+
+    def proba(self, X):
+        S = self.prepare(X)
+        if self.table is not None:
+            # Cell index = number of cuts strictly below the value (s <= cut goes left)
+            cell = tuple(np.searchsorted(c, S[:, j], side='left') for j, c in enumerate(self.cuts))
+            return self.table[cell]
+        if self.masks is None and self.fallback is not None and len(S) >= FALLBACK_ROWS:
+            return self.fallback.proba(X)
+        return self.value[self.traverse(S)].mean(axis=1)
+
+    def contributions(self, X):
+        # Sums to proba(X) - expected
+        leaves = self.traverse(self.prepare(X))
+        if len(leaves) < 32:
+            return self.node_contrib[leaves].mean(axis=1)
+        # Per feature, so no (rows, trees, features) temporary for a batch
+        return np.column_stack([self.node_contrib[:, j][leaves].mean(axis=1) for j in range(self.n_features)])
+
+
+class GridEngine:
+    """Lookup table in front of another engine for inputs on a fixed grid.
+
+    axes holds the allowed encoded values for each feature column. Rows whose
+    every value is exactly on its axis are answered from the table; the rest
+    fall through to the wrapped engine.
+    """
+
+    kind = "grid"
+
+    def __init__(self, engine, axes):
+        self.engine = engine
+        self.axes = [np.asarray(a, dtype=np.float64) for a in axes]
+        mesh = np.meshgrid(*self.axes, indexing='ij')
+        points = np.column_stack([m.ravel() for m in mesh])
+        self.table = engine.proba(points).reshape(mesh[0].shape)
+        if hasattr(engine, 'contributions'):
+            self.contributions = engine.contributions
+            self.expected = engine.expected
+            self.contribution_unit = engine.contribution_unit
+
+    def proba(self, X):
+        X = np.asarray(X, dtype=np.float64)
+        index = []
+        on_grid = np.ones(X.shape[0], dtype=bool)
+        for col, axis in enumerate(self.axes):
+            pos = np.clip(np.searchsorted(axis, X[:, col]), 0, len(axis) - 1)
+            on_grid &= axis[pos] == X[:, col]
+            index.append(pos)
+
+        out = self.table[tuple(index)]
+        if not on_grid.all():
+            off = ~on_grid
+            out[off] = self.engine.proba(X[off])
+        return out
+
+
+def scaler_params(scaler):
+    """(mean, scale) a StandardScaler actually applies; None for a skipped step."""
+    if scaler is None:
+        return None, None
+    # with_mean=False still records mean_, so check the flags
+    mean = scaler.mean_ if scaler.with_mean else None
+    scale = scaler.scale_ if scaler.with_std else None
+    return mean, scale
+
+
+def is_foldable(scaler, model):
+    # Binary logistic model on top of an (optional) StandardScaler
+    from sklearn.linear_model import LogisticRegression
+    from sklearn.preprocessing import StandardScaler
+
+    if not isinstance(model, LogisticRegression) or model.coef_.shape[0] != 1:
+        return False
+    return scaler is None or type(scaler) is StandardScaler
+
+
+def is_flattenable(scaler, model):
+    # Binary forest of plain decision trees on top of an (optional) StandardScaler
+    from sklearn.ensemble import ExtraTreesClassifier, RandomForestClassifier
+    from sklearn.preprocessing import StandardScaler
+
+    if not isinstance(model, (RandomForestClassifier, ExtraTreesClassifier)) or len(model.classes_) != 2:
+        return False
+    if model.n_outputs_ != 1:
+        return False
+    return scaler is None or type(scaler) is StandardScaler
+
+
+def build_engine(scaler, model, grid=None):
+    """Fastest engine for a fitted (scaler, model) pair.
+
+    grid: optional per-feature axes of encoded values; when given, the engine
+    is wrapped in a precomputed GridEngine lookup table.
+    """
+    if is_foldable(scaler, model):
+        engine = LinearEngine.from_sklearn(scaler, model)
+    elif is_flattenable(scaler, model):
+        engine = ForestEngine.from_sklearn(scaler, model).compile()
+        if engine.masks is None:
+            engine.fallback = SklearnEngine(scaler, model)
+    else:
+        engine = SklearnEngine(scaler, model)
+    if grid is not None:
+        engine = GridEngine(engine, grid)
+    return engine
@@ -0,0 +1,334 @@
+# backend/labs.py
+#
+# Longitudinal lab results and their trend features.
+#
+# Results live in SQLite (WAL mode). lab_results is keyed by (patient,
+# analyte, time) in a WITHOUT ROWID table, i.e. one clustered B-tree, so a
+# patient's series for one analyte over a time range is an O(log n + k)
+# index range scan.
+#
+# lab_trends keeps one row of running state per (patient, analyte), updated
+# in the same transaction as each insert instead of rescanning history:
+# count, means, second moments and the time/value co-moment over a sliding
+# window (Welford updates; results leaving the window are subtracted once,
+# found with a range scan), the last two results and the last abnormal
+# time. Slope, variance, last delta and time since abnormal fall out of that
+# state directly.
+
+import math
+import os
+import sqlite3
+import threading
+import time
+from collections import namedtuple
+from datetime import datetime, timezone
+
+DAY = 86400.0
+
+LABS_DB = os.environ.get(
+    'EARLYGUARD_LABS_DB',
+    os.path.abspath(os.path.join(os.path.dirname(os.path.abspath(__file__)), '../data/labs.db'))
+)
+# Trend features cover results from the newest one back this many days
+WINDOW_DAYS = float(os.environ.get('EARLYGUARD_LAB_WINDOW_DAYS', 365))
+
+# low/high: adult reference range; worse: +1 if rising is the worrying
+# direction, -1 if falling is; field: the model input it fills
+Analyte = namedtuple('Analyte', ['unit', 'low', 'high', 'worse', 'field'])
+
+ANALYTES = {
+    'glucose': Analyte('mg/dL', 70.0, 99.0, +1, 'Glucose'),
+    'insulin': Analyte('uU/mL', 2.0, 25.0, +1, 'Insulin'),
+    'cholesterol': Analyte('mg/dL', 0.0, 200.0, +1, 'chol'),
+    'total_bilirubin': Analyte('mg/dL', 0.1, 1.2, +1, 'Total_Bilirubin'),
+    'direct_bilirubin': Analyte('mg/dL', 0.0, 0.3, +1, 'Direct_Bilirubin'),
+    'alp': Analyte('U/L', 44.0, 147.0, +1, 'Alkaline_Phosphotase'),
+    'alt': Analyte('U/L', 7.0, 56.0, +1, 'Alamine_Aminotransferase'),
+    'ast': Analyte('U/L', 10.0, 40.0, +1, 'Aspartate_Aminotransferase'),
+    'total_protein': Analyte('g/dL', 6.0, 8.3, -1, 'Total_Protiens'),
+    'albumin': Analyte('g/dL', 3.5, 5.0, -1, 'Albumin'),
+}
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS lab_results (
+    patient_id TEXT NOT NULL,
+    analyte TEXT NOT NULL,
+    taken_at REAL NOT NULL,           -- unix seconds
+    value REAL NOT NULL,
+    PRIMARY KEY (patient_id, analyte, taken_at)
+) WITHOUT ROWID;
+
+CREATE TABLE IF NOT EXISTS lab_trends (
+    patient_id TEXT NOT NULL,
+    analyte TEXT NOT NULL,
+    window_from REAL NOT NULL,        -- results before this are outside the window
+    n INTEGER NOT NULL,               -- results in the window
+    mean_t REAL NOT NULL,             -- days
+    mean_v REAL NOT NULL,
+    m2_t REAL NOT NULL,
+    m2_v REAL NOT NULL,
+    c_tv REAL NOT NULL,               -- co-moment of time and value
+    last_at REAL, last_value REAL,
+    prev_at REAL, prev_value REAL,
+    last_abnormal_at REAL,
+    PRIMARY KEY (patient_id, analyte)
+) WITHOUT ROWID;
+"""
+
+TREND_COLUMNS = ('window_from', 'n', 'mean_t', 'mean_v', 'm2_t', 'm2_v', 'c_tv',
+                 'last_at', 'last_value', 'prev_at', 'prev_value', 'last_abnormal_at')
+
+
+def parse_time(value):
+    """Unix seconds from a number or an ISO 8601 string (naive = UTC)."""
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return float(value)
+    if isinstance(value, str):
+        stamp = datetime.fromisoformat(value.replace('Z', '+00:00'))
+        if stamp.tzinfo is None:
+            stamp = stamp.replace(tzinfo=timezone.utc)
+        return stamp.timestamp()
+    raise ValueError(f"Invalid timestamp: {value!r}")
+
+
+def iso(ts):
+    return None if ts is None else datetime.fromtimestamp(ts, timezone.utc).isoformat(timespec='seconds')
+
+
+def is_abnormal(analyte, value):
+    ref = ANALYTES[analyte]
+    return value < ref.low or value > ref.high
+
+
+class Trend:
+    """Running window statistics for one (patient, analyte) series."""
+
+    def __init__(self, row=None):
+        if row is None:
+            row = (float('-inf'), 0, 0.0, 0.0, 0.0, 0.0, 0.0, None, None, None, None, None)
+        (self.window_from, self.n, self.mean_t, self.mean_v, self.m2_t, self.m2_v, self.c_tv,
+         self.last_at, self.last_value, self.prev_at, self.prev_value, self.last_abnormal_at) = row
+
+    def row(self):
+        return tuple(getattr(self, c) for c in TREND_COLUMNS)
+
+    def add(self, t, v):
+        t = t / DAY
+        self.n += 1
+        dt = t - self.mean_t
+        self.mean_t += dt / self.n
+        dv = v - self.mean_v
+        self.mean_v += dv / self.n
+        self.m2_t += dt * (t - self.mean_t)
+        self.m2_v += dv * (v - self.mean_v)
+        self.c_tv += dt * (v - self.mean_v)
+
+    def remove(self, t, v):
+        # Exact inverse of add()
+        t = t / DAY
+        if self.n <= 1:
+            self.n, self.mean_t, self.mean_v, self.m2_t, self.m2_v, self.c_tv = 0, 0.0, 0.0, 0.0, 0.0, 0.0
+            return
+        mean_t, mean_v = self.mean_t, self.mean_v
+        self.n -= 1
+        self.mean_t = (mean_t * (self.n + 1) - t) / self.n
+        self.mean_v = (mean_v * (self.n + 1) - v) / self.n
+        self.m2_t -= (t - self.mean_t) * (t - mean_t)
+        self.m2_v -= (v - self.mean_v) * (v - mean_v)
+        self.c_tv -= (t - self.mean_t) * (v - mean_v)
+
+    def observe(self, t, v, abnormal):
+        # Latest / previous result and the last abnormal time (order-independent)
+        if self.last_at is None or t > self.last_at:
+            self.prev_at, self.prev_value = self.last_at, self.last_value
+            self.last_at, self.last_value = t, v
+        elif t == self.last_at:
+            self.last_value = v
+        elif self.prev_at is None or t > self.prev_at:
+            self.prev_at, self.prev_value = t, v
+        elif t == self.prev_at:
+            self.prev_value = v
+        if abnormal and (self.last_abnormal_at is None or t > self.last_abnormal_at):
+            self.last_abnormal_at = t
+
+    def features(self, analyte, now=None):
+        ref = ANALYTES[analyte]
+        now = time.time() if now is None else now
+        variance = self.m2_v / (self.n - 1) if self.n > 1 else None
+        return {
+            "unit": ref.unit,
+            "reference_range": [ref.low, ref.high],
+            "count": self.n,
+            "last_value": self.last_value,
+            "last_at": iso(self.last_at),
+            "last_delta": None if self.prev_value is None else round(self.last_value - self.prev_value, 4),
+            "mean": round(self.mean_v, 4) if self.n else None,
+            "variance": None if variance is None else round(max(variance, 0.0), 4),
+            # Least-squares slope of value over time in the window, per 30 days
+            "slope_per_30d": round(30.0 * self.c_tv / self.m2_t, 4) if self.n > 1 and self.m2_t > 1e-9 else None,
+            "abnormal": None if self.last_value is None else is_abnormal(analyte, self.last_value),
+            "days_since_abnormal": None if self.last_abnormal_at is None else round((now - self.last_abnormal_at) / DAY, 1),
+        }
+
+
+class LabStore:
+    def __init__(self, path=LABS_DB, window_days=WINDOW_DAYS):
+        self.path = path
+        self.window = window_days * DAY
+        self._local = threading.local()
+
+    def connect(self):
+        # One connection per thread (and per process after a fork)
+        conn = getattr(self._local, 'conn', None)
+        if conn is None or self._local.pid != os.getpid():
+            if self.path != ':memory:':
+                os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=30.0, isolation_level=None)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            conn.executescript(SCHEMA)
+            self._local.conn, self._local.pid = conn, os.getpid()
+        return conn
+
+    def add_results(self, patient_id, results):
+        """Insert results ({"analyte", "value", "taken_at"}) and update their trends.
+
+        One transaction per call. Returns {analyte: features} for the
+        analytes touched. A result with the same patient, analyte and time
+        as a stored one replaces it.
+        """
+        patient_id = str(patient_id)
+        parsed = []
+        for i, r in enumerate(results):
+            if not isinstance(r, dict):
+                raise ValueError(f"Result {i}: expected a JSON object")
+            analyte = str(r.get('analyte', '')).lower()
+            if analyte not in ANALYTES:
+                raise ValueError(f"Result {i}: unknown analyte {r.get('analyte')!r} (known: {', '.join(ANALYTES)})")
+            try:
+                value = float(r['value'])
+            except (KeyError, TypeError, ValueError):
+                value = float('nan')
+            if not math.isfinite(value):
+                raise ValueError(f"Result {i}: missing or non-finite value")
+            taken_at = parse_time(r.get('taken_at', time.time()))
+            parsed.append((analyte, taken_at, value))
+
+        conn = self.connect()
+        trends = {}
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            # Oldest first so each series' window only ever moves forward
+            for analyte, t, v in sorted(parsed, key=lambda r: r[1]):
+                trend = trends.get(analyte) or self._load_trend(conn, patient_id, analyte)
+                trends[analyte] = trend
+                self._insert(conn, trend, patient_id, analyte, t, v)
+            for analyte, trend in trends.items():
+                conn.execute(
+                    f"INSERT OR REPLACE INTO lab_trends (patient_id, analyte, {', '.join(TREND_COLUMNS)}) "
+                    f"VALUES (?, ?, {', '.join('?' * len(TREND_COLUMNS))})",
+                    (patient_id, analyte, *trend.row())
+                )
+            conn.execute('COMMIT')
+        except BaseException:
+            conn.execute('ROLLBACK')
+            raise
+        now = time.time()
+        return {analyte: trend.features(analyte, now) for analyte, trend in trends.items()}
+
+    def _load_trend(self, conn, patient_id, analyte):
+        row = conn.execute(
+            f"SELECT {', '.join(TREND_COLUMNS)} FROM lab_trends WHERE patient_id = ? AND analyte = ?",
+            (patient_id, analyte)
+        ).fetchone()
+        return Trend(row)
+
+    def _insert(self, conn, trend, patient_id, analyte, t, v):
+        old = conn.execute(
+            "SELECT value FROM lab_results WHERE patient_id = ? AND analyte = ? AND taken_at = ?",
+            (patient_id, analyte, t)
+        ).fetchone()
+        conn.execute(
+            "INSERT OR REPLACE INTO lab_results (patient_id, analyte, taken_at, value) VALUES (?, ?, ?, ?)",
+            (patient_id, analyte, t, v)
+        )
+        if old is not None and t >= trend.window_from:
+            trend.remove(t, old[0]) # corrected result
+
+        # Slide the window forward; each result leaves it exactly once
+        start = t - self.window
+        if start > trend.window_from:
+            leaving = conn.execute(
+                "SELECT taken_at, value FROM lab_results "
+                "WHERE patient_id = ? AND analyte = ? AND taken_at >= ? AND taken_at < ?",
+                (patient_id, analyte, trend.window_from, start)
+            ).fetchall()
+            for lt, lv in leaving:
+                trend.remove(lt, lv)
+            trend.window_from = start
+
+        if t >= trend.window_from:
+            trend.add(t, v)
+        trend.observe(t, v, is_abnormal(analyte, v))
+
+    def results(self, patient_id, analyte=None, since=None, until=None, limit=1000):
+        """Stored results in time order; an index range scan on (patient, analyte, time)."""
+        sql = "SELECT analyte, taken_at, value FROM lab_results WHERE patient_id = ?"
+        args = [str(patient_id)]
+        if analyte is not None:
+            sql += " AND analyte = ?"
+            args.append(analyte)
+        if since is not None:
+            sql += " AND taken_at >= ?"
+            args.append(parse_time(since))
+        if until is not None:
+            sql += " AND taken_at <= ?"
+            args.append(parse_time(until))
+        sql += " ORDER BY analyte, taken_at LIMIT ?"
+        args.append(int(limit))
+        return [
+            {"analyte": a, "taken_at": iso(t), "value": v, "unit": ANALYTES[a].unit}
+            for a, t, v in self.connect().execute(sql, args)
+        ]
+
+    def trends(self, patient_id, now=None):
+        """{analyte: trend features} for every analyte the patient has results for."""
+        rows = self.connect().execute(
+            f"SELECT analyte, {', '.join(TREND_COLUMNS)} FROM lab_trends WHERE patient_id = ?",
+            (str(patient_id),)
+        ).fetchall()
+        now = time.time() if now is None else now
+        return {row[0]: Trend(row[1:]).features(row[0], now) for row in rows if row[0] in ANALYTES}
+
+
+def latest_fields(trends):
+    """Model input fields filled from each analyte's latest result."""
+    return {ANALYTES[a].field: f["last_value"] for a, f in trends.items() if f["last_value"] is not None}
+
+
+def lab_score(trends):
+    """0-10 lab risk score from trend features (the `lab_score` input of the rule scorer).
+
+    Per analyte: up to 0.6 for how far the latest value sits outside its
+    reference range, up to 0.3 for moving in the worrying direction (per 90
+    days, relative to the range width) and 0.1 if abnormal in the last 180
+    days. The score mixes the worst analyte and the average.
+    """
+    severities = []
+    for analyte, f in trends.items():
+        if f["last_value"] is None:
+            continue
+        ref = ANALYTES[analyte]
+        width = max(ref.high - ref.low, 1e-9)
+        v = f["last_value"]
+        outside = max(ref.low - v, v - ref.high, 0.0) / width
+        severity = 0.6 * min(outside * 2.0, 1.0)
+        if f["slope_per_30d"] is not None:
+            worsening = ref.worse * f["slope_per_30d"] * 3.0 / width
+            severity += 0.3 * min(max(worsening * 4.0, 0.0), 1.0)
+        if f["days_since_abnormal"] is not None and f["days_since_abnormal"] <= 180:
+            severity += 0.1
+        severities.append(min(severity, 1.0))
+    if not severities:
+        return None
+    return round(10.0 * (0.5 * max(severities) + 0.5 * sum(severities) / len(severities)), 2)
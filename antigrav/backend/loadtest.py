@@ -0,0 +1,97 @@
+# Load test: closed-loop clients hammering one endpoint over keep-alive
+# connections, reporting throughput and latency percentiles.
+#
+# Start a server first, then (from backend/):
+#   python loadtest.py                                   # http://127.0.0.1:5000, /predict/diabetes
+#   python loadtest.py --url http://127.0.0.1:8000 --path /predict/heart --concurrency 16 --seconds 20
+#
+# Standard library only, so it runs anywhere the backend does.
+
+import argparse
+import http.client
+import json
+import threading
+import time
+from urllib.parse import urlsplit
+
+import numpy as np
+
+# Representative single-patient payloads per route
+PAYLOADS = {
+    '/predict/diabetes': {"Glucose": 174, "BloodPressure": 72, "SkinThickness": 20, "Insulin": 80, "BMI": 30, "Age": 45},
+    '/predict/heart': {"age": 58, "sex": 1, "cp": 2, "trestbps": 140, "chol": 260, "fbs": 0, "restecg": 1,
+                       "thalach": 150, "exang": 0, "oldpeak": 1.4, "slope": 1, "ca": 0, "thal": 2},
+    '/predict/liver': {"Age": 45, "Gender": "Male", "Total_Bilirubin": 1.2, "Direct_Bilirubin": 0.4,
+                       "Alkaline_Phosphotase": 210, "Alamine_Aminotransferase": 35, "Aspartate_Aminotransferase": 40,
+                       "Total_Protiens": 6.8, "Albumin": 3.4, "Albumin_and_Globulin_Ratio": 1.0},
+    '/predict/mental-health': {"stress_level": 7, "workload": 8, "sleep_quality": 4},
+}
+
+
+def client(host, port, path, body, deadline, latencies, errors):
+    conn = http.client.HTTPConnection(host, port, timeout=30)
+    headers = {'Content-Type': 'application/json'}
+    while time.perf_counter() < deadline:
+        start = time.perf_counter()
+        try:
+            conn.request('POST', path, body=body, headers=headers)
+            response = conn.getresponse()
+            response.read()
+            if response.status != 200:
+                errors.append(response.status)
+                continue
+        except (OSError, http.client.HTTPException) as e:
+            errors.append(type(e).__name__)
+            conn.close()
+            conn = http.client.HTTPConnection(host, port, timeout=30)
+            continue
+        latencies.append(time.perf_counter() - start)
+    conn.close()
+
+
+def run(url, path, concurrency, seconds, payload=None, warmup=1.0):
+    """Drive `concurrency` clients for `seconds`; returns a summary dict."""
+    parts = urlsplit(url)
+    body = json.dumps(payload if payload is not None else PAYLOADS[path])
+
+    def drive(duration):
+        latencies, errors = [], []
+        deadline = time.perf_counter() + duration
+        workers = [
+            threading.Thread(target=client, args=(parts.hostname, parts.port or 80, path, body, deadline, latencies, errors))
+            for _ in range(concurrency)
+        ]
+        begin = time.perf_counter()
+        for w in workers:
+            w.start()
+        for w in workers:
+            w.join()
+        return latencies, errors, time.perf_counter() - begin
+
+    if warmup:
+        drive(warmup)
+    latencies, errors, elapsed = drive(seconds)
+    ms = np.asarray(latencies) * 1000
+    return {
+        "url": url + path,
+        "concurrency": concurrency,
+        "seconds": round(elapsed, 2),
+        "requests": len(latencies),
+        "errors": len(errors),
+        "throughput_rps": round(len(latencies) / elapsed, 1),
+        "p50_ms": round(float(np.percentile(ms, 50)), 2) if len(ms) else None,
+        "p95_ms": round(float(np.percentile(ms, 95)), 2) if len(ms) else None,
+        "p99_ms": round(float(np.percentile(ms, 99)), 2) if len(ms) else None,
+    }
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Closed-loop load test for the EarlyGuard API")
+    parser.add_argument('--url', default='http://127.0.0.1:5000')
+    parser.add_argument('--path', default='/predict/diabetes', choices=sorted(PAYLOADS))
+    parser.add_argument('--concurrency', type=int, nargs='+', default=[1, 8, 32])
+    parser.add_argument('--seconds', type=float, default=10.0)
+    args = parser.parse_args()
+
+    for c in args.concurrency:
+        print(json.dumps(run(args.url, args.path, c, args.seconds)))
@@ -0,0 +1,241 @@
+# backend/metrics.py
+#
+# In-process counters and latency histograms, rendered in the Prometheus
+# text exposition format for GET /metrics.
+#
+# Recording is a dict lookup and a few additions under one lock per request
+# (the stage timings of a request are recorded together), so it stays on in
+# production. Histograms use fixed buckets.
+#
+# gunicorn runs several worker processes and a scrape reaches only one of
+# them. With a shared directory (EARLYGUARD_METRICS_DIR, set up by
+# gunicorn.conf.py), each process periodically writes a snapshot of its
+# metrics to <dir>/<pid>-<id>.json and /metrics adds up every snapshot. Counters
+# of workers that have exited are kept, so totals never go backwards.
+
+import bisect
+import glob
+import json
+import os
+import threading
+import time
+
+# Seconds; spans a cached lookup (~10 us) to a large batch
+BUCKETS = (0.000025, 0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01,
+           0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+HELP = {
+    'earlyguard_http_requests_total': ('counter', "HTTP requests by route, method and status"),
+    'earlyguard_http_request_duration_seconds': ('histogram', "Request latency, first byte in to response built"),
+    'earlyguard_stage_duration_seconds': ('histogram', "Time per prediction stage (parse, encode, validate, cache, predict, explain, respond, serialize) by model and mode"),
+    'earlyguard_predictions_total': ('counter', "Rows scored, by model and mode (single, batch, assessment, or whatif: variants swept)"),
+    'earlyguard_prediction_errors_total': ('counter', "Failed predictions by model and reason (validation, bad_request, unavailable, queue_full, timeout)"),
+    'earlyguard_cache_events_total': ('counter', "Prediction cache hits, misses, evictions and expirations"),
+    'earlyguard_cache_entries': ('gauge', "Entries in the prediction cache (summed over live processes)"),
+    'earlyguard_model_loaded': ('gauge', "Processes serving each model version"),
+}
+
+
+# Label names per metric; recorded values are kept as flat (metric, *values) keys
+LABELS = {
+    'earlyguard_http_requests_total': ('route', 'method', 'status'),
+    'earlyguard_http_request_duration_seconds': ('route',),
+    'earlyguard_stage_duration_seconds': ('model', 'mode', 'stage'),
+    'earlyguard_predictions_total': ('model', 'mode'),
+    'earlyguard_prediction_errors_total': ('model', 'reason'),
+}
+
+
+class Stopwatch:
+    """Laps between consecutive calls: [(stage, seconds), ...]."""
+
+    __slots__ = ('t', 'laps')
+
+    def __init__(self):
+        self.t = time.perf_counter()
+        self.laps = []
+
+    def lap(self, stage):
+        now = time.perf_counter()
+        self.laps.append((stage, now - self.t))
+        self.t = now
+
+
+class Metrics:
+    def __init__(self, directory=None, flush_interval=5.0):
+        self.directory = directory
+        self.flush_interval = flush_interval
+        self._lock = threading.Lock()
+        self._counters = {} # (name, *label values) -> value
+        self._histograms = {} # (name, *label values) -> [bucket counts..., +Inf count, sum]
+        self._flusher = None
+        self._pid = os.getpid()
+        self._file = None
+
+    # -- recording -----------------------------------------------------------
+
+    def _check_fork(self):
+        # A forked worker starts from the master's numbers; its own count from zero
+        if self._pid != os.getpid():
+            self._pid = os.getpid()
+            self._counters, self._histograms = {}, {}
+            self._flusher = None
+            self._file = None
+
+    def _observe(self, key, seconds):
+        h = self._histograms.get(key)
+        if h is None:
+            h = self._histograms[key] = [0] * (len(BUCKETS) + 1) + [0.0]
+        h[bisect.bisect_left(BUCKETS, seconds)] += 1
+        h[-1] += seconds
+
+    def _inc(self, key, value=1):
+        self._counters[key] = self._counters.get(key, 0) + value
+
+    def request(self, route, method, status, seconds):
+        with self._lock:
+            self._check_fork()
+            self._inc(('earlyguard_http_requests_total', route, method, status))
+            self._observe(('earlyguard_http_request_duration_seconds', route), seconds)
+
+    def stages(self, model, mode, laps, rows=1):
+        """Record a scored request: its stage laps and row count."""
+        with self._lock:
+            self._check_fork()
+            for stage, seconds in laps:
+                self._observe(('earlyguard_stage_duration_seconds', model, mode, stage), seconds)
+            if rows:
+                self._inc(('earlyguard_predictions_total', model, mode), rows)
+
+    def error(self, model, reason, count=1):
+        with self._lock:
+            self._check_fork()
+            self._inc(('earlyguard_prediction_errors_total', model, reason), count)
+
+    # -- export --------------------------------------------------------------
+
+    def snapshot(self, extra=None):
+        with self._lock:
+            self._check_fork()
+            snap = {
+                'pid': os.getpid(),
+                'counters': [[k[0], labelled(k), v] for k, v in self._counters.items()],
+                'histograms': [[k[0], labelled(k), list(h)] for k, h in self._histograms.items()],
+            }
+        if extra:
+            snap.update(extra)
+        return snap
+
+    def flush(self, extra=None):
+        """Write this process's snapshot to the shared directory (no-op without one)."""
+        if not self.directory:
+            return
+        self._check_fork()
+        if self._file is None:
+            # Unique per process, so a recycled pid cannot overwrite a dead worker's totals
+            self._file = os.path.join(self.directory, f"{os.getpid()}-{os.urandom(4).hex()}.json")
+        path = self._file
+        tmp = f"{path}.{threading.get_ident()}.tmp"
+        with open(tmp, 'w') as f:
+            json.dump(self.snapshot(extra), f)
+        os.replace(tmp, path)
+
+    def start_flusher(self, extra=None):
+        """Background thread flushing every flush_interval seconds (per process)."""
+        self._check_fork()
+        if not self.directory or self._flusher is not None:
+            return
+        os.makedirs(self.directory, exist_ok=True)
+
+        def run():
+            while True:
+                time.sleep(self.flush_interval)
+                try:
+                    self.flush(extra() if extra else None)
+                except OSError as e:
+                    print(f"Metrics flush failed: {e}")
+
+        self._flusher = threading.Thread(target=run, name='metrics-flush', daemon=True)
+        self._flusher.start()
+
+    def collect(self, extra=None):
+        """Snapshots of every process (this one live), or just this one without a directory."""
+        own = self.snapshot(extra)
+        if not self.directory:
+            return [own]
+        self.flush(extra)
+        snaps = []
+        for path in glob.glob(os.path.join(self.directory, '*.json')):
+            try:
+                with open(path) as f:
+                    snap = json.load(f)
+            except (OSError, ValueError):
+                continue
+            snap['live'] = snap['pid'] == own['pid'] or pid_alive(snap['pid'])
+            snaps.append(snap)
+        return snaps
+
+    def render(self, extra=None):
+        """Every process's metrics, merged, in Prometheus text format."""
+        counters, histograms, gauges = {}, {}, {}
+        for snap in self.collect(extra):
+            for name, labels, value in snap['counters']:
+                key = (name, tuple(map(tuple, labels)))
+                counters[key] = counters.get(key, 0) + value
+            for name, labels, h in snap['histograms']:
+                key = (name, tuple(map(tuple, labels)))
+                if key in histograms:
+                    histograms[key] = [a + b for a, b in zip(histograms[key], h)]
+                else:
+                    histograms[key] = list(h)
+            # Gauges describe current state, so only live processes count
+            if snap.get('live', True):
+                for name, labels, value in snap.get('gauges', []):
+                    key = (name, tuple(map(tuple, labels)))
+                    gauges[key] = gauges.get(key, 0) + value
+            for name, labels, value in snap.get('cumulative', []):
+                key = (name, tuple(map(tuple, labels)))
+                counters[key] = counters.get(key, 0) + value
+
+        lines = []
+        for metric, (kind, text) in HELP.items():
+            lines.append(f"# HELP {metric} {text}")
+            lines.append(f"# TYPE {metric} {kind}")
+            if kind == 'histogram':
+                for (name, labels), h in sorted(histograms.items()):
+                    if name != metric:
+                        continue
+                    total = 0
+                    for bound, count in zip(BUCKETS + (None,), h[:-1]):
+                        total += count
+                        le = '+Inf' if bound is None else repr(bound)
+                        lines.append(f"{name}_bucket{fmt_labels(labels + (('le', le),))} {total}")
+                    lines.append(f"{name}_sum{fmt_labels(labels)} {h[-1]!r}")
+                    lines.append(f"{name}_count{fmt_labels(labels)} {total}")
+            else:
+                for (name, labels), value in sorted((counters if kind == 'counter' else gauges).items()):
+                    if name == metric:
+                        lines.append(f"{name}{fmt_labels(labels)} {value}")
+        return '\n'.join(lines) + '\n'
+
+
+def labelled(key):
+    # (name, *values) -> [[label, value], ...]
+    return [[label, str(value)] for label, value in zip(LABELS[key[0]], key[1:])]
+
+
+def fmt_labels(labels):
+    if not labels:
+        return ''
+    escaped = (str(v).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for _, v in labels)
+    return '{' + ','.join(f'{k}="{v}"' for (k, _), v in zip(labels, escaped)) + '}'
+
+
+def pid_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
@@ -1,83 +1,25 @@
 # model/kaggle_ml.py
+#
+# Diabetes + heart training. Kept for the old entry point; the models are now
+# defined in backend/training.py (which trains all four in parallel):
+#   cd backend && python training.py
 
-import pandas as pd
-from sklearn.model_selection import train_test_split
-from sklearn.preprocessing import StandardScaler
-from sklearn.linear_model import LogisticRegression
-import joblib
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__)))) # backend/
+from training import train_model
 
 # ------------------ DIABETES MODEL ------------------
 
 def train_diabetes_model():
-    data = pd.read_csv("../data/diabetes.csv")
-
-    X = data.drop("Outcome", axis=1)
-    y = data["Outcome"]
-
-    X_train, X_test, y_train, y_test = train_test_split(
-        X, y, test_size=0.2, random_state=42
-    )
-
-    scaler = StandardScaler()
-    X_train = scaler.fit_transform(X_train)
-    X_test = scaler.transform(X_test)
-
-    model = LogisticRegression(max_iter=1000)
-    model.fit(X_train, y_train)
-
-    joblib.dump((model, scaler), "models/diabetes_model.pkl")
-    return model.score(X_test, y_test)
+    return train_model("diabetes")["holdout_accuracy"]
 
 
 # ------------------ HEART MODEL ------------------
 
 def train_heart_model():
-    data = pd.read_csv("../data/heart.csv")
-
-    # Binary target: early risk
-    data["heart_risk"] = (data["num"] > 0).astype(int)
-
-    # Drop non-predictive columns
-    data = data.drop(columns=["id", "dataset", "num"])
-
-    # Separate column types
-    categorical_cols = data.select_dtypes(include="object").columns
-    numeric_cols = data.select_dtypes(exclude="object").columns.drop("heart_risk")
-
-    # Handle missing values
-    for col in numeric_cols:
-        data[col] = data[col].fillna(data[col].median())
-
-    for col in categorical_cols:
-        data[col] = data[col].fillna(data[col].mode()[0])
-
-    # One-hot encode categoricals
-    data = pd.get_dummies(data, columns=categorical_cols, drop_first=True)
-
-    X = data.drop("heart_risk", axis=1)
-    y = data["heart_risk"]
-
-    X_train, X_test, y_train, y_test = train_test_split(
-        X, y, test_size=0.2, random_state=42
-    )
-
-    scaler = StandardScaler()
-    X_train = scaler.fit_transform(X_train)
-    X_test = scaler.transform(X_test)
-
-    model = LogisticRegression(max_iter=2000)
-    model.fit(X_train, y_train)
-
-    joblib.dump(
-        {"model": model, "scaler": scaler, "features": X.columns.tolist()},
-        "models/heart_model.pkl"
-    )
-
-    return model.score(X_test, y_test)
-
-
-   
-
+    return train_model("heart")["holdout_accuracy"]
 
 
 if __name__ == "__main__":
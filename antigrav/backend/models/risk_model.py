@@ -1,46 +1,149 @@
 # model/risk_model.py
+#
+# Rule-based risk score: a weighted sum of 0-10 sub-scores, mapped to a
+# percentage, a level and reason codes. Weights, level cut-offs and reason
+# rules come from a JSON config (risk_rules.json next to this file, or
+# EARLYGUARD_RISK_RULES). RuleScorer.score() works on whole columns at once
+# (NumPy arrays, a DataFrame or a dict of columns), so a cohort of millions
+# of rows is a handful of array operations; calculate_risk() and
+# generate_explanation() are the one-patient versions.
 
-def calculate_risk(lab_score, lifestyle_score, stress_score, family_history):
-    """
-    All scores expected in range 0–10
-    family_history: 0 or 1
-    """
+import json
+import operator
+import os
+from collections import namedtuple
+from functools import lru_cache
 
-    # Weighted risk logic (explainable)
-    risk_score = (
-        0.35 * lab_score +
-        0.30 * lifestyle_score +
-        0.20 * stress_score +
-        0.15 * (family_history * 10)
-    )
+import numpy as np
 
-    # Normalize to percentage
-    risk_percentage = min(max((risk_score / 10) * 100, 0), 100)
+from features import ValidationError
 
-    # Risk level classification
-    if risk_percentage < 35:
-        level = "Low"
-    elif risk_percentage < 65:
-        level = "Moderate"
-    else:
-        level = "High"
+RULES_PATH = os.environ.get(
+    'EARLYGUARD_RISK_RULES',
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), 'risk_rules.json')
+)
 
-    return round(risk_percentage, 2), level
+OPS = {'>=': operator.ge, '>': operator.gt, '<=': operator.le, '<': operator.lt, '==': operator.eq, '!=': operator.ne}
 
+# percent: float array (NaN where an input was missing), level: str array
+# ('' where invalid), reasons: uint64 bit mask (bit i = config reason i),
+# valid: bool array
+Scores = namedtuple('Scores', ['percent', 'level', 'reasons', 'valid'])
 
-def generate_explanation(lab, lifestyle, stress, family):
-    reasons = []
+Reason = namedtuple('Reason', ['code', 'input', 'op', 'value', 'text'])
+
+
+class RuleScorer:
+    def __init__(self, config):
+        inputs = config['inputs']
+        self.inputs = list(inputs)
+        # Kept separate rather than folded into one multiplier per input:
+        # score() repeats calculate_risk's original arithmetic step by step,
+        # so a sum landing exactly on a cut-off (64.999... vs 65.0) gets the
+        # same level as before
+        self.max_score = float(config.get('max_score', 10))
+        self.weights = np.array([float(spec['weight']) for spec in inputs.values()])
+        self.scales = [spec.get('scale') for spec in inputs.values()]
+        self.cutoffs = np.asarray(config['levels']['cutoffs'], dtype=np.float64)
+        self.labels = np.asarray(config['levels']['labels'])
+        if len(self.labels) != len(self.cutoffs) + 1 or np.any(np.diff(self.cutoffs) <= 0):
+            raise ValueError("levels: need increasing cutoffs and one more label than cutoffs")
+
+        self.reasons = [Reason(r['code'], r['input'], r['op'], float(r['value']), r['text']) for r in config.get('reasons', [])]
+        if len(self.reasons) > 64:
+            raise ValueError("At most 64 reason rules")
+        for r in self.reasons:
+            if r.input not in inputs:
+                raise ValueError(f"Reason {r.code}: unknown input {r.input!r}")
+            if r.op not in OPS:
+                raise ValueError(f"Reason {r.code}: unknown op {r.op!r} (use one of {', '.join(OPS)})")
+        no_reason = config.get('no_reason')
+        self.no_reason = Reason(no_reason['code'], None, None, None, no_reason['text']) if no_reason else None
+        self.texts = {r.code: r.text for r in self.reasons + ([self.no_reason] if self.no_reason else [])}
+
+    @classmethod
+    def from_file(cls, path=RULES_PATH):
+        with open(path) as f:
+            return cls(json.load(f))
+
+    def columns(self, data):
+        """Input columns as float64 arrays, from a DataFrame, a dict of columns or an (n, k) array."""
+        if isinstance(data, np.ndarray) and data.ndim == 2:
+            if data.shape[1] != len(self.inputs):
+                raise ValueError(f"Expected {len(self.inputs)} columns ({', '.join(self.inputs)}), got {data.shape[1]}")
+            return [np.asarray(data[:, j], dtype=np.float64) for j in range(data.shape[1])]
+        # Problems are reported per input (ValidationError.fields), never as
+        # NumPy's conversion messages
+        cols, problems = [], []
+        for k in self.inputs:
+            if k not in data:
+                problems.append({"field": k, "error": "missing"})
+                continue
+            try:
+                cols.append(np.asarray(data[k], dtype=np.float64).reshape(-1))
+            except (TypeError, ValueError):
+                problems.append({"field": k, "error": "expected a number or an array of numbers"})
+        if problems:
+            raise ValidationError(problems)
+        if len({len(c) for c in cols}) > 1:
+            raise ValidationError([{"field": None, "error": "input columns differ in length",
+                                    "lengths": {k: len(c) for k, c in zip(self.inputs, cols)}}])
+        return cols
+
+    def score(self, data):
+        """Score every row of `data` in one vectorized pass; returns Scores."""
+        cols = self.columns(data)
+        n = len(cols[0])
+        # weight * (value * scale), summed in input order, then / max * 100
+        percent = np.zeros(n)
+        for w, scale, col in zip(self.weights, self.scales, cols):
+            percent += w * (col if scale is None else col * float(scale))
+        percent /= self.max_score
+        percent *= 100.0
+        np.clip(percent, 0.0, 100.0, out=percent) # NaN stays NaN
+        valid = ~np.isnan(percent)
+
+        level = self.labels[np.searchsorted(self.cutoffs, percent, side='right')]
+        level[~valid] = ''
 
-    if lab >= 6:
-        reasons.append("Lab values show concerning upward trends")
-    if lifestyle >= 6:
-        reasons.append("Lifestyle patterns indicate increased health risk")
-    if stress >= 6:
-        reasons.append("Sustained stress levels may impact overall health")
-    if family == 1:
-        reasons.append("Family history increases inherited risk")
+        reasons = np.zeros(n, dtype=np.uint64)
+        for bit, r in enumerate(self.reasons):
+            hit = OPS[r.op](cols[self.inputs.index(r.input)], r.value)
+            reasons |= hit.astype(np.uint64) << np.uint64(bit)
+        reasons[~valid] = 0
+        return Scores(percent, level, reasons, valid)
 
-    if not reasons:
-        reasons.append("No major risk factors detected at this time")
+    def reason_codes(self, mask):
+        """Bit mask of one row -> its reason codes (the no-reason code when empty)."""
+        mask = int(mask)
+        codes = [r.code for bit, r in enumerate(self.reasons) if mask >> bit & 1]
+        if not codes and self.no_reason:
+            codes.append(self.no_reason.code)
+        return codes
 
-    return reasons
+    def code_lists(self, reasons):
+        # One Python list per distinct mask, shared by the rows that have it
+        masks, inverse = np.unique(reasons, return_inverse=True)
+        lists = [self.reason_codes(m) for m in masks]
+        return [lists[i] for i in inverse.reshape(-1)]
+
+
+@lru_cache(maxsize=None)
+def default_scorer():
+    return RuleScorer.from_file(RULES_PATH)
+
+
+def calculate_risk(lab_score, lifestyle_score, stress_score, family_history):
+    """
+    All scores expected in range 0–10
+    family_history: 0 or 1
+    """
+    scorer = default_scorer()
+    s = scorer.score(dict(zip(scorer.inputs, ([lab_score], [lifestyle_score], [stress_score], [family_history]))))
+    return round(float(s.percent[0]), 2), str(s.level[0])
+
+
+def generate_explanation(lab, lifestyle, stress, family):
+    scorer = default_scorer()
+    s = scorer.score(dict(zip(scorer.inputs, ([lab], [lifestyle], [stress], [family]))))
+    return [scorer.texts[code] for code in scorer.reason_codes(s.reasons[0])]
@@ -0,0 +1,79 @@
+# backend/outcomes.py
+#
+# Append-only store of labelled outcomes: patients whose condition was later
+# confirmed (label 1) or ruled out (label 0). One NDJSON file per model, in
+# the API's field names, so rows can be encoded exactly like a request.
+# incremental.py folds new rows into the models.
+
+import json
+import os
+import threading
+from datetime import datetime, timezone
+
+from registry import MODEL_FILES
+
+OUTCOMES_DIR = os.environ.get(
+    'EARLYGUARD_OUTCOMES_DIR',
+    os.path.abspath(os.path.join(os.path.dirname(os.path.abspath(__file__)), '../data/outcomes'))
+)
+
+
+class OutcomeStore:
+    """Append-only NDJSON files of labelled patients, one per model."""
+
+    def __init__(self, root=OUTCOMES_DIR):
+        self.root = root
+        self._lock = threading.Lock()
+
+    def path(self, name):
+        return os.path.join(self.root, f"{name}.ndjson")
+
+    def append(self, name, rows):
+        """Validate and append labelled rows; returns how many were written.
+
+        Each row is a patient dict in the API's field names plus "label"
+        (1 = the condition was confirmed, 0 = ruled out).
+        """
+        if name not in MODEL_FILES:
+            raise KeyError(f"Unknown model: {name}")
+        stamp = datetime.now(timezone.utc).isoformat(timespec='seconds')
+        lines = []
+        for i, row in enumerate(rows):
+            if not isinstance(row, dict):
+                raise ValueError(f"Row {i}: expected a JSON object")
+            label = row.get('label')
+            if label not in (0, 1):
+                raise ValueError(f"Row {i}: label must be 0 or 1")
+            lines.append(json.dumps({**row, 'label': int(label), 'recorded_at': row.get('recorded_at', stamp)}))
+        if not lines:
+            return 0
+
+        # One O_APPEND write per call, so concurrent appenders never interleave lines
+        data = ('\n'.join(lines) + '\n').encode()
+        os.makedirs(self.root, exist_ok=True)
+        with self._lock:
+            fd = os.open(self.path(name), os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+            try:
+                os.write(fd, data)
+                os.fsync(fd)
+            finally:
+                os.close(fd)
+        return len(lines)
+
+    def read(self, name, offset=0):
+        """(rows, new offset): every complete line from byte `offset` on."""
+        path = self.path(name)
+        if not os.path.exists(path):
+            return [], 0
+        with open(path, 'rb') as f:
+            f.seek(offset)
+            data = f.read()
+        end = data.rfind(b'\n') + 1 # a line still being written is left for next time
+        rows = []
+        for line in data[:end].splitlines():
+            if line.strip():
+                try:
+                    rows.append(json.loads(line))
+                except ValueError:
+                    rows.append(None)
+        return rows, offset + end
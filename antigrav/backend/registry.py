@@ -0,0 +1,344 @@
+# backend/registry.py
+#
+# Model registry: versioned artifacts per disease, atomic swap of the active
+# version and background (hot) reloads.
+#
+# Layout under models/:
+#   <legacy file>.pkl                    e.g. heart_model.pkl (used until something is published)
+#   <legacy file>/                       pickle-free bundle of the same model (see artifacts.py);
+#                                        preferred unless the .pkl next to it has changed since export
+#   versions/<name>/<version>[.pkl]      published artifacts (pickle or bundle), never modified in place
+#   versions/<name>/ACTIVE               version id to serve
+#
+# Requests take one ModelBundle from the registry and use its encoder and
+# engine together, so a swap mid-request can never mix two versions.
+
+import os
+import re
+import threading
+import time
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+
+from artifacts import RISK_THRESHOLDS, copy_atomic, file_digest, is_bundle, load_bundle, read_manifest, write_atomic
+from features import build_encoder, DIABETES_FEATURES
+from inference import GridEngine, build_engine
+
+# name -> (display label, legacy artifact file)
+MODEL_FILES = {
+    'diabetes': ('Diabetes', 'diabetes_model.pkl'),
+    'heart': ('Heart', 'heart_model.pkl'),
+    'liver': ('Liver', 'liver_model.pkl'),
+    'mental': ('Mental Health', 'mental_health_model.pkl'),
+}
+
+# model/scaler are the sklearn objects for pickles and None for pickle-free bundles
+ModelBundle = namedtuple('ModelBundle', [
+    'name', 'version', 'path', 'format', 'model', 'scaler', 'features', 'thresholds',
+    'encoder', 'engine', 'loaded_at', 'timings'
+])
+
+LOAD_MODES = ('eager', 'parallel', 'lazy')
+# Published version names: one path component, no separators or dot-dot
+VERSION_NAME = re.compile(r'[A-Za-z0-9][A-Za-z0-9._-]*')
+
+
+def unpack(name, obj):
+    """Pickled artifact -> (model, scaler, features)."""
+    if name == 'diabetes' and isinstance(obj, tuple):
+        # kaggle_ml.py saves (model, scaler)
+        model, scaler = obj
+        features = list(getattr(scaler, 'feature_names_in_', DIABETES_FEATURES))
+        return model, scaler, features
+    return obj['model'], obj['scaler'], list(obj['features'])
+
+
+def pickle_for(path):
+    """The .pkl with the sklearn objects behind a resolved artifact path.
+
+    Bundle directories keep theirs alongside (models/heart_model/ ->
+    models/heart_model.pkl, versions/<name>/<version>/ -> <version>.pkl).
+    """
+    return path if path.endswith('.pkl') else path.rstrip(os.sep) + '.pkl'
+
+
+def drop_feature_names(scaler, features):
+    # The encoders emit columns in persisted feature order, so the names the
+    # scaler was fitted with are only used to warn about ndarray input.
+    names = getattr(scaler, 'feature_names_in_', None)
+    if names is not None:
+        if list(names) != list(features):
+            raise ValueError(f"Scaler columns {list(names)} do not match features {list(features)}")
+        del scaler.feature_names_in_
+
+
+class ModelRegistry:
+    def __init__(self, models_dir, use_grid=False, on_swap=None, lazy=False, use_bundles=True):
+        self.models_dir = models_dir
+        self.use_grid = use_grid
+        self.use_bundles = use_bundles # False = always serve the .pkl files
+        self.on_swap = on_swap # called with the model name after every swap
+        self.lazy = lazy # load each model on its first get()
+        self.startup = None
+        self._active = {} # name -> ModelBundle; replaced wholesale, never mutated
+        self._errors = {} # name -> last load error
+        self._swap_lock = threading.Lock()
+        self._reload_lock = threading.Lock()
+        self._lazy_locks = {name: threading.Lock() for name in MODEL_FILES}
+        self._lazy_tried = set()
+        self._watcher = None
+        self._watcher_pid = None
+        self._digests = {} # path -> ((mtime, size), digest)
+
+    # --- artifacts -------------------------------------------------------
+
+    def versions_dir(self, name):
+        return os.path.join(self.models_dir, 'versions', name)
+
+    def resolve(self, name):
+        """(path, version) of the artifact that should be served, or (None, None)."""
+        active_file = os.path.join(self.versions_dir(name), 'ACTIVE')
+        if os.path.exists(active_file):
+            with open(active_file) as f:
+                version = f.read().strip()
+            path = self.version_path(name, version)
+            if path is not None:
+                return path, version
+
+        legacy = os.path.join(self.models_dir, MODEL_FILES[name][1])
+        bundle = os.path.splitext(legacy)[0]
+        if self.use_bundles and is_bundle(bundle):
+            # The bundle records the digest of the .pkl it was exported from;
+            # a .pkl that has been retrained since wins over the stale bundle
+            manifest = read_manifest(bundle)
+            source = manifest.get('metadata', {}).get('source_digest')
+            if source is None or not os.path.exists(legacy) or self.digest(legacy) == source:
+                return bundle, manifest['version']
+        if os.path.exists(legacy):
+            return legacy, self.digest(legacy)
+        return None, None
+
+    def version_path(self, name, version):
+        if not VERSION_NAME.fullmatch(version):
+            return None
+        base = os.path.join(self.versions_dir(name), version)
+        if self.use_bundles and is_bundle(base):
+            return base
+        if os.path.exists(base + '.pkl'):
+            return base + '.pkl'
+        return None
+
+    def digest(self, path):
+        # Legacy files are versioned by content; rehash only when the file changes
+        st = os.stat(path)
+        stamp = (st.st_mtime_ns, st.st_size)
+        cached = self._digests.get(path)
+        if cached is None or cached[0] != stamp:
+            cached = (stamp, file_digest(path))
+            self._digests[path] = cached
+        return cached[1]
+
+    def available_versions(self, name):
+        directory = self.versions_dir(name)
+        if not os.path.isdir(directory):
+            return []
+        # A version can have both forms (<version>/ bundle + <version>.pkl)
+        return sorted({
+            f[:-4] if f.endswith('.pkl') else f
+            for f in os.listdir(directory)
+            if not f.startswith('.') and (f.endswith('.pkl') or is_bundle(os.path.join(directory, f)))
+        })
+
+    def publish(self, name, src_path, activate=True):
+        """Copy a freshly trained artifact (.pkl or bundle directory) in as a new immutable version.
+
+        A bundle's sibling .pkl (bundle_path convention) is copied along as
+        <version>.pkl, so the sklearn objects stay available for incremental
+        updates. Returns the version id. With activate=True the ACTIVE
+        pointer is moved to it; call load_all()/reload_async() (or let the
+        watcher notice) to serve it.
+        """
+        if name not in MODEL_FILES:
+            raise KeyError(f"Unknown model: {name}")
+        stamp = datetime.now(timezone.utc).strftime('%Y%m%dT%H%M%S')
+        if is_bundle(src_path):
+            version = f"{stamp}-{read_manifest(src_path)['version']}"
+            pkl = src_path.rstrip(os.sep) + '.pkl'
+            if os.path.exists(pkl):
+                copy_atomic(pkl, os.path.join(self.versions_dir(name), f"{version}.pkl"))
+            copy_atomic(src_path, os.path.join(self.versions_dir(name), version))
+        else:
+            version = f"{stamp}-{file_digest(src_path)}"
+            copy_atomic(src_path, os.path.join(self.versions_dir(name), f"{version}.pkl"))
+        if activate:
+            self.set_active(name, version)
+        return version
+
+    def set_active(self, name, version):
+        if not VERSION_NAME.fullmatch(version):
+            raise ValueError(f"Invalid version name: {version!r}")
+        if self.version_path(name, version) is None:
+            raise KeyError(f"Unknown {name} version: {version}")
+        write_atomic(os.path.join(self.versions_dir(name), 'ACTIVE'), version.encode())
+
+    # --- loading ---------------------------------------------------------
+
+    def build(self, name, path, version):
+        start = time.perf_counter()
+        if is_bundle(path):
+            # Pickle-free: memory-mapped arrays, no sklearn import
+            fmt = 'npy'
+            manifest, engine = load_bundle(path)
+            model = scaler = None
+            features = manifest['features']
+            thresholds = (manifest['thresholds']['high'], manifest['thresholds']['moderate'])
+        else:
+            import joblib
+
+            fmt = 'pickle'
+            model, scaler, features = unpack(name, joblib.load(path))
+            drop_feature_names(scaler, features)
+            thresholds = RISK_THRESHOLDS[name]
+            engine = None
+        read = time.perf_counter()
+
+        encoder = build_encoder(name, features)
+        grid = encoder.grid_axes() if self.use_grid else None
+        if engine is None:
+            engine = build_engine(scaler, model, grid=grid)
+        elif grid is not None:
+            engine = GridEngine(engine, grid)
+        done = time.perf_counter()
+        timings = {
+            "read_seconds": round(read - start, 4), # unpickle / map arrays
+            "compile_seconds": round(done - read, 4), # encoder + engine
+            "total_seconds": round(done - start, 4)
+        }
+        return ModelBundle(
+            name, version, path, fmt, model, scaler, features, thresholds,
+            encoder, engine, time.time(), timings
+        )
+
+    def swap(self, bundle):
+        with self._swap_lock:
+            active = dict(self._active)
+            active[bundle.name] = bundle
+            self._active = active
+            self._errors.pop(bundle.name, None)
+        if self.on_swap:
+            self.on_swap(bundle.name)
+
+    def load(self, name, force=False):
+        """Load the resolved artifact for one model and make it active.
+
+        Unchanged versions are skipped unless force=True. On failure the
+        previously active bundle keeps serving and the error is recorded.
+        """
+        path, version = self.resolve(name)
+        if path is None:
+            return None
+        current = self._active.get(name)
+        if current is not None and current.version == version and current.path == path and not force:
+            return current
+        try:
+            bundle = self.build(name, path, version)
+        except Exception as e:
+            self._errors[name] = f"{type(e).__name__}: {e}"
+            print(f"Error loading {name} model: {e}")
+            return None
+        self.swap(bundle)
+        print(f"{MODEL_FILES[name][0]} model loaded (version {version}).")
+        return bundle
+
+    def load_all(self, names=None, force=False, parallel=False):
+        names = list(names or MODEL_FILES)
+        with self._reload_lock:
+            if parallel and len(names) > 1:
+                # Unpickling is mostly I/O and C code, and forest compilation
+                # is NumPy, so threads overlap well here
+                with ThreadPoolExecutor(max_workers=len(names), thread_name_prefix='model-load') as pool:
+                    list(pool.map(lambda name: self.load(name, force=force), names))
+            else:
+                for name in names:
+                    self.load(name, force=force)
+
+    def start(self, mode='eager'):
+        """Initial load: 'eager' (one by one), 'parallel' (thread pool) or 'lazy' (on first use)."""
+        if mode not in LOAD_MODES:
+            raise ValueError(f"Unknown load mode {mode!r}, expected one of {LOAD_MODES}")
+        begin = time.perf_counter()
+        self.lazy = mode == 'lazy'
+        if not self.lazy:
+            self.load_all(parallel=mode == 'parallel')
+        self.startup = {"mode": mode, "pid": os.getpid(), "seconds": round(time.perf_counter() - begin, 4)}
+        return self.startup
+
+    def reload_async(self, names=None, force=False):
+        """Reload in a background thread; the current bundles serve until each swap."""
+        thread = threading.Thread(target=self.load_all, args=(names, force), name='model-reload', daemon=True)
+        thread.start()
+        return thread
+
+    def watch(self, interval=5.0):
+        """Poll artifact paths/versions and hot-reload models whose artifact changed."""
+        # Threads do not survive fork, so a forked worker starts its own
+        if self._watcher is not None and self._watcher_pid == os.getpid():
+            return self._watcher
+
+        def run():
+            while True:
+                time.sleep(interval)
+                changed = []
+                for name in MODEL_FILES:
+                    try:
+                        path, version = self.resolve(name)
+                    except OSError:
+                        continue
+                    current = self._active.get(name)
+                    if path is not None and (current is None or (current.path, current.version) != (path, version)):
+                        changed.append(name)
+                if changed:
+                    self.load_all(changed)
+
+        self._watcher = threading.Thread(target=run, name='model-watch', daemon=True)
+        self._watcher_pid = os.getpid()
+        self._watcher.start()
+        return self._watcher
+
+    # --- lookups ---------------------------------------------------------
+
+    def get(self, name):
+        bundle = self._active.get(name)
+        if bundle is None and self.lazy:
+            bundle = self._load_lazily(name)
+        return bundle
+
+    def _load_lazily(self, name):
+        # First request for a model loads it; concurrent first requests wait
+        # on the same lock instead of loading it twice. A missing or broken
+        # artifact is only tried once (use load_all()/reload to retry).
+        with self._lazy_locks[name]:
+            bundle = self._active.get(name)
+            if bundle is None and name not in self._lazy_tried:
+                self._lazy_tried.add(name)
+                bundle = self.load(name)
+            return bundle
+
+    def label(self, name):
+        return MODEL_FILES[name][0]
+
+    def status(self):
+        active = self._active
+        return {
+            name: {
+                "loaded": name in active,
+                "version": active[name].version if name in active else None,
+                "format": active[name].format if name in active else None,
+                "engine": active[name].engine.kind if name in active else None,
+                "timings": active[name].timings if name in active else None,
+                "loaded_at": active[name].loaded_at if name in active else None,
+                "error": self._errors.get(name)
+            }
+            for name in MODEL_FILES
+        }
@@ -0,0 +1,225 @@
+# backend/score_file.py
+#
+# Offline bulk scoring: stream a patient CSV (or Parquet) file through the
+# same encoders and engines the API serves, chunk by chunk, and write one
+# output row per input row with <model>_risk_score / <model>_risk_level.
+#
+# Memory stays constant in the file size: at most `--jobs * 2` chunks are in
+# flight at once, and results are written in input order as they complete.
+#
+#   python score_file.py patients.csv scores.csv
+#   python score_file.py export.csv scores.csv --models heart liver --id-column patient_id
+#   python score_file.py export.parquet scores.parquet --chunk-rows 100000 --jobs 4
+#
+# Columns are the API's field names. The raw training exports are accepted
+# too: data/heart.csv's thalch column and its Male/Female and True/False
+# spellings are translated (RAW_COLUMNS, RAW_VALUES), so that file scores
+# as it is. Empty cells count as missing and fall back to the same defaults
+# the API uses for absent fields. Rows a model cannot encode get an empty
+# score and the reason in <model>_error.
+
+import argparse
+import os
+import sys
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from features import FIELDS
+from registry import MODEL_FILES, ModelRegistry
+
+MODELS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'models')
+
+# Inputs shared by several models do not select a model on their own (as in /predict/assessment)
+SHARED_KEYS = {'Age', 'age', 'Gender', 'sex'}
+
+# Raw dataset spellings -> API inputs (only where the API column is absent)
+RAW_COLUMNS = {'thalch': 'thalach'}
+FLAGS = {True: 1, False: 0, 'True': 1, 'False': 0, 'TRUE': 1, 'FALSE': 0}
+RAW_VALUES = {'sex': {'Male': 1, 'Female': 0}, 'fbs': FLAGS, 'exang': FLAGS}
+
+_registry = None # per process, set by init_worker()
+
+
+def init_worker(models_dir, names):
+    global _registry
+    _registry = ModelRegistry(models_dir)
+    _registry.load_all(names)
+
+
+def detect_models(columns):
+    """Models with at least one of their own input fields among the file's columns."""
+    columns = set(columns)
+    return [
+        name for name in MODEL_FILES
+        if columns & ({f.key for f in FIELDS[name]} - SHARED_KEYS)
+    ]
+
+
+def normalize(chunk):
+    """The chunk with raw dataset spellings replaced by the API's."""
+    chunk = chunk.rename(columns={k: v for k, v in RAW_COLUMNS.items() if v not in chunk.columns})
+    for column, mapping in RAW_VALUES.items():
+        # bool columns (a chunk without gaps) count as numeric to pandas
+        dtype = chunk[column].dtype if column in chunk.columns else None
+        if dtype is not None and (pd.api.types.is_bool_dtype(dtype) or not pd.api.types.is_numeric_dtype(dtype)):
+            chunk[column] = chunk[column].map(lambda v: mapping.get(v, v))
+    return chunk
+
+
+def records(chunk):
+    # Row dicts without the empty cells; integral floats become ints so
+    # categorical codes read from a column with gaps ("2.0") still match "2"
+    columns = list(chunk.columns)
+    out = []
+    for row in chunk.itertuples(index=False, name=None):
+        patient = {}
+        for key, value in zip(columns, row):
+            if isinstance(value, float):
+                if value != value:
+                    continue
+                if value.is_integer():
+                    value = int(value)
+            patient[key] = value
+        out.append(patient)
+    return out
+
+
+def risk_levels(prob, high, moderate):
+    return np.where(prob > high, 'High', np.where(prob > moderate, 'Moderate', 'Low'))
+
+
+def score_chunk(chunk, names, id_columns):
+    """DataFrame chunk -> DataFrame of scores (one row per input row)."""
+    patients = records(normalize(chunk))
+    out = pd.DataFrame({c: chunk[c].to_numpy() for c in id_columns}, index=chunk.index)
+    for name in names:
+        bundle = _registry.get(name)
+        X, ok, errors = bundle.encoder.encode_many(patients)
+        prob = np.full(len(patients), np.nan)
+        if ok:
+            prob[ok] = bundle.engine.proba(X)
+        high, moderate = bundle.thresholds
+        out[f'{name}_risk_score'] = np.round(prob * 100, 2)
+        out[f'{name}_risk_level'] = np.where(np.isnan(prob), '', risk_levels(prob, high, moderate))
+        error = np.full(len(patients), '', dtype=object)
+        for i, e in errors.items():
+            error[i] = str(e)
+        out[f'{name}_error'] = error
+    return out
+
+
+def read_chunks(path, chunk_rows):
+    if path.endswith('.parquet'):
+        try:
+            import pyarrow.parquet as pq
+        except ImportError:
+            sys.exit("Reading Parquet needs pyarrow (pip install pyarrow)")
+        for batch in pq.ParquetFile(path).iter_batches(batch_size=chunk_rows):
+            yield batch.to_pandas()
+    else:
+        yield from pd.read_csv(path, chunksize=chunk_rows, low_memory=False)
+
+
+class ChunkWriter:
+    """Appends score chunks to a CSV or Parquet file, picked by extension."""
+
+    def __init__(self, path):
+        self.path = path
+        self.parquet = path.endswith('.parquet')
+        self._file = None
+        self._writer = None
+
+    def write(self, frame):
+        if self.parquet:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+
+            table = pa.Table.from_pandas(frame, preserve_index=False)
+            if self._writer is None:
+                self._writer = pq.ParquetWriter(self.path, table.schema)
+            self._writer.write_table(table)
+        else:
+            header = self._file is None
+            if header:
+                self._file = open(self.path, 'w', newline='')
+            frame.to_csv(self._file, header=header, index=False)
+
+    def close(self):
+        if self._writer is not None:
+            self._writer.close()
+        if self._file is not None:
+            self._file.close()
+
+
+def score_file(src, dst, names=None, id_columns=(), chunk_rows=50000, jobs=1, models_dir=MODELS_DIR):
+    """Score src into dst; returns (rows, seconds)."""
+    start = time.perf_counter()
+    chunks = read_chunks(src, chunk_rows)
+    first = next(chunks, None)
+    if first is None:
+        raise ValueError(f"{src} has no rows")
+    names = list(names or detect_models(normalize(first.head(0)).columns))
+    if not names:
+        raise ValueError("No model inputs found in the file's columns; pass --models")
+    unavailable = [n for n in names if ModelRegistry(models_dir).resolve(n)[0] is None]
+    if unavailable:
+        raise ValueError(f"No artifact for models: {unavailable}")
+    missing = [c for c in id_columns if c not in first.columns]
+    if missing:
+        raise ValueError(f"ID columns not in file: {missing}")
+
+    def all_chunks():
+        yield first
+        yield from chunks
+
+    writer = ChunkWriter(dst)
+    rows = 0
+    try:
+        if jobs > 1:
+            with ProcessPoolExecutor(jobs, initializer=init_worker, initargs=(models_dir, names)) as pool:
+                # Bounded window of chunks in flight, written back in order
+                pending = deque()
+                for chunk in all_chunks():
+                    pending.append(pool.submit(score_chunk, chunk, names, id_columns))
+                    if len(pending) >= 2 * jobs:
+                        out = pending.popleft().result()
+                        writer.write(out)
+                        rows += len(out)
+                while pending:
+                    out = pending.popleft().result()
+                    writer.write(out)
+                    rows += len(out)
+        else:
+            init_worker(models_dir, names)
+            for chunk in all_chunks():
+                out = score_chunk(chunk, names, id_columns)
+                writer.write(out)
+                rows += len(out)
+    finally:
+        writer.close()
+    return rows, time.perf_counter() - start
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Score a patient CSV/Parquet file with the EarlyGuard models")
+    parser.add_argument('input', help="CSV or .parquet file, one patient per row (API field names as columns)")
+    parser.add_argument('output', help="CSV or .parquet file to write")
+    parser.add_argument('--models', nargs='+', choices=sorted(MODEL_FILES),
+                        help="Models to run (default: every model with input columns in the file)")
+    parser.add_argument('--id-column', action='append', default=[], dest='id_columns',
+                        help="Input column copied to the output (repeatable)")
+    parser.add_argument('--chunk-rows', type=int, default=50000)
+    parser.add_argument('--jobs', type=int, default=1, help="Worker processes scoring chunks in parallel")
+    parser.add_argument('--models-dir', default=MODELS_DIR)
+    args = parser.parse_args()
+
+    try:
+        rows, seconds = score_file(args.input, args.output, args.models, args.id_columns,
+                                   args.chunk_rows, args.jobs, args.models_dir)
+    except ValueError as e:
+        sys.exit(str(e))
+    print(f"Scored {rows} rows in {seconds:.1f}s ({rows / seconds:,.0f} rows/s) -> {args.output}")
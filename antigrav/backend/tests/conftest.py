@@ -0,0 +1,33 @@
+# Shared test setup. Run from backend/: python -m pytest
+#
+# The stores app.py opens at import (labs, assessments, outcomes) are pointed
+# at a scratch directory first, so tests never touch data/. Tests that only
+# need the models build them from the artifacts and do not import app.
+
+import os
+import sys
+import tempfile
+import warnings
+
+import pytest
+
+BACKEND = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND)
+
+SCRATCH = tempfile.mkdtemp(prefix='earlyguard-tests-')
+os.environ.setdefault('EARLYGUARD_LABS_DB', os.path.join(SCRATCH, 'labs.db'))
+os.environ.setdefault('EARLYGUARD_ASSESSMENTS_DB', os.path.join(SCRATCH, 'assessments.db'))
+os.environ.setdefault('EARLYGUARD_OUTCOMES_DIR', os.path.join(SCRATCH, 'outcomes'))
+os.environ.setdefault('EARLYGUARD_CACHE_SIZE', '0')
+warnings.filterwarnings('ignore', module='sklearn')
+
+
+@pytest.fixture(scope='session')
+def app_module():
+    import app
+    return app
+
+
+@pytest.fixture
+def client(app_module):
+    return app_module.app.test_client()
@@ -0,0 +1,28 @@
+def test_stored_labs_do_not_add_models(app_module, client):
+    # Glucose and ALT map onto diabetes and liver inputs, but the payload only
+    # asks for mental health, so only mental health is scored
+    r = client.post('/labs/p1', json=[{"analyte": "glucose", "value": 180}, {"analyte": "alt", "value": 90}])
+    assert r.status_code == 201
+
+    payload = {"stress_level": 5, "workload": 5, "sleep_quality": 5}
+    alone = client.post('/predict/assessment', json=payload).get_json()
+    r = client.post('/predict/assessment', json={"patient_id": "p1", **payload})
+    assert r.status_code == 200
+    body = r.get_json()
+    assert set(body["results"]) == {"mental"}
+    assert {"diabetes", "liver", "heart"} <= set(body["skipped"])
+    assert body["overall_risk"] == alone["overall_risk"]
+    assert body["lab_trends"]["glucose"]["last_value"] == 180
+
+    app_module.assessment_store.flush()
+    stored = app_module.assessment_store.query(patient_id="p1")
+    assert stored[0]["response"]["results"].keys() == {"mental"}
+
+
+def test_stored_labs_fill_selected_models(client):
+    client.post('/labs/p2', json=[{"analyte": "glucose", "value": 180}])
+    payload = {"patient_id": "p2", "BMI": 30, "Age": 45}
+    body = client.post('/predict/assessment', json=payload).get_json()
+    filled = client.post('/predict/assessment', json={"Glucose": 180, "BMI": 30, "Age": 45}).get_json()
+    assert set(body["results"]) == {"diabetes"}
+    assert body["results"]["diabetes"]["risk_score"] == filled["results"]["diabetes"]["risk_score"]
@@ -0,0 +1,65 @@
+import os
+import subprocess
+import sys
+
+import pytest
+
+from assessments import AssessmentStore
+
+BACKEND = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+RESULT = {"diabetes": {"model_version": "v1", "risk_score": 42.0, "risk_level": "Moderate"}}
+
+
+def record(store, n, patient_id='p1'):
+    for i in range(n):
+        store.record(store.new_id(), '{"i": %d}' % i, '{}', RESULT, patient_id, 42.0)
+
+
+def test_queued_rows_share_transactions(tmp_path):
+    store = AssessmentStore(str(tmp_path / 'a.db'), batch_rows=64, flush_ms=50)
+    record(store, 200)
+    store.flush()
+    assert store.written == 200 and store.stats()["pending"] == 0
+    assert store.transactions < 200 and store.largest <= 64
+    rows = store.query('p1', limit=1000)
+    assert len(rows) == 200 and rows[0]["response"] == {}
+
+
+def test_queued_rows_are_written_at_exit(tmp_path):
+    # The writer is a daemon thread: without the atexit flush these rows
+    # would die with the process
+    path = str(tmp_path / 'a.db')
+    code = (f"from assessments import AssessmentStore\n"
+            f"store = AssessmentStore({path!r}, flush_ms=200)\n"
+            f"for i in range(50):\n"
+            f"    store.record(store.new_id(), '{{}}', '{{}}', {RESULT!r}, 'p1', 42.0)\n")
+    subprocess.run([sys.executable, '-c', code], cwd=BACKEND, check=True, timeout=60)
+    assert len(AssessmentStore(path).query('p1', limit=1000)) == 50
+
+
+def test_a_failed_write_is_counted_and_the_writer_keeps_going(tmp_path):
+    store = AssessmentStore(str(tmp_path / 'a.db'), flush_ms=0)
+    duplicate = store.new_id()
+    store.record(duplicate, '{}', '{}', RESULT)
+    store.flush()
+    store.record(duplicate, '{}', '{}', RESULT) # primary key clash
+    store.flush()
+    record(store, 3)
+    store.flush()
+    assert store.failed == 1 and store.written == 4
+
+
+@pytest.mark.parametrize('limit', [0, -1])
+def test_non_positive_limit_is_rejected(tmp_path, limit):
+    with pytest.raises(ValueError):
+        AssessmentStore(str(tmp_path / 'a.db')).query(limit=limit)
+
+
+def test_history_route_limits(app_module, client):
+    client.post('/predict/assessment', json={"patient_id": "lim", "Glucose": 150, "BMI": 30, "Age": 50})
+    client.post('/predict/assessment', json={"patient_id": "lim", "Glucose": 120, "BMI": 30, "Age": 50})
+    for limit in ('-1', '0', 'abc'):
+        assert client.get(f'/assessments/lim?limit={limit}').status_code == 400
+    body = client.get('/assessments/lim?limit=1').get_json()
+    assert body["count"] == 1
+    assert body["assessments"][0]["request"]["Glucose"] == 120
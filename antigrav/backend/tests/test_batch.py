@@ -0,0 +1,45 @@
+import json
+
+import pytest
+
+PATIENTS = [
+    {"Glucose": 150, "BMI": 31, "Age": 50},
+    {"Glucose": "abc"},
+    {"Glucose": 95, "BMI": 22, "Age": 25},
+]
+
+
+def test_batch_matches_single_predictions_in_order(client):
+    r = client.post('/predict/diabetes/batch', json=PATIENTS)
+    assert r.status_code == 200
+    body = r.get_json()
+    assert body["count"] == 3 and body["failed"] == 1 and len(body["results"]) == 3
+    assert body["results"][1]["index"] == 1 and [f["field"] for f in body["results"][1]["fields"]] == ["Glucose"]
+    for i in (0, 2):
+        single = client.post('/predict/diabetes', json=PATIENTS[i]).get_json()
+        assert body["results"][i]["risk_score"] == single["risk_score"]
+        assert body["results"][i]["risk_level"] == single["risk_level"]
+
+
+def test_ndjson_keeps_bad_lines_in_place(client):
+    lines = [json.dumps(PATIENTS[0]), '{not json', '', json.dumps(PATIENTS[2])]
+    r = client.post('/predict/diabetes/batch', data='\n'.join(lines), content_type='application/x-ndjson')
+    body = r.get_json()
+    assert r.status_code == 200
+    assert body["count"] == 3 and body["failed"] == 1
+    assert body["results"][1]["index"] == 1 and "error" in body["results"][1]
+    json_body = client.post('/predict/diabetes/batch', json=[PATIENTS[0], PATIENTS[2]]).get_json()
+    assert [body["results"][0], body["results"][2]] == json_body["results"]
+
+
+@pytest.mark.parametrize('model', ['diabetes', 'heart', 'liver', 'mental-health'])
+def test_every_model_scores_an_empty_patient_with_defaults(client, model):
+    body = client.post(f'/predict/{model}/batch', json=[{}, {}]).get_json()
+    assert body["count"] == 2 and body["failed"] == 0
+    assert body["results"][0] == body["results"][1]
+
+
+def test_bad_batch_requests(client):
+    assert client.post('/predict/unknown/batch', json=[{}]).status_code == 404
+    r = client.post('/predict/diabetes/batch', json={"Glucose": 120})
+    assert r.status_code == 400 and "JSON array" in r.get_json()["error"]
@@ -0,0 +1,57 @@
+from cache import PredictionCache
+
+
+def test_cache_hit_reuses_drivers(app_module, client, monkeypatch):
+    monkeypatch.setattr(app_module, 'prediction_cache', PredictionCache(100))
+    calls = []
+    top_drivers = app_module.top_drivers
+    monkeypatch.setattr(app_module, 'top_drivers', lambda *args: calls.append(args) or top_drivers(*args))
+
+    payload = {"Glucose": 150, "BMI": 31, "Age": 50}
+    first = client.post('/predict/diabetes', json=payload).get_json()
+    second = client.post('/predict/diabetes', json=payload).get_json()
+    assert len(calls) == 1
+    assert app_module.prediction_cache.hits == 1
+    assert second["drivers"] == first["drivers"] and second["risk_score"] == first["risk_score"]
+
+
+def test_lru_evicts_least_recently_used():
+    cache = PredictionCache(maxsize=2)
+    cache.put('a', 1)
+    cache.put('b', 2)
+    assert cache.get('a') == 1  # 'b' is now the oldest
+    cache.put('c', 3)
+    assert cache.get('b') is None
+    assert cache.get('a') == 1 and cache.get('c') == 3
+    stats = cache.stats()
+    assert stats["size"] == 2 and stats["evictions"] == 1
+    assert stats["hits"] == 3 and stats["misses"] == 1 and stats["hit_rate"] == 0.75
+
+
+def test_ttl_expires_entries(monkeypatch):
+    clock = [100.0]
+    monkeypatch.setattr('cache.time.monotonic', lambda: clock[0])
+    cache = PredictionCache(maxsize=10, ttl=5)
+    cache.put('a', 1)
+    clock[0] = 104.9
+    assert cache.get('a') == 1
+    clock[0] = 105.0
+    assert cache.get('a') is None
+    assert cache.stats()["expirations"] == 1 and cache.stats()["size"] == 0
+
+
+def test_invalidate_one_model_keeps_the_others():
+    cache = PredictionCache()
+    cache.put(('heart', 'v1', b'x'), 1)
+    cache.put(('liver', 'v1', b'x'), 2)
+    cache.invalidate('heart')
+    assert cache.get(('heart', 'v1', b'x')) is None and cache.get(('liver', 'v1', b'x')) == 2
+    cache.invalidate()
+    assert cache.stats()["size"] == 0
+
+
+def test_disabled_cache_stores_nothing():
+    cache = PredictionCache(maxsize=0)
+    cache.put('a', 1)
+    assert cache.get('a') is None
+    assert cache.stats()["misses"] == 0 and cache.stats()["hit_rate"] is None
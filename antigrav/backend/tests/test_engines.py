@@ -0,0 +1,106 @@
+import os
+
+import joblib
+import numpy as np
+import pytest
+
+from inference import ForestEngine, GridEngine, LinearEngine, SklearnEngine
+from registry import ModelRegistry, pickle_for, unpack
+
+MODELS_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'models')
+TOLERANCE = 1e-9
+
+
+@pytest.fixture(scope='module')
+def registry():
+    registry = ModelRegistry(MODELS_DIR, use_grid=True)
+    registry.load_all()
+    return registry
+
+
+def sklearn_pair(bundle):
+    # The served engine may come from a pickle-free bundle; the reference is
+    # always the original sklearn pickle
+    if bundle.model is not None:
+        return bundle.scaler, bundle.model
+    model, scaler, _ = unpack(bundle.name, joblib.load(pickle_for(bundle.path)))
+    return scaler, model
+
+
+def random_rows(scaler, n, seed=0):
+    # Spread inputs well past the training range to exercise both sigmoid tails
+    rng = np.random.default_rng(seed)
+    return scaler.mean_ + rng.normal(scale=3.0, size=(n, scaler.mean_.shape[0])) * scaler.scale_
+
+
+def assert_close(engine, reference, X):
+    diff = np.max(np.abs(engine.proba(X) - reference.proba(X)))
+    assert diff < TOLERANCE, diff
+
+
+@pytest.mark.parametrize('name', ['diabetes', 'heart', 'liver'])
+def test_linear_engine_matches_predict_proba(registry, name):
+    bundle = registry.get(name)
+    scaler, model = sklearn_pair(bundle)
+    reference = SklearnEngine(scaler, model)
+    X = random_rows(scaler, 2000)
+
+    assert isinstance(bundle.engine, LinearEngine)
+    assert_close(bundle.engine, reference, X)
+    assert_close(LinearEngine.from_sklearn(scaler, model), reference, X)
+    # Contributions add up to the decision function
+    engine = bundle.engine
+    total = engine.contributions(X).sum(axis=1) + engine.expected
+    assert np.max(np.abs(total - engine.decision(X))) < TOLERANCE
+
+
+@pytest.fixture(scope='module')
+def mental(registry):
+    bundle = registry.get('mental')
+    scaler, model = sklearn_pair(bundle)
+    rng = np.random.default_rng(0)
+    forest = ForestEngine.from_sklearn(scaler, model)
+    # Inputs sitting exactly on split thresholds are where float32/float64 handling matters
+    on_cuts = np.column_stack([
+        forest.mean[j] + forest.scale[j] * rng.choice(np.unique(forest.threshold[forest.feature == j]), size=2000)
+        for j in range(forest.n_features)
+    ])
+    rows = {
+        'random': rng.uniform(-0.2, 1.2, size=(2000, forest.n_features)),
+        'on grid': rng.integers(0, 11, size=(2000, forest.n_features)) / 10.0,
+        'on thresholds': on_cuts,
+    }
+    return bundle, forest, SklearnEngine(scaler, model), rows
+
+
+@pytest.mark.parametrize('rows', ['random', 'on grid', 'on thresholds'])
+def test_forest_engines_match_predict_proba(mental, rows):
+    bundle, forest, reference, all_rows = mental
+    X = all_rows[rows]
+    assert forest.masks is not None
+    walked = ForestEngine.from_sklearn(reference.scaler, reference.model)
+    walked.masks = None
+
+    assert_close(forest, reference, X)
+    assert_close(walked, reference, X)
+    compiled = ForestEngine.from_sklearn(reference.scaler, reference.model).compile()
+    assert_close(compiled, reference, X)
+    assert_close(bundle.engine, reference, X)
+    # Off-grid rows fall back to the compiled forest
+    assert_close(GridEngine(compiled, bundle.encoder.grid_axes()), reference, X)
+    S = forest.prepare(X)
+    assert (forest.traverse(S) == walked.traverse(S)).all()
+
+
+def test_forest_grid_matches_predict_proba(mental):
+    bundle, _, reference, rows = mental
+    assert isinstance(bundle.engine, GridEngine)
+    assert_close(bundle.engine, reference, rows['on grid'])
+
+
+def test_forest_contributions_sum_to_proba(mental):
+    _, forest, reference, rows = mental
+    X = rows['random']
+    for part in (X[:1], X[:31], X):
+        total = forest.contributions(part).sum(axis=1) + forest.expected
+        assert np.max(np.abs(total - reference.proba(part))) < TOLERANCE
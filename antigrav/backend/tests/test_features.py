@@ -0,0 +1,104 @@
+import os
+
+import numpy as np
+import pytest
+
+from features import FeatureEncoder, Numeric, OneHot, ValidationError, build_encoder
+from registry import ModelRegistry
+
+MODELS_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'models')
+
+
+def test_heart_fields_reach_their_columns():
+    registry = ModelRegistry(MODELS_DIR)
+    registry.load_all(['heart'])
+    encoder = registry.get('heart').encoder
+    features = registry.get('heart').features
+    X = encoder.encode({"sex": 1, "fbs": 1, "exang": 1, "thalach": 172})
+    row = dict(zip(features, X[0].tolist()))
+
+    assert (row['sex_Male'], row['fbs_True'], row['exang_True'], row['thalch']) == (1, 1, 1, 172)
+    assert {'sex', 'fbs', 'exang', 'thalach'} <= set(encoder.describe())
+
+
+@pytest.mark.parametrize('features', [['a'], ['a', 'b_x']])
+def test_field_matching_no_feature_fails_compile(features):
+    with pytest.raises(ValueError, match="'b'"):
+        FeatureEncoder(features, [Numeric('a'), Numeric('b')])
+
+
+def test_every_model_field_is_used():
+    registry = ModelRegistry(MODELS_DIR)
+    registry.load_all()
+    for name in ('diabetes', 'heart', 'liver', 'mental'):
+        bundle = registry.get(name)
+        assert bundle is not None, registry.status()
+        build_encoder(name, bundle.features)
+
+
+@pytest.fixture(scope='module')
+def heart():
+    registry = ModelRegistry(MODELS_DIR)
+    registry.load_all(['heart'])
+    return registry.get('heart')
+
+
+def test_heart_codes_encode_like_their_labels(heart):
+    encode = heart.encoder.encode
+    rows = {cp: encode({"cp": cp}).tobytes() for cp in ('0', '1', '2', '3')}
+    assert len(set(rows.values())) == 4
+    for code, label in (('0', 'typical angina'), ('3', 'asymptomatic'), ('1', 'atypical angina')):
+        assert np.array_equal(encode({"cp": code}), encode({"cp": label}))
+    for key, code, label in (('slope', 2, 'downsloping'), ('thal', '3', 'reversable defect'),
+                             ('restecg', '1', 'st-t abnormality')):
+        assert np.array_equal(encode({key: code}), encode({key: label}))
+    # Defaults are labels with a meaning, not codes without a column
+    assert np.array_equal(encode({}), encode({"cp": "typical angina", "slope": "flat", "thal": "fixed defect",
+                                              "restecg": "normal"}))
+
+
+@pytest.mark.parametrize('payload', [{"thal": "0"}, {"cp": "4"}, {"slope": "level"}])
+def test_heart_unknown_codes_are_rejected(heart, payload):
+    with pytest.raises(ValidationError) as e:
+        heart.encoder.encode(payload)
+    assert e.value.fields[0]["field"] == next(iter(payload))
+
+
+@pytest.mark.parametrize('value', [1.7, True, False, "yes", 2])
+def test_flags_accept_only_0_or_1(heart, value):
+    with pytest.raises(ValidationError) as e:
+        heart.encoder.encode({"sex": value})
+    assert e.value.fields[0]["field"] == "sex"
+    X, ok, errors = heart.encoder.encode_many([{"sex": 1.0}, {"exang": value}])
+    assert ok == [0] and list(errors) == [1]
+
+
+def test_onehot_must_leave_one_baseline():
+    with pytest.raises(ValueError, match="baseline"):
+        FeatureEncoder(['cp_1', 'cp_2'], [OneHot('cp', '0', allowed=('0', '1', '2', '3'))])
+
+
+def test_schema_and_validation_errors(client):
+    schema = client.get('/schema/heart').get_json()["fields"]
+    assert schema["sex"]["type"] == "integer"
+    assert schema["cp"]["aliases"]["0"] == "typical angina"
+
+    r = client.post('/predict/heart', json={"sex": 1.7, "chol": 9000, "thal": "0"})
+    assert r.status_code == 400
+    body = r.get_json()
+    assert [f["field"] for f in body["fields"]] == ["sex", "chol", "thal"]
+    assert body["fields"][1]["max"] == 1000 and body["fields"][1]["unit"] == "mg/dL"
+
+    r = client.post('/predict/heart/batch', json=[{"cp": "2"}, {"exang": True}])
+    body = r.get_json()
+    assert body["failed"] == 1 and body["results"][1]["fields"][0]["field"] == "exang"
+
+
+@pytest.mark.parametrize('name', ['diabetes', 'heart'])
+def test_encoder_matches_the_dataframe_path(app_module, name):
+    from bench_features import DIABETES, HEART, diabetes_dataframe, heart_dataframe
+
+    payload, dataframe = {'diabetes': (DIABETES, diabetes_dataframe), 'heart': (HEART, heart_dataframe)}[name]
+    encoder = app_module.registry.get(name).encoder
+    for data in (payload, {}):
+        assert np.array_equal(dataframe(data).to_numpy(dtype=float), encoder.encode(data))
@@ -0,0 +1,79 @@
+import random
+
+import numpy as np
+import pytest
+
+from labs import DAY, LabStore, lab_score, latest_fields
+
+START = 1_700_000_000.0
+
+
+def reference(series, window_days):
+    # Trend features recomputed from scratch over the window ending at the newest result
+    series = dict(sorted(series.items()))
+    times = list(series)
+    t = np.array([x for x in times if x >= times[-1] - window_days * DAY]) / DAY
+    v = np.array([series[x * DAY] for x in t])
+    return {
+        "count": len(t),
+        "mean": round(float(v.mean()), 4),
+        "variance": round(float(v.var(ddof=1)), 4) if len(t) > 1 else None,
+        "slope_per_30d": round(30.0 * float(np.polyfit(t, v, 1)[0]), 4) if len(t) > 1 else None,
+        "last_value": series[times[-1]],
+        "last_delta": round(series[times[-1]] - series[times[-2]], 4) if len(times) > 1 else None,
+    }
+
+
+def test_incremental_trend_matches_a_full_recompute(tmp_path):
+    store = LabStore(str(tmp_path / 'labs.db'), window_days=90)
+    rng = random.Random(0)
+    series = {}
+    for batch in range(12):
+        # Mostly moving forward, then late and corrected results anywhere in the history
+        results = []
+        for _ in range(4):
+            t = START + rng.randint(0, 400) * DAY if batch > 8 else START + (batch * 40 + rng.randint(0, 39)) * DAY
+            results.append({"analyte": "glucose", "value": rng.uniform(70, 200), "taken_at": t})
+        trend = store.add_results('p1', results)['glucose']
+        for r in sorted(results, key=lambda r: r["taken_at"]):
+            series[r["taken_at"]] = r["value"]
+        expected = reference(series, 90)
+        assert {k: trend[k] for k in expected} == pytest.approx(expected, abs=1e-3)
+
+    newest = max(series)
+    series[newest] = 99.0 # a corrected result replaces the stored one
+    trend = store.add_results('p1', [{"analyte": "glucose", "value": 99.0, "taken_at": newest}])['glucose']
+    expected = reference(series, 90)
+    assert {k: trend[k] for k in expected} == pytest.approx(expected, abs=1e-3)
+    assert len(store.results('p1', 'glucose', limit=10000)) == len(series)
+
+
+def test_trends_fill_fields_and_score(tmp_path):
+    store = LabStore(str(tmp_path / 'labs.db'))
+    store.add_results('p1', [
+        {"analyte": "ALT", "value": 40, "taken_at": "2026-01-01"},
+        {"analyte": "alt", "value": 90, "taken_at": "2026-03-01T00:00:00Z"},
+        {"analyte": "albumin", "value": 4.2, "taken_at": "2026-03-01"},
+    ])
+    trends = store.trends('p1', now=START)
+    assert trends['alt']["last_delta"] == 50 and trends['alt']["abnormal"] and trends['alt']["slope_per_30d"] > 0
+    assert not trends['albumin']["abnormal"]
+    assert latest_fields(trends) == {"Alamine_Aminotransferase": 90, "Albumin": 4.2}
+    assert 0 < lab_score(trends) <= 10
+    assert lab_score(store.trends('nobody')) is None
+
+    assert [r["value"] for r in store.results('p1', 'alt', since='2026-02-01')] == [90]
+
+
+@pytest.mark.parametrize('result', [
+    {"analyte": "sodium", "value": 140},
+    {"analyte": "glucose", "value": "high"},
+    {"analyte": "glucose", "value": float('nan')},
+    {"analyte": "glucose", "value": 100, "taken_at": "yesterday"},
+    "glucose=100",
+])
+def test_bad_results_are_rejected_whole(tmp_path, result):
+    store = LabStore(str(tmp_path / 'labs.db'))
+    with pytest.raises(ValueError):
+        store.add_results('p1', [{"analyte": "glucose", "value": 100}, result])
+    assert store.results('p1') == []
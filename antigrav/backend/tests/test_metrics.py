@@ -0,0 +1,82 @@
+import json
+import re
+import subprocess
+import sys
+
+from metrics import BUCKETS, HELP, Metrics, Stopwatch
+
+
+def samples(text):
+    # {'name{labels}': value} for every sample line
+    return {line.rsplit(' ', 1)[0]: float(line.rsplit(' ', 1)[1])
+            for line in text.splitlines() if line and not line.startswith('#')}
+
+
+def test_render_counters_and_cumulative_histograms():
+    m = Metrics()
+    m.stages('heart', 'single', [('encode', 0.00003), ('predict', 0.2)])
+    m.stages('heart', 'single', [('encode', 0.00003)], rows=0)
+    m.error('heart', 'validation', 2)
+    out = samples(m.render())
+
+    assert out['earlyguard_predictions_total{model="heart",mode="single"}'] == 1
+    assert out['earlyguard_prediction_errors_total{model="heart",reason="validation"}'] == 2
+    encode = 'earlyguard_stage_duration_seconds_bucket{model="heart",mode="single",stage="encode",le="%s"}'
+    assert out[encode % '2.5e-05'] == 0 and out[encode % '5e-05'] == 2 and out[encode % '+Inf'] == 2
+    assert out['earlyguard_stage_duration_seconds_count{model="heart",mode="single",stage="encode"}'] == 2
+    assert abs(out['earlyguard_stage_duration_seconds_sum{model="heart",mode="single",stage="predict"}'] - 0.2) < 1e-12
+    assert len([k for k in out if 'stage="predict"' in k and '_bucket' in k]) == len(BUCKETS) + 1
+
+
+def test_stopwatch_laps():
+    watch = Stopwatch()
+    watch.lap('a')
+    watch.lap('b')
+    assert [stage for stage, _ in watch.laps] == ['a', 'b'] and all(s >= 0 for _, s in watch.laps)
+
+
+def test_snapshots_merge_across_processes(tmp_path):
+    exited = subprocess.run([sys.executable, '-c', 'import os; print(os.getpid())'], capture_output=True, text=True)
+    dead_pid = int(exited.stdout)
+    # A worker that has exited: its counters still count, its gauges do not
+    dead = {
+        'pid': dead_pid,
+        'counters': [['earlyguard_predictions_total', [['model', 'liver'], ['mode', 'batch']], 40]],
+        'histograms': [['earlyguard_http_request_duration_seconds', [['route', '/predict/<model>/batch']],
+                        [1] + [0] * len(BUCKETS) + [0.00001]]],
+        'gauges': [['earlyguard_cache_entries', [], 7]],
+        'cumulative': [['earlyguard_cache_events_total', [['event', 'hits']], 5]],
+    }
+    (tmp_path / f'{dead_pid}-dead.json').write_text(json.dumps(dead))
+
+    live = Metrics(str(tmp_path))
+    live.stages('liver', 'batch', [], rows=2)
+    live.request('/predict/<model>/batch', 'POST', 200, 0.00001)
+    state = {'gauges': [['earlyguard_cache_entries', [], 3]],
+             'cumulative': [['earlyguard_cache_events_total', [['event', 'hits']], 1]]}
+    out = samples(live.render(state))
+
+    assert out['earlyguard_predictions_total{model="liver",mode="batch"}'] == 42
+    assert out['earlyguard_http_request_duration_seconds_count{route="/predict/<model>/batch"}'] == 2
+    assert out['earlyguard_cache_entries'] == 3
+    assert out['earlyguard_cache_events_total{event="hits"}'] == 6
+
+
+def test_metrics_route_labels_match_help(client):
+    client.post('/predict/diabetes', json={"Glucose": 120})
+    client.post('/predict/diabetes', json={"Glucose": "abc"})
+    client.post('/predict/diabetes/batch', json=[{"Glucose": 120}])
+    client.post('/predict/assessment', json={"Glucose": 120})
+    client.post('/predict/whatif', json={"Glucose": 120, "vary": ["BMI"]})
+    text = client.get('/metrics').get_data(as_text=True)
+
+    help_text = dict(re.findall(r'^# HELP (\S+) (.*)$', text, re.M))
+    assert help_text.keys() == HELP.keys()
+    modes = set(re.findall(r'earlyguard_predictions_total\{model="[^"]+",mode="([^"]+)"', text))
+    assert modes == {'single', 'batch', 'assessment', 'whatif'}
+    for mode in modes:
+        assert mode in help_text['earlyguard_predictions_total']
+    for reason in set(re.findall(r'reason="([^"]+)"', text)):
+        assert reason in help_text['earlyguard_prediction_errors_total']
+    for stage in set(re.findall(r'stage="([^"]+)"', text)):
+        assert stage in help_text['earlyguard_stage_duration_seconds']
@@ -0,0 +1,26 @@
+from concurrent.futures import Future
+
+
+class StalledBatcher:
+    # Accepts rows and never scores them
+    def submit(self, name, engine, row):
+        return Future()
+
+
+def timeouts(app_module, model):
+    return app_module.metrics._counters.get(('earlyguard_prediction_errors_total', model, 'timeout'), 0)
+
+
+def test_stalled_batch_answers_503(app_module, client, monkeypatch):
+    monkeypatch.setattr(app_module, 'batcher', StalledBatcher())
+    monkeypatch.setattr(app_module, 'MICROBATCH_TIMEOUT', 0.01)
+    before = timeouts(app_module, 'diabetes')
+
+    r = client.post('/predict/diabetes', json={"Glucose": 120, "BMI": 30, "Age": 45})
+    assert r.status_code == 503
+    assert "timed out" in r.get_json()["error"]
+
+    body = client.post('/predict/assessment', json={"Glucose": 120, "BMI": 30, "Age": 45}).get_json()
+    assert body["results"] == {}
+    assert "timed out" in body["errors"]["diabetes"]
+    assert timeouts(app_module, 'diabetes') == before + 2
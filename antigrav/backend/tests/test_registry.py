@@ -0,0 +1,43 @@
+import os
+
+import numpy as np
+import pytest
+from sklearn.linear_model import LogisticRegression
+from sklearn.preprocessing import StandardScaler
+
+import training
+from features import DIABETES_FEATURES
+from registry import ModelRegistry
+
+
+def fitted(seed, width=len(DIABETES_FEATURES)):
+    rng = np.random.default_rng(seed)
+    X = rng.normal(size=(200, width))
+    y = (X[:, 0] + rng.normal(size=200) > 0).astype(int)
+    scaler = StandardScaler().fit(X)
+    return LogisticRegression().fit(scaler.transform(X), y), scaler
+
+
+def test_retrain_replaces_active_version(tmp_path):
+    models_dir = str(tmp_path)
+    features = DIABETES_FEATURES
+    registry = ModelRegistry(models_dir)
+
+    # Flat files only: nothing is published
+    path, version = training.save_model('diabetes', *fitted(0), features, models_dir)
+    assert version is None
+    assert registry.resolve('diabetes')[0] == os.path.splitext(path)[0]
+
+    first = registry.publish('diabetes', os.path.splitext(path)[0])
+    assert registry.resolve('diabetes')[1] == first
+
+    # A retrain after that must be what gets served, not the old ACTIVE one
+    _, second = training.save_model('diabetes', *fitted(1), features, models_dir)
+    assert second is not None and second != first
+    assert registry.resolve('diabetes')[1] == second
+
+
+@pytest.mark.parametrize('version', ['../../heart_model', '..', 'a/b', '/etc/passwd', '', '.hidden'])
+def test_set_active_rejects_paths(tmp_path, version):
+    with pytest.raises(ValueError):
+        ModelRegistry(str(tmp_path)).set_active('heart', version)
@@ -0,0 +1,57 @@
+import itertools
+
+import numpy as np
+import pytest
+
+from features import ValidationError
+from models.risk_model import calculate_risk, default_scorer
+
+
+def original_calculate_risk(lab_score, lifestyle_score, stress_score, family_history):
+    # The scalar implementation RuleScorer replaced, verbatim arithmetic
+    risk_score = (
+        0.35 * lab_score +
+        0.30 * lifestyle_score +
+        0.20 * stress_score +
+        0.15 * (family_history * 10)
+    )
+    risk_percentage = min(max((risk_score / 10) * 100, 0), 100)
+    if risk_percentage < 35:
+        level = "Low"
+    elif risk_percentage < 65:
+        level = "Moderate"
+    else:
+        level = "High"
+    return round(risk_percentage, 2), level
+
+
+@pytest.mark.parametrize('inputs', [(6, 7, 4, 1), (6, 9, 1, 1)])
+def test_sum_just_below_cutoff_stays_moderate(inputs):
+    # The weighted sum is 64.999...; it displays as 65.0 but is below the cut-off
+    assert calculate_risk(*inputs) == (65.0, 'Moderate')
+
+
+def test_vectorized_matches_original_on_grid():
+    steps = np.arange(0, 10.01, 0.5)
+    rows = [(*r, f) for r in itertools.product(steps, steps, steps) for f in (0, 1)]
+    scores = default_scorer().score(np.array(rows, dtype=np.float64))
+    got = [(round(float(p), 2), str(l)) for p, l in zip(scores.percent, scores.level)]
+    assert got == [original_calculate_risk(*r) for r in rows]
+
+
+def test_bad_columns_are_field_errors():
+    scorer = default_scorer()
+    with pytest.raises(ValidationError) as e:
+        scorer.score({"lab_score": {"a": 1}, "lifestyle_score": [1], "stress_score": [2]})
+    assert e.value.fields == [
+        {"field": "lab_score", "error": "expected a number or an array of numbers"},
+        {"field": "family_history", "error": "missing"},
+    ]
+
+
+def test_score_rules_route_returns_field_errors(client):
+    r = client.post('/score/rules', json={"lab_score": {"a": 1}, "lifestyle_score": [1],
+                                          "stress_score": [1], "family_history": [0]})
+    assert r.status_code == 400
+    assert r.get_json()["fields"] == [{"field": "lab_score", "error": "expected a number or an array of numbers"}]
+    assert "float()" not in r.get_json()["error"]
@@ -0,0 +1,67 @@
+import os
+
+import pandas as pd
+import pytest
+
+from score_file import detect_models, score_file
+
+HEART_CSV = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))),
+                         'data', 'heart.csv')
+
+
+@pytest.fixture
+def patients(tmp_path):
+    path = tmp_path / 'patients.csv'
+    pd.DataFrame({
+        'patient_id': [f'p{i}' for i in range(25)],
+        'Glucose': [100 + i for i in range(25)],
+        'BMI': [25.0] * 25,
+        'stress_level': [i % 11 for i in range(25)],
+    }).to_csv(path, index=False)
+    return path
+
+
+def read(path):
+    return pd.read_csv(path, keep_default_na=False)
+
+
+def test_chunking_and_jobs_do_not_change_the_output(tmp_path, patients):
+    outputs = []
+    for chunk_rows, jobs in ((1000, 1), (7, 1), (7, 2)):
+        dst = tmp_path / f'out-{chunk_rows}-{jobs}.csv'
+        rows, _ = score_file(str(patients), str(dst), id_columns=['patient_id'], chunk_rows=chunk_rows, jobs=jobs)
+        assert rows == 25
+        outputs.append(read(dst))
+    for out in outputs[1:]:
+        pd.testing.assert_frame_equal(out, outputs[0])
+    first = outputs[0]
+    assert list(first.columns[:3]) == ['patient_id', 'diabetes_risk_score', 'diabetes_risk_level']
+    assert list(first['patient_id']) == [f'p{i}' for i in range(25)]
+    assert (first['diabetes_error'] == '').all() and (first['mental_error'] == '').all()
+
+
+def test_bad_rows_get_an_error_instead_of_a_score(tmp_path):
+    src, dst = tmp_path / 'in.csv', tmp_path / 'out.csv'
+    pd.DataFrame({'Glucose': ['120', 'abc', '9000', ''], 'BMI': [30, 30, 30, 30]}).to_csv(src, index=False)
+    score_file(str(src), str(dst), names=['diabetes'])
+    out = read(dst)
+    assert out['diabetes_risk_score'].astype(str).tolist()[1:3] == ['', '']
+    assert 'expected a number' in out['diabetes_error'][1]
+    assert 'above 800' in out['diabetes_error'][2]
+    # An empty cell falls back to the API default
+    assert out['diabetes_error'][0] == out['diabetes_error'][3] == ''
+
+
+def test_raw_heart_export_scores_as_is(tmp_path):
+    dst = tmp_path / 'heart.csv'
+    rows, _ = score_file(HEART_CSV, str(dst), id_columns=['num'], chunk_rows=300)
+    out = read(dst)
+    assert rows == 920 and list(out.columns[1:3]) == ['heart_risk_score', 'heart_risk_level']
+    assert (out['heart_error'] == '').all()
+    # Sanity: the scores track the recorded diagnoses
+    assert ((out['heart_risk_score'] > 50) == (out['num'] > 0)).mean() > 0.75
+
+
+def test_detect_models_ignores_shared_inputs():
+    assert detect_models(['Age', 'sex', 'patient_id']) == []
+    assert detect_models(['Glucose', 'chol', 'Age']) == ['diabetes', 'heart']
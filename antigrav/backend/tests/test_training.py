@@ -0,0 +1,51 @@
+import json
+import os
+import shutil
+
+import pytest
+
+import training
+from registry import ModelRegistry
+
+
+@pytest.fixture(scope='module')
+def tuned(tmp_path_factory):
+    models_dir = tmp_path_factory.mktemp('models')
+    report = training.tune_model('liver', models_dir=str(models_dir), folds=3, jobs=1)
+    with open(training.tuning_path('liver', str(models_dir))) as f:
+        return report, json.load(f), str(models_dir)
+
+
+def test_tuned_model_reports_holdout_accuracy(tuned):
+    report, summary, _ = tuned
+    assert 0 < report["holdout_accuracy"] < 1
+    assert summary["holdout_accuracy"] == report["holdout_accuracy"]
+    assert len(summary["candidates"]) == len(training.LINEAR_SPACE)
+
+
+def test_tuning_keeps_the_model_family(tuned):
+    _, summary, models_dir = tuned
+    assert {c["config"]["model"] for c in summary["candidates"]} == {'logistic'}
+    assert training.saved_config('liver', models_dir) == summary["config"]
+
+
+def test_train_all_in_parallel_with_a_failing_model(tmp_path):
+    # Only diabetes has its data here: liver fails, diabetes is still trained
+    data_dir = tmp_path / 'data'
+    data_dir.mkdir()
+    shutil.copy(os.path.join(training.DATA_DIR, 'diabetes.csv'), data_dir)
+    models_dir, cache_dir = str(tmp_path / 'models'), str(tmp_path / 'cache')
+    os.makedirs(models_dir)
+
+    reports = training.train_all(['diabetes', 'liver'], jobs=2, data_dir=str(data_dir), models_dir=models_dir,
+                                 cache_dir=cache_dir)
+    assert "error" in reports['liver'] and reports['liver']["model"] == 'liver'
+    assert "error" not in reports['diabetes'] and not reports['diabetes']["cached_dataset"]
+    assert 0 < reports['diabetes']["holdout_accuracy"] < 1
+
+    registry = ModelRegistry(models_dir)
+    registry.load_all(['diabetes'])
+    assert registry.get('diabetes') is not None
+
+    again = training.train_all(['diabetes'], data_dir=str(data_dir), models_dir=models_dir, cache_dir=cache_dir)
+    assert again['diabetes']["cached_dataset"] and again['diabetes']["rows"] == reports['diabetes']["rows"]
@@ -0,0 +1,16 @@
+def test_bad_vary_spec_for_every_model_is_400(client):
+    payload = {"Glucose": 174, "BMI": 33, "Age": 45, "vary": {"Glucose": {"min": 200, "max": 100}}}
+    r = client.post('/predict/whatif', json=payload)
+    assert r.status_code == 400
+    body = r.get_json()
+    assert set(body["errors"]) == {"diabetes"}
+    assert body["field_errors"]["diabetes"][0]["field"] == "Glucose"
+
+
+def test_one_failing_model_keeps_the_others(client):
+    payload = {"Glucose": 174, "BMI": 33, "Age": 45, "stress_level": 8,
+               "vary": {"Glucose": {"min": 200, "max": 100}, "stress_level": None}}
+    r = client.post('/predict/whatif', json=payload)
+    assert r.status_code == 200
+    body = r.get_json()
+    assert set(body["results"]) == {"mental"} and set(body["errors"]) == {"diabetes"}
@@ -0,0 +1,511 @@
+# backend/training.py
+#
+# One training pipeline for every disease model.
+#
+# Each model is a Trainer: the raw data files it reads, a prepare() step
+# (raw CSVs -> numeric X, y, feature names) and a model config. train_all()
+# runs the trainers in a process pool, so the total time is roughly that of
+# the slowest model rather than the sum, and adding a disease means adding
+# one entry to TRAINERS.
+#
+# Prepared datasets are cached under .cache/datasets/ as uncompressed NumPy
+# arrays, keyed by the content digest of their source files and of the
+# prepare() code, so training and tuning runs only re-parse CSVs (or re-run
+# preparation) after either changed.
+# Artifacts are written atomically: the .pkl via a temp file + os.replace and
+# the pickle-free bundle via a temp directory (see artifacts.py), so a
+# running API never loads a half-written model. A model that already serves a
+# published version (versions/<name>/ACTIVE) gets the retrained one published
+# and activated too, since ACTIVE wins over the flat files.
+#
+#   python training.py                          # all models, one process each
+#   python training.py --models heart liver --jobs 2
+#   python training.py --no-cache               # re-read every CSV
+#   python training.py --tune                   # CV search, keep the best AUC/latency trade-off
+
+import argparse
+import hashlib
+import inspect
+import itertools
+import json
+import os
+import time
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from artifacts import bundle_path, dump_atomic, export_pickled, file_digest, write_atomic
+from registry import MODEL_FILES, ModelRegistry
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+DATA_DIR = os.path.abspath(os.path.join(BASE_DIR, '../data'))
+MODELS_DIR = os.path.join(BASE_DIR, 'models')
+CACHE_DIR = os.path.join(BASE_DIR, '.cache', 'datasets')
+
+# prepare() source is part of the cache key; bump this for changes it cannot
+# see (e.g. in a helper it calls or in the pandas version's behaviour)
+PREPARE_VERSION = 1
+
+# Tuning objective: mean CV AUC minus this much per doubling of single-row
+# serving latency over the fastest candidate (0.01 = a model twice as slow
+# must be 0.01 AUC better to win)
+LATENCY_WEIGHT = 0.01
+# Latency ratios below this count as equal (timing noise between near-identical models)
+LATENCY_TOLERANCE = 1.25
+
+Dataset = namedtuple('Dataset', ['X', 'y', 'features'])
+
+# sources: data files (relative to DATA_DIR) prepare() reads; optional ones may be missing
+# config: model settings used until a tuned config is saved; space: what --tune searches
+# (same model family as config)
+# holdout: fraction kept back for the reported accuracy (0 = fit on everything)
+Trainer = namedtuple('Trainer', ['sources', 'optional', 'prepare', 'config', 'space', 'holdout'])
+
+
+# --- preparation: raw CSVs -> Dataset ------------------------------------
+
+def prepare_diabetes(data_dir):
+    import pandas as pd
+
+    data = pd.read_csv(os.path.join(data_dir, 'diabetes.csv'))
+    X = data.drop("Outcome", axis=1)
+    return Dataset(X.to_numpy(dtype=np.float64), data["Outcome"].to_numpy(), X.columns.tolist())
+
+
+def prepare_heart(data_dir):
+    import pandas as pd
+
+    data = pd.read_csv(os.path.join(data_dir, 'heart.csv'))
+
+    # Binary target: early risk
+    data["heart_risk"] = (data["num"] > 0).astype(int)
+
+    # Drop non-predictive columns
+    data = data.drop(columns=["id", "dataset", "num"])
+
+    # Separate column types
+    categorical_cols = data.select_dtypes(include="object").columns
+    numeric_cols = data.select_dtypes(exclude="object").columns.drop("heart_risk")
+
+    # Handle missing values
+    for col in numeric_cols:
+        data[col] = data[col].fillna(data[col].median())
+
+    for col in categorical_cols:
+        data[col] = data[col].fillna(data[col].mode()[0])
+
+    # One-hot encode categoricals
+    data = pd.get_dummies(data, columns=categorical_cols, drop_first=True)
+
+    X = data.drop("heart_risk", axis=1)
+    return Dataset(X.to_numpy(dtype=np.float64), data["heart_risk"].to_numpy(), X.columns.tolist())
+
+
+def prepare_liver(data_dir):
+    import pandas as pd
+
+    df = pd.read_csv(os.path.join(data_dir, 'indian_liver_patient.csv'))
+    df['Dataset'] = df['Dataset'].map({1: 1, 2: 0})
+    df['Albumin_and_Globulin_Ratio'] = df['Albumin_and_Globulin_Ratio'].fillna(df['Albumin_and_Globulin_Ratio'].mean())
+    df = df.fillna(0)
+
+    # Sorted-label codes, as LabelEncoder assigns them (Female 0, Male 1)
+    df['Gender'] = np.unique(df['Gender'].to_numpy(), return_inverse=True)[1]
+
+    X = df.drop('Dataset', axis=1)
+    return Dataset(X.to_numpy(dtype=np.float64), df['Dataset'].to_numpy(), list(X.columns))
+
+
+def prepare_mental(data_dir):
+    import pandas as pd
+
+    # Core: Stress Level Dataset, indicators normalized to 0-1 by their max
+    df_stress = pd.read_csv(os.path.join(data_dir, 'StressLevelDataset.csv'))
+    df_s_clean = pd.DataFrame()
+    df_s_clean['Anxiety_Indicator'] = df_stress['anxiety_level'] / df_stress['anxiety_level'].max()
+    df_s_clean['Workload_Indicator'] = df_stress['study_load'] / df_stress['study_load'].max()
+    df_s_clean['Sleep_Indicator'] = df_stress['sleep_quality'] / df_stress['sleep_quality'].max()
+    # Target: Risk High if stress >= 1 (NaN compares False, i.e. 0)
+    df_s_clean['Risk'] = (df_stress['stress_level'] >= 1).astype(np.int64)
+
+    # Optional: Burnout (train.csv)
+    burnout_path = os.path.join(data_dir, 'train.csv')
+    if os.path.exists(burnout_path):
+        df_burnout = pd.read_csv(burnout_path)
+        df_burnout.columns = df_burnout.columns.str.strip()
+
+        if 'Mental_Fatigue_Score' in df_burnout.columns and 'Burnout Rate' in df_burnout.columns:
+            df_burnout = df_burnout.dropna(subset=['Mental_Fatigue_Score', 'Burnout Rate'])
+
+            df_b_clean = pd.DataFrame()
+            df_b_clean['Anxiety_Indicator'] = df_burnout['Mental_Fatigue_Score'] / 10.0
+            df_b_clean['Workload_Indicator'] = df_burnout['Resource_Allocation'] / 10.0 if 'Resource_Allocation' in df_burnout else 0.5
+            df_b_clean['Sleep_Indicator'] = 0.5 # Neutral
+            df_b_clean['Risk'] = (df_burnout['Burnout Rate'] > 0.5).astype(np.int64)
+
+            df_s_clean = pd.concat([df_s_clean, df_b_clean], ignore_index=True)
+        else:
+            print(f"Burnout columns missing, skipping train.csv (found {list(df_burnout.columns)})")
+
+    features = ['Anxiety_Indicator', 'Workload_Indicator', 'Sleep_Indicator']
+    return Dataset(df_s_clean[features].to_numpy(dtype=np.float64), df_s_clean['Risk'].to_numpy(), features)
+
+
+# --- fitting: config -> (model, scaler) ----------------------------------
+#
+# A config is a plain dict: "model" picks the estimator, everything else is
+# passed to it. Configs are what the tuning stage searches over and what it
+# saves next to the artifact.
+
+def build_estimator(config):
+    params = {k: v for k, v in config.items() if k != 'model'}
+    if config['model'] == 'logistic':
+        from sklearn.linear_model import LogisticRegression
+        return LogisticRegression(**params)
+    if config['model'] == 'forest':
+        from sklearn.ensemble import RandomForestClassifier
+        return RandomForestClassifier(**params)
+    raise ValueError(f"Unknown model type: {config['model']!r}")
+
+
+def fit_config(config, X, y):
+    from sklearn.preprocessing import StandardScaler
+
+    scaler = StandardScaler()
+    model = build_estimator(config)
+    model.fit(scaler.fit_transform(X), y)
+    return model, scaler
+
+
+def grid(**axes):
+    """Every combination of the given parameter values, as config dicts."""
+    keys = list(axes)
+    values = [v if isinstance(v, (list, tuple)) else [v] for v in axes.values()]
+    return [dict(zip(keys, combo)) for combo in itertools.product(*values)]
+
+
+# Search spaces for --tune: the regularization of the linear models, and
+# forests from a handful of shallow trees (cheap to score) up to the full size.
+# Tuning never changes a model's family: drivers are log-odds for logistic
+# models and probabilities for forests, and the what-if directions were
+# checked against each model's curves.
+LINEAR_SPACE = grid(model='logistic', C=[0.01, 0.1, 1.0, 10.0], class_weight=[None, 'balanced'], max_iter=2000)
+FOREST_SPACE = grid(model='forest', n_estimators=[10, 25, 50, 100], max_depth=[4, 8, None], min_samples_leaf=[1, 5],
+                    random_state=42)
+
+
+TRAINERS = {
+    'diabetes': Trainer(('diabetes.csv',), (), prepare_diabetes,
+                        {'model': 'logistic', 'max_iter': 1000}, LINEAR_SPACE, holdout=0.2),
+    'heart': Trainer(('heart.csv',), (), prepare_heart,
+                     {'model': 'logistic', 'max_iter': 2000}, LINEAR_SPACE, holdout=0.2),
+    'liver': Trainer(('indian_liver_patient.csv',), (), prepare_liver,
+                     {'model': 'logistic', 'max_iter': 1000, 'random_state': 42}, LINEAR_SPACE, holdout=0.2),
+    'mental': Trainer(('StressLevelDataset.csv',), ('train.csv',), prepare_mental,
+                      {'model': 'forest', 'n_estimators': 100, 'random_state': 42}, FOREST_SPACE, holdout=0.2),
+}
+
+
+# --- dataset cache -------------------------------------------------------
+
+def prepare_digest(prepare):
+    # Editing a prepare() function changes its cached datasets' key
+    try:
+        code = inspect.getsource(prepare)
+    except (OSError, TypeError):
+        code = f"{prepare.__module__}.{prepare.__qualname__}"
+    return hashlib.sha256(code.encode()).hexdigest()[:12]
+
+
+def dataset_key(name, data_dir):
+    """Digest of everything prepare() depends on: its code and the source file contents."""
+    trainer = TRAINERS[name]
+    parts = [name, str(PREPARE_VERSION), prepare_digest(trainer.prepare)]
+    for source in trainer.sources + trainer.optional:
+        path = os.path.join(data_dir, source)
+        parts.append(f"{source}:{file_digest(path) if os.path.exists(path) else '-'}")
+    return hashlib.sha256('|'.join(parts).encode()).hexdigest()[:16]
+
+
+def load_dataset(name, data_dir=DATA_DIR, cache_dir=CACHE_DIR):
+    """(Dataset, cached) for one model, from the cache when its sources are unchanged."""
+    path = None
+    if cache_dir:
+        path = os.path.join(cache_dir, f"{name}-{dataset_key(name, data_dir)}.npz")
+        if os.path.exists(path):
+            with np.load(path, allow_pickle=False) as f:
+                return Dataset(f['X'], f['y'], f['features'].tolist()), True
+
+    dataset = TRAINERS[name].prepare(data_dir)
+    if path:
+        os.makedirs(cache_dir, exist_ok=True)
+        tmp = f"{path}.{os.getpid()}.tmp.npz"
+        np.savez(tmp, X=dataset.X, y=dataset.y, features=np.array(dataset.features, dtype=str))
+        os.replace(tmp, path)
+        # Drop entries for older versions of the same sources
+        for f in os.listdir(cache_dir):
+            if f.startswith(f"{name}-") and f != os.path.basename(path):
+                os.remove(os.path.join(cache_dir, f))
+    return dataset, False
+
+
+# --- training ------------------------------------------------------------
+
+def split(dataset, holdout, random_state=42):
+    if not holdout:
+        return dataset.X, dataset.y, None, None
+    from sklearn.model_selection import train_test_split
+
+    X_train, X_test, y_train, y_test = train_test_split(
+        dataset.X, dataset.y, test_size=holdout, random_state=random_state
+    )
+    return X_train, y_train, X_test, y_test
+
+
+def save_model(name, model, scaler, features, models_dir=MODELS_DIR):
+    """Write the .pkl and its pickle-free bundle, each atomically; returns (.pkl path, published version).
+
+    The version is None unless the model already serves a published version,
+    in which case the new artifact is published and made ACTIVE.
+    """
+    path = os.path.join(models_dir, MODEL_FILES[name][1])
+    dump_atomic({'model': model, 'scaler': scaler, 'features': list(features)}, path)
+    export_pickled(path, name, model, scaler, features)
+    registry = ModelRegistry(models_dir)
+    if os.path.exists(os.path.join(registry.versions_dir(name), 'ACTIVE')):
+        return path, registry.publish(name, bundle_path(path))
+    return path, None
+
+
+def tuning_path(name, models_dir=MODELS_DIR):
+    # models/heart_model.pkl -> models/heart_model.tuning.json
+    return os.path.splitext(os.path.join(models_dir, MODEL_FILES[name][1]))[0] + '.tuning.json'
+
+
+def saved_config(name, models_dir=MODELS_DIR):
+    """The config chosen by the last --tune run, else the trainer's default."""
+    default = TRAINERS[name].config
+    path = tuning_path(name, models_dir)
+    if os.path.exists(path):
+        with open(path) as f:
+            config = json.load(f)['config']
+        # Tuned before the search spaces were limited to one family
+        if config.get('model') == default['model']:
+            return config
+    return dict(default)
+
+
+def train_model(name, data_dir=DATA_DIR, models_dir=MODELS_DIR, cache_dir=CACHE_DIR, config=None):
+    """Prepare, fit and save one model; returns a report dict with per-stage wall times."""
+    trainer = TRAINERS[name]
+    config = config or saved_config(name, models_dir)
+    start = time.perf_counter()
+    dataset, cached = load_dataset(name, data_dir, cache_dir)
+    prepared = time.perf_counter()
+
+    X_train, y_train, X_test, y_test = split(dataset, trainer.holdout)
+    model, scaler = fit_config(config, X_train, y_train)
+    fitted = time.perf_counter()
+
+    path, version = save_model(name, model, scaler, dataset.features, models_dir)
+    saved = time.perf_counter()
+
+    report = {
+        "model": name,
+        "artifact": os.path.basename(path),
+        "published_version": version,
+        "config": config,
+        "rows": int(len(dataset.y)),
+        "cached_dataset": cached,
+        "prepare_seconds": round(prepared - start, 3),
+        "fit_seconds": round(fitted - prepared, 3),
+        "save_seconds": round(saved - fitted, 3),
+        "total_seconds": round(saved - start, 3),
+    }
+    if X_test is not None:
+        report["holdout_accuracy"] = round(float(model.score(scaler.transform(X_test), y_test)), 4)
+    return report
+
+
+# --- tuning: parallel k-fold CV over the search space ---------------------
+
+def cv_fold(config, X, y, train_idx, test_idx, keep_model=False):
+    """Fit one config on one fold; returns (scores, (model, scaler) or None)."""
+    from sklearn.metrics import roc_auc_score
+
+    model, scaler = fit_config(config, X[train_idx], y[train_idx])
+    S = scaler.transform(X[test_idx])
+    scores = {
+        "auc": float(roc_auc_score(y[test_idx], model.predict_proba(S)[:, 1])),
+        "accuracy": float(model.score(S, y[test_idx])),
+    }
+    return scores, ((model, scaler) if keep_model else None)
+
+
+def serving_latency(model, scaler, X, repeat=300):
+    """(engine kind, single-row us, per-row us in a 1000-row batch) as the API would serve it."""
+    from inference import build_engine
+
+    engine = build_engine(scaler, model)
+    one = X[:1]
+    batch = X[np.arange(1000) % len(X)]
+    engine.proba(one)
+    single = []
+    for _ in range(repeat):
+        t = time.perf_counter()
+        engine.proba(one)
+        single.append(time.perf_counter() - t)
+    t = time.perf_counter()
+    engine.proba(batch)
+    per_row = (time.perf_counter() - t) / len(batch)
+    return engine.kind, float(np.median(single)) * 1e6, per_row * 1e6
+
+
+def tune_model(name, data_dir=DATA_DIR, models_dir=MODELS_DIR, cache_dir=CACHE_DIR, folds=5, jobs=None,
+               latency_weight=LATENCY_WEIGHT):
+    """Cross-validate every config in the model's search space, train the best one and save it.
+
+    Folds run in a process pool. Latency is measured afterwards, one
+    candidate at a time in this process, on the fold-0 model. The chosen
+    config and the metrics of every candidate go to <artifact>.tuning.json,
+    which later plain training runs reuse. Returns the training report.
+    """
+    from sklearn.model_selection import StratifiedKFold
+
+    trainer = TRAINERS[name]
+    start = time.perf_counter()
+    dataset, _ = load_dataset(name, data_dir, cache_dir)
+    # The holdout (if any) stays out of the search so its accuracy is honest
+    X, y, _, _ = split(dataset, trainer.holdout)
+    splits = list(StratifiedKFold(folds, shuffle=True, random_state=42).split(X, y))
+    configs = trainer.space
+
+    tasks = [(c, f) for c in range(len(configs)) for f in range(len(splits))]
+    jobs = jobs or os.cpu_count() or 1
+    if jobs > 1:
+        with ProcessPoolExecutor(jobs) as pool:
+            futures = [pool.submit(cv_fold, configs[c], X, y, *splits[f], f == 0) for c, f in tasks]
+            results = [future.result() for future in futures]
+    else:
+        results = [cv_fold(configs[c], X, y, *splits[f], f == 0) for c, f in tasks]
+
+    candidates = []
+    for c, config in enumerate(configs):
+        runs = [results[i] for i, (tc, _) in enumerate(tasks) if tc == c]
+        auc = np.array([scores["auc"] for scores, _ in runs])
+        model, scaler = next(fitted for _, fitted in runs if fitted is not None)
+        engine, single_us, batch_us = serving_latency(model, scaler, X)
+        candidates.append({
+            "config": config,
+            "cv_auc": round(float(auc.mean()), 4),
+            "cv_auc_std": round(float(auc.std()), 4),
+            "cv_accuracy": round(float(np.mean([scores["accuracy"] for scores, _ in runs])), 4),
+            "engine": engine,
+            "single_row_us": round(single_us, 2),
+            "batch_row_us": round(batch_us, 3),
+        })
+
+    fastest = min(c["single_row_us"] for c in candidates)
+    for c in candidates:
+        ratio = max(c["single_row_us"], 1e-3) / max(fastest, 1e-3)
+        penalty = latency_weight * np.log2(ratio) if ratio > LATENCY_TOLERANCE else 0.0
+        c["objective"] = round(float(c["cv_auc"] - penalty), 4)
+    candidates.sort(key=lambda c: c["objective"], reverse=True)
+    best = candidates[0]
+    searched = time.perf_counter() - start
+
+    report = train_model(name, data_dir, models_dir, cache_dir, config=best["config"])
+    report["search_seconds"] = round(searched, 3)
+    report["candidates"] = len(candidates)
+    summary = {
+        "model": name,
+        "config": best["config"],
+        "metrics": {k: v for k, v in best.items() if k != "config"},
+        "holdout_accuracy": report.get("holdout_accuracy"),
+        "folds": folds,
+        "latency_weight": latency_weight,
+        "rows": report["rows"],
+        "artifact": report["artifact"],
+        "tuned_at": time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+        "search_seconds": report["search_seconds"],
+        "candidates": candidates,
+    }
+    write_atomic(tuning_path(name, models_dir), json.dumps(summary, indent=2).encode())
+    return report
+
+
+def train_all(names=None, jobs=None, data_dir=DATA_DIR, models_dir=MODELS_DIR, cache_dir=CACHE_DIR,
+              tune=False, folds=5, latency_weight=LATENCY_WEIGHT):
+    """Train models in parallel worker processes; returns {name: report}.
+
+    With tune=True models are tuned one after another instead, each
+    spreading its CV folds over the pool (many more tasks than models).
+    A model that fails is reported with an "error" and does not stop the others.
+    """
+    names = list(names or TRAINERS)
+    reports = {}
+    if tune:
+        for name in names:
+            try:
+                reports[name] = tune_model(name, data_dir, models_dir, cache_dir, folds, jobs, latency_weight)
+            except Exception as e:
+                reports[name] = {"model": name, "error": f"{type(e).__name__}: {e}"}
+        return reports
+
+    jobs = jobs or min(len(names), os.cpu_count() or 1)
+    if jobs > 1 and len(names) > 1:
+        with ProcessPoolExecutor(jobs) as pool:
+            futures = {name: pool.submit(train_model, name, data_dir, models_dir, cache_dir) for name in names}
+            for name, future in futures.items():
+                try:
+                    reports[name] = future.result()
+                except Exception as e:
+                    reports[name] = {"model": name, "error": f"{type(e).__name__}: {e}"}
+    else:
+        for name in names:
+            try:
+                reports[name] = train_model(name, data_dir, models_dir, cache_dir)
+            except Exception as e:
+                reports[name] = {"model": name, "error": f"{type(e).__name__}: {e}"}
+    return reports
+
+
+if __name__ == '__main__':
+    import warnings
+
+    warnings.filterwarnings('ignore')
+    parser = argparse.ArgumentParser(description="Train the EarlyGuard disease models")
+    parser.add_argument('--models', nargs='+', choices=sorted(TRAINERS), help="Models to train (default: all)")
+    parser.add_argument('--jobs', type=int, help="Worker processes (default: one per model, up to the CPU count)")
+    parser.add_argument('--no-cache', action='store_true', help="Re-prepare every dataset from the raw CSVs")
+    parser.add_argument('--json', action='store_true', help="Print the reports as JSON")
+    parser.add_argument('--tune', action='store_true',
+                        help="Cross-validate the search space and keep the best AUC/latency trade-off")
+    parser.add_argument('--folds', type=int, default=5)
+    parser.add_argument('--models-dir', default=MODELS_DIR, help="Where artifacts are written")
+    parser.add_argument('--latency-weight', type=float, default=LATENCY_WEIGHT,
+                        help="AUC given up per doubling of single-row latency")
+    args = parser.parse_args()
+
+    begin = time.perf_counter()
+    reports = train_all(args.models, args.jobs, models_dir=args.models_dir, cache_dir=None if args.no_cache else CACHE_DIR,
+                        tune=args.tune, folds=args.folds, latency_weight=args.latency_weight)
+    wall = time.perf_counter() - begin
+
+    if args.json:
+        print(json.dumps({"models": reports, "wall_seconds": round(wall, 3)}, indent=2))
+    else:
+        for name, r in reports.items():
+            if "error" in r:
+                print(f"{MODEL_FILES[name][0]:<14} FAILED  {r['error']}")
+                continue
+            accuracy = f"  holdout accuracy {r['holdout_accuracy'] * 100:.2f}%" if "holdout_accuracy" in r else ""
+            print(f"{MODEL_FILES[name][0]:<14} {r['total_seconds']:7.2f}s  (prepare {r['prepare_seconds']:.2f}s"
+                  f"{' cached' if r['cached_dataset'] else ''}, fit {r['fit_seconds']:.2f}s, save {r['save_seconds']:.2f}s)"
+                  f"  {r['rows']} rows{accuracy}")
+            if r.get("published_version"):
+                print(f"{'':<14} published and activated version {r['published_version']}")
+            if "search_seconds" in r:
+                print(f"{'':<14} searched {r['candidates']} configs in {r['search_seconds']:.2f}s -> {r['config']}")
+        print(f"Total wall time: {wall:.2f}s")
@@ -0,0 +1,179 @@
+# backend/whatif.py
+#
+# Counterfactual ("what if") sweeps for one patient: change modifiable inputs
+# such as BMI, Glucose or sleep quality over a range of values and score
+# every variant.
+#
+# The patient is encoded and validated once. Variants are copies of that row
+# with the varied columns overwritten, so a model's whole sweep is one matrix
+# and one engine.proba call. The matrix holds:
+#   - the baseline row
+#   - one curve per varied input, with the other inputs at the patient's values
+#   - the joint grid over every varied input (the cartesian product)
+# No payload dict is built or encoded per variant.
+
+import os
+
+import numpy as np
+
+from features import ValidationError, integer
+
+# Most variants (baseline + curves + grid) scored per model and call
+MAX_VARIANTS = int(os.environ.get('EARLYGUARD_WHATIF_MAX_VARIANTS', 20000))
+DEFAULT_STEPS = 11
+
+# Inputs a patient can change, swept when a request does not name any:
+# key -> (low, high, steps, direction) in the field's unit. Narrower than
+# the schema ranges, which admit 0 for "not measured". The direction is the
+# way a recommendation may move the input: the models are fitted to small
+# datasets and some curves go the clinically wrong way (in the heart data,
+# risk falls as cholesterol rises), so "best" never proposes raising it.
+# Curves always cover the whole range.
+MODIFIABLE = {
+    'diabetes': {'Glucose': (70, 200, 14, 'lower'), 'BMI': (18, 40, 12, 'lower'),
+                 'BloodPressure': (60, 100, 9, 'lower')},
+    'heart': {'chol': (150, 300, 16, 'lower'), 'trestbps': (100, 180, 9, 'lower')},
+    'mental': {'stress_level': (0, 10, 11, 'lower'), 'workload': (0, 10, 11, 'lower'),
+               'sleep_quality': (0, 10, 11, 'higher')},
+}
+DIRECTIONS = {'lower': -1, 'higher': 1, 'any': 0}
+
+
+def sweep_values(field, spec, default=None):
+    """(sorted distinct values to try, direction) for one Numeric field.
+
+    spec: a list of values, {"values"} or {"min", "max", "steps"} (each
+    optional) plus an optional "direction" (lower, higher or any), or None.
+    Missing settings come from `default` (low, high, steps, direction), then
+    the field's range. Raises ValidationError for values outside the range.
+    """
+    key = field.key
+    if isinstance(spec, list):
+        spec = {"values": spec}
+    elif spec is None:
+        spec = {}
+    elif not isinstance(spec, dict):
+        raise ValidationError([{"field": key, "error": "expected a list of values or {min, max, steps}"}])
+    low, high, steps, direction = default or (field.min, field.max, DEFAULT_STEPS, 'any')
+    direction = spec.get('direction', direction)
+    if direction not in DIRECTIONS:
+        raise ValidationError([{"field": key, "error": f"direction must be one of {sorted(DIRECTIONS)}"}])
+
+    if 'values' in spec:
+        try:
+            values = np.asarray(spec['values'], dtype=np.float64).ravel()
+        except (TypeError, ValueError):
+            raise ValidationError([{"field": key, "error": "values must be numbers"}]) from None
+    else:
+        try:
+            low = float(spec.get('min', low))
+            high = float(spec.get('max', high))
+            steps = int(spec.get('steps', steps))
+        except (TypeError, ValueError):
+            raise ValidationError([{"field": key, "error": "min, max and steps must be numbers"}]) from None
+        if not 2 <= steps <= MAX_VARIANTS or not low < high:
+            raise ValidationError([{"field": key, "error": f"need min < max and 2-{MAX_VARIANTS} steps"}])
+        values = np.linspace(low, high, steps)
+
+    if field.cast is integer:
+        values = np.round(values)
+    values = np.unique(values)
+    if not len(values):
+        raise ValidationError([{"field": key, "error": "no values to try"}])
+    for value in (values[0], values[-1]):
+        problem = field.check(value)
+        if problem is not None:
+            raise ValidationError([problem])
+    return values, DIRECTIONS[direction]
+
+
+def sweep(bundle, data, vary=None, grid=True, max_variants=MAX_VARIANTS):
+    """Score one patient and its variants with a single engine call.
+
+    vary: {key: spec} for this model's numeric inputs (see sweep_values), or
+    None for the model's MODIFIABLE inputs. Keys the model does not use are
+    ignored. grid=False leaves out the joint grid.
+
+    Returns None when none of the varied inputs belong to the model, else
+    {"baseline": p, "curves": {key: (values, probs)}, "best": (changes, p),
+    "best_single": (changes, p), "variants": n} with probabilities in [0, 1]
+    and changes as {key: value}. "best" is the lowest-risk variant whose
+    changes all go in their input's direction, "best_single" the same with
+    one input changed (either is the baseline when no change helps).
+    Raises ValidationError for a bad payload or sweep.
+    """
+    encoder = bundle.encoder
+    defaults = MODIFIABLE.get(bundle.name, {})
+    if vary is None:
+        vary = dict.fromkeys(defaults)
+    # key, field, column and values, for the inputs this model uses
+    axes, signs = [], []
+    for key, spec in vary.items():
+        found = encoder.column(key)
+        if found is not None:
+            field, col = found
+            values, sign = sweep_values(field, spec, defaults.get(key))
+            axes.append((key, field, col, values))
+            signs.append(sign)
+    if not axes:
+        return None
+
+    X0 = encoder.encode(data)
+    keys = [key for key, _, _, _ in axes]
+    cols = [col for _, _, col, _ in axes]
+    scales = np.array([field.scale for _, field, _, _ in axes])
+    signs = np.array(signs)
+    base = X0[0, cols] * scales # the patient's values, in input units
+
+    # Raw input values per row: baseline, then each curve, then the grid
+    blocks = [base[None, :]]
+    for j, (_, _, _, values) in enumerate(axes):
+        block = np.repeat(base[None, :], len(values), axis=0)
+        block[:, j] = values
+        blocks.append(block)
+    singles = sum(len(b) for b in blocks)
+    total = singles
+    if grid and len(axes) > 1:
+        total += int(np.prod([len(values) for _, _, _, values in axes]))
+    if total > max_variants:
+        raise ValidationError([{"field": None, "error": f"{total} variants requested (max {max_variants}); "
+                                                        "use fewer steps or inputs, or \"grid\": false"}])
+    if total > singles:
+        mesh = np.meshgrid(*(values for _, _, _, values in axes), indexing='ij')
+        blocks.append(np.stack([m.ravel() for m in mesh], axis=1))
+    R = np.concatenate(blocks)
+
+    X = np.repeat(X0, len(R), axis=0)
+    X[:, cols] = R / scales
+    probs = bundle.engine.proba(X)
+
+    # Lowest risk as displayed (2 decimals of a percent), so a negligible
+    # gain does not pick a drastic change; ties go to fewer changed inputs,
+    # then to the smallest change relative to each input's sweep range.
+    # Variants moving an input against its direction are out of the running.
+    spans = np.array([max(values[-1] - values[0], 1e-12) for _, _, _, values in axes])
+    changed = R != base
+    allowed = ((R - base) * signs >= 0).all(axis=1)
+    shown = np.where(allowed, np.round(probs * 100, 2), np.inf)
+    distance = (np.abs(R - base) / spans).sum(axis=1)
+    n_changed = changed.sum(axis=1)
+
+    def pick(rows):
+        i = np.lexsort((distance[:rows], n_changed[:rows], shown[:rows]))[0]
+        changes = {k: v for k, v, c in zip(keys, R[i].tolist(), changed[i].tolist()) if c}
+        for k, (_, field, _, _) in zip(keys, axes):
+            if k in changes and field.cast is integer:
+                changes[k] = int(changes[k])
+        return changes, float(probs[i])
+
+    curves, start = {}, 1
+    for key, _, _, values in axes:
+        curves[key] = (values, probs[start:start + len(values)])
+        start += len(values)
+    return {
+        "baseline": float(probs[0]),
+        "curves": curves,
+        "best": pick(len(R)),
+        "best_single": pick(singles),
+        "variants": len(R),
+    }
@@ -133,26 +133,24 @@ export const AssessmentProvider = ({ children }) => {
             sleep_quality: parseInt(mData.sleepQuality)
         };
 
-        const [dRes, hRes, mRes] = await Promise.allSettled([
-            api.predictDiabetes(diabetesPayload),
-            api.predictHeart(heartPayload),
-            api.predictMental(mentalPayload)
-        ]);
-
-        let lScore = null;
-        if (!skipLiver) {
-            try {
-                const lRes = await api.predictLiver(liverPayload);
-                lScore = lRes.risk_score;
-            } catch (e) {
-                console.error("Liver prediction skipped/failed:", e);
-                lScore = null;
-            }
+        // One round trip for all models; liver is only scored when its inputs are sent
+        let results = {};
+        try {
+            const res = await api.predictAssessment({
+                ...diabetesPayload,
+                ...heartPayload,
+                ...mentalPayload,
+                ...(skipLiver ? {} : liverPayload)
+            });
+            results = res.results || {};
+        } catch (e) {
+            console.error("Assessment prediction failed:", e);
         }
 
-        const dScore = dRes.status === 'fulfilled' ? dRes.value.risk_score : 20;
-        const hScore = hRes.status === 'fulfilled' ? hRes.value.risk_score : 15;
-        const mScore = mRes.status === 'fulfilled' ? mRes.value.risk_score : 25;
+        const lScore = results.liver ? results.liver.risk_score : null;
+        const dScore = results.diabetes ? results.diabetes.risk_score : 20;
+        const hScore = results.heart ? results.heart.risk_score : 15;
+        const mScore = results.mental ? results.mental.risk_score : 25;
 
         return {
             dRisk: dScore || 0,
@@ -51,5 +51,16 @@ export const api = {
             console.error("Mental health prediction error:", error);
             throw error;
         }
+    },
+
+    // Scores every model that has inputs in the payload in a single request
+    predictAssessment: async (data) => {
+        try {
+            const response = await axios.post(`${API_URL}/predict/assessment`, data);
+            return response.data;
+        } catch (error) {
+            console.error("Assessment prediction error:", error);
+            throw error;
+        }
     }
 };